@@ -32,7 +32,7 @@ import {
 } from 'nbdime/lib/diff/widget';
 
 import {
-  requestDiff
+  requestDiff, requestDiffChain, requestRunDiff
 } from './request';
 
 import {
@@ -50,6 +50,13 @@ import {
 
 let diffWidget: NotebookDiffWidget | null = null;
 
+/**
+ * The executions of the cell and the diffs between consecutive executions,
+ * filled in as the chunks of the diff chain arrive.
+ */
+let chain: {header: any, cells: any[], diffs: (IDiffEntry[] | null)[]} | null = null;
+let chainPosition = 0;
+
 const prefixes = ['git:', 'checkpoint:'];
 
 function hasPrefix(candidate: string): boolean {
@@ -136,6 +143,77 @@ function getDiff(base: string, remote: string | undefined, cell_index: number, b
   requestDiff(base, remote, cell_index, base_selected_execution, remote_selected_execution, baseUrl, onDiffRequestCompleted, onDiffRequestFailed);
 }
 
+/**
+ * Calls `requestRunDiff` with our response handlers
+ */
+export
+function getRunDiff(base: string, runs: {[key: string]: string | null}) {
+  toggleSpinner(true);
+  requestRunDiff(base, runs, onDiffRequestCompleted, onDiffRequestFailed);
+}
+
+/**
+ * Load the diff chain of a cell, to step through its executions without
+ * another request.
+ */
+function loadDiffChain(base: string, cell_index: number, position: number) {
+  chain = null;
+  chainPosition = position;
+  requestDiffChain(base, cell_index, (lines) => {
+    for (let line of lines) {
+      if (chain === null) {
+        chain = {header: line, cells: [], diffs: []};
+      } else {
+        chain.cells[line.index] = line.cell;
+        chain.diffs[line.index] = line.diff;
+      }
+    }
+    updateChainButtons();
+  }, () => {
+    updateChainButtons();
+  }, (error) => {
+    console.log('Diff chain request failed: ' + error);
+  });
+}
+
+/**
+ * Show the diff between an execution of the cell and the next one
+ */
+function showChainStep(position: number) {
+  if (chain === null || !chain.diffs[position]) {
+    return;
+  }
+  chainPosition = position;
+  let header = chain.header;
+  let base = {
+    metadata: header.metadata,
+    nbformat: header.nbformat,
+    nbformat_minor: header.nbformat_minor,
+    cells: [chain.cells[position]]
+  } as nbformat.INotebookContent;
+  let entries = chain.diffs[position] as IDiffEntry[];
+  let diff = entries.length > 0 ? [{op: 'patch', key: 'cells', diff: entries} as IDiffEntry] : [];
+  updateChainButtons();
+  showDiff({base, diff}).then(() => {
+    markUnchangedRanges();
+  });
+}
+
+function updateChainButtons() {
+  let previousBtn = document.getElementById('provbook-previous') as HTMLButtonElement;
+  let nextBtn = document.getElementById('provbook-next') as HTMLButtonElement;
+  let label = document.getElementById('provbook-execution') as HTMLSpanElement;
+  if (!previousBtn || !nextBtn || !label || chain === null) {
+    return;
+  }
+  previousBtn.style.display = 'initial';
+  nextBtn.style.display = 'initial';
+  previousBtn.disabled = !chain.diffs[chainPosition - 1];
+  nextBtn.disabled = !chain.diffs[chainPosition + 1];
+  label.textContent = 'Execution ' + chainPosition + ' to ' + (chainPosition + 1) +
+                      ' of ' + chain.header.executions;
+}
+
 /**
  * Callback for a successfull diff request
  */
@@ -176,10 +254,26 @@ function initializeDiff() {
   let base_selected_execution = getConfigOption('base_selected_execution');
   let remote_selected_execution = getConfigOption('remote_selected_execution');
   let baseUrl = getConfigOption('baseurl');
-  if (base && (remote || hasPrefix(base))) {
+  if (base && getConfigOption('mode') === 'runs') {
+    let runs: {[key: string]: string | null} = {};
+    for (let name of ['base_run', 'remote_run', 'base_time', 'remote_time', 'window']) {
+      runs[name] = getConfigOption(name, null);
+    }
+    getRunDiff(base, runs);
+  } else if (base && (remote || hasPrefix(base))) {
     compare(base, remote, cell_index, base_selected_execution, remote_selected_execution, baseUrl, 'replace');
+    loadDiffChain(base, cell_index, base_selected_execution);
   }
 
+  let previousBtn = document.getElementById('provbook-previous') as HTMLButtonElement;
+  previousBtn.onclick = () => {
+    showChainStep(chainPosition - 1);
+  };
+  let nextBtn = document.getElementById('provbook-next') as HTMLButtonElement;
+  nextBtn.onclick = () => {
+    showChainStep(chainPosition + 1);
+  };
+
   let exportBtn = document.getElementById('nbdime-export') as HTMLButtonElement;
   exportBtn.onclick = exportDiff;
 
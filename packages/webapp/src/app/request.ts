@@ -81,3 +81,61 @@ function requestDiff(
               onComplete,
               onFail);
 }
+
+/**
+ * Make a diff request for two runs of the whole notebook
+ */
+export
+function requestRunDiff(
+    base: string, runs: {[key: string]: string | null},
+    onComplete: (result: any) => void,
+    onFail: (result: any) => void): void {
+  requestJson(URLExt.join(window.location.origin, window.location.pathname, 'api/rundiff'),
+              {base, ...runs},
+              onComplete,
+              onFail);
+}
+
+/**
+ * Request the diffs between consecutive executions of a cell. The response
+ * is newline-delimited JSON, and `onLines` is called with the lines of
+ * every chunk as it arrives.
+ */
+export
+function requestDiffChain(
+    base: string, cell_index: number,
+    onLines: (lines: any[]) => void,
+    onDone: () => void,
+    onFail: (result: any) => void): void {
+  let url = URLExt.join(window.location.origin, window.location.pathname, 'api/diffchain') +
+            URLExt.objectToQueryString({base, cell_index: String(cell_index)});
+  let xhr = new XMLHttpRequest();
+  let parsed = 0;
+  let parseLines = () => {
+    let end = xhr.responseText.lastIndexOf('\n');
+    if (end < parsed) {
+      return;
+    }
+    let lines = xhr.responseText.slice(parsed, end).split('\n')
+      .filter((line) => line.length > 0)
+      .map((line) => JSON.parse(line));
+    parsed = end + 1;
+    if (lines.length > 0) {
+      onLines(lines);
+    }
+  };
+  xhr.open('GET', url);
+  xhr.onprogress = parseLines;
+  xhr.onload = () => {
+    if (xhr.status !== 200) {
+      onFail(`${xhr.status} ${xhr.statusText}`);
+      return;
+    }
+    parseLines();
+    onDone();
+  };
+  xhr.onerror = () => {
+    onFail('Network error');
+  };
+  xhr.send();
+}
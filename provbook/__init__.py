@@ -6,7 +6,18 @@ from __future__ import unicode_literals
 
 from ._version import __version__
 
-from nbdime.diffing import diff, diff_notebooks
+
+# nbdime and nbformat take seconds to import, so they are imported on
+# the first diff rather than by every `import provbook`.
+def diff(*args, **kwargs):
+    from nbdime.diffing import diff
+    return diff(*args, **kwargs)
+
+
+def diff_notebooks(*args, **kwargs):
+    from nbdime.diffing import diff_notebooks
+    return diff_notebooks(*args, **kwargs)
+
 
 def load_jupyter_server_extension(nb_server_app):
     # Wrap this here to avoid pulling in webapp in a normal run
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import sys
+
+import nbformat
+
+from .generator import DEFAULT_MIME_MIX, generate_notebook, parse_mime_mix
+from .suite import STAGES, compare, run_suite
+
+examples = """
+Example usage of the benchmarks
+-------------------------------
+Run every stage on a notebook of 100 cells executed 10 times and save the results
+    python -m provbook.benchmarks --output results.json
+Only the conversions, on a larger notebook with image outputs of 4 KB
+    python -m provbook.benchmarks --cells 500 --payload-size 4096 --mime-mix image/png=1,stream=1 --stages nb2rdf_nt,rdf2nb_index
+Fail if a stage got more than 20% slower or larger than in the results of an earlier commit
+    python -m provbook.benchmarks --baseline results.json --threshold 20 --stage-threshold rdf2nb_sparql=50
+"""
+
+
+def command_line_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark notebook_rdf and the provenance diff on a synthetic notebook.",
+        epilog=examples, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cells', type=int, default=100, help="Number of code cells")
+    parser.add_argument('--executions', type=int, default=10, help="Number of executions of every cell")
+    parser.add_argument('--mime-mix',
+                        help=("Weights of the kinds of outputs, MIME types, stream and error, "
+                              "as kind=weight,... (default: {0})".format(
+                                  ','.join('%s=%g' % item for item in sorted(DEFAULT_MIME_MIX.items())))))
+    parser.add_argument('--payload-size', type=int, default=256, help="Size of every output in characters")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generator")
+    parser.add_argument('--notebook', help="Benchmark this notebook instead of a synthetic one")
+    parser.add_argument('--save-notebook', metavar='FILE', help="Also write the synthetic notebook to FILE")
+    parser.add_argument('--stages', help="Comma-separated stages to run: {0}".format(', '.join(STAGES)))
+    parser.add_argument('--repeat', type=int, default=3, help="Runs of every stage, the fastest one is kept")
+    parser.add_argument('-o', '--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare with the JSON results of an earlier run")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="Regression in percent of time or peak memory that fails the comparison")
+    parser.add_argument('--stage-threshold', action='append', default=[], metavar='STAGE=PERCENT',
+                        help="Threshold of one stage, overriding --threshold")
+    return parser
+
+
+def print_result(name, result):
+    print('{0:<14} {1:>9.3f}s {2:>12.0f} {3}/s {4:>9.1f} MB peak'.format(
+        name, result['seconds'], result['throughput'], result['unit'], result['peak_bytes'] / 1e6))
+
+
+def main(argv=None):
+    parser = command_line_parser()
+    args = parser.parse_args(argv)
+    stages = args.stages.split(',') if args.stages else list(STAGES)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error("unknown stages: {0}".format(', '.join(unknown)))
+    stage_thresholds = {}
+    for item in args.stage_threshold:
+        stage, _, percent = item.partition('=')
+        stage_thresholds[stage] = float(percent)
+
+    if args.notebook:
+        params = {'notebook': args.notebook}
+        with io.open(args.notebook, encoding='utf-8') as fin:
+            notebook = nbformat.read(fin, as_version=4)
+    else:
+        params = {
+            'cells': args.cells,
+            'executions': args.executions,
+            'mime_mix': parse_mime_mix(args.mime_mix) if args.mime_mix else DEFAULT_MIME_MIX,
+            'payload_size': args.payload_size,
+            'seed': args.seed,
+        }
+        notebook = generate_notebook(**params)
+        if args.save_notebook:
+            with io.open(args.save_notebook, 'w', encoding='utf-8') as fout:
+                nbformat.write(notebook, fout)
+
+    results = run_suite(notebook, stages, args.repeat, params, progress=print_result)
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as fout:
+            fout.write(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with io.open(args.baseline, encoding='utf-8') as fin:
+            baseline = json.load(fin)
+        if baseline.get('params') != results['params']:
+            print("The baseline was measured with other parameters: {0}".format(baseline.get('params')),
+                  file=sys.stderr)
+        regressed = False
+        for name, metric, base, current, change, failed in compare(results, baseline, args.threshold,
+                                                                   stage_thresholds):
+            regressed = regressed or failed
+            print('{0} {1:<14} {2:<10} {3:>12.4g} -> {4:<12.4g} {5:+.1f}%'.format(
+                'FAIL' if failed else '  ok', name, metric, base, current, change))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
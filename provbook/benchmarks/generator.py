@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Synthetic notebooks with a provenance history for the benchmarks.
+
+A notebook has `cells` code cells, every one executed `executions` times,
+and every execution recorded in the provenance of the cell with its
+outputs. The kind of each output is drawn from `mime_mix`, a mapping of
+MIME types, `stream` and `error` to weights, and every payload is
+`payload_size` characters long. The same arguments and seed always give
+the same notebook.
+"""
+
+from __future__ import unicode_literals
+
+import base64
+import datetime
+import random
+
+import nbformat.v4.nbbase as nbbase
+
+DEFAULT_MIME_MIX = {
+    'text/plain': 4,
+    'text/html': 1,
+    'image/png': 1,
+    'application/json': 1,
+    'stream': 4,
+    'error': 1,
+}
+
+START_TIME = datetime.datetime(2020, 1, 1)
+
+
+def parse_mime_mix(spec):
+    """Parse `text/plain=4,image/png=1,stream=2` into a mix."""
+    mime_mix = {}
+    for item in spec.split(','):
+        kind, _, weight = item.partition('=')
+        mime_mix[kind.strip()] = float(weight) if weight else 1.0
+    return mime_mix
+
+
+def payload(rnd, mime_type, size):
+    if mime_type == 'image/png':
+        return base64.b64encode(bytearray(rnd.getrandbits(8) for _ in range(size * 3 // 4))).decode('ascii')[:size]
+    text = ''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz0123456789 \n') for _ in range(size))
+    if mime_type == 'text/html':
+        return '<pre>' + text + '</pre>'
+    if mime_type == 'application/json':
+        return {'value': text}
+    return text
+
+
+def generate_output(rnd, kind, size, execution_count):
+    if kind == 'stream':
+        return nbbase.new_output('stream', name='stdout', text=payload(rnd, 'text/plain', size))
+    if kind == 'error':
+        return nbbase.new_output('error', ename='ValueError', evalue=payload(rnd, 'text/plain', min(size, 80)),
+                                 traceback=[payload(rnd, 'text/plain', size)])
+    data = {kind: payload(rnd, kind, size)}
+    if kind != 'text/plain':
+        data['text/plain'] = '<%s>' % kind
+    return nbbase.new_output('execute_result', data=data, execution_count=execution_count)
+
+
+def generate_notebook(cells=100, executions=10, mime_mix=None, payload_size=256, seed=0):
+    """Return a synthetic notebook, see the module docstring."""
+    rnd = random.Random(seed)
+    kinds = sorted((mime_mix or DEFAULT_MIME_MIX).items())
+    execution_count = 0
+    notebook_cells = []
+    for cell_index in range(cells):
+        provenance = []
+        for execution in range(executions):
+            execution_count += 1
+            started = START_TIME + datetime.timedelta(minutes=execution_count)
+            outputs = [generate_output(rnd, kind, payload_size, execution_count)
+                       for kind in weighted_choices(rnd, kinds, rnd.randint(1, 2))]
+            provenance.append({
+                'source': 'x_%d = %d\nprint(x_%d)' % (cell_index, execution, cell_index),
+                'outputs': outputs,
+                'start_time': started.isoformat() + 'Z',
+                'end_time': (started + datetime.timedelta(seconds=1)).isoformat() + 'Z',
+                'execution_time': '%dms' % rnd.randint(1, 1000),
+            })
+        last = provenance[-1] if provenance else {'source': '', 'outputs': []}
+        cell = nbbase.new_code_cell(
+            source=last['source'], outputs=last['outputs'],
+            execution_count=execution_count if provenance else None,
+            metadata={'provenance': provenance} if provenance else {})
+        if 'id' in cell:
+            # nbformat 4.5 draws the ids of cells at random.
+            cell['id'] = 'cell-%d' % cell_index
+        notebook_cells.append(cell)
+    return nbbase.new_notebook(cells=notebook_cells, metadata={
+        'kernelspec': {'name': 'python3', 'display_name': 'Python 3'},
+        'language_info': {'name': 'python', 'version': '3.8', 'file_extension': '.py'},
+    })
+
+
+def weighted_choices(rnd, kinds, count):
+    total = sum(weight for _, weight in kinds)
+    choices = []
+    for _ in range(count):
+        point = rnd.uniform(0, total)
+        for kind, weight in kinds:
+            point -= weight
+            if point <= 0:
+                break
+        choices.append(kind)
+    return choices
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Import time of the command line and of the server extension.
+
+Every target runs in a new interpreter with `python -X importtime`. Its
+`prelude` is imported first and does not count. The server extension is
+imported on its own, so that the heavy modules it imports are reported
+even though the notebook server has imported some of them already. The import time is the cumulative time of the
+modules the `statement` imported, as reported by the interpreter, and the
+wall time that of the statement. Both are the fastest of `repeat` runs.
+
+    python -m provbook.benchmarks.importtime --output importtime.json
+    python -m provbook.benchmarks.importtime --baseline importtime.json --threshold 25
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from collections import OrderedDict
+
+from .._version import __version__
+from .results import compare, git_commit
+
+# name: (prelude, statement)
+TARGETS = OrderedDict([
+    ('provbook', ('', 'import provbook')),
+    ('cli', ('', 'from provbook.notebook_rdf.__main__ import app')),
+    ('cli_help', ('', 'import sys; sys.argv = ["notebook_rdf", "--help"]; sys.stdout = open(os.devnull, "w")\n'
+                      'from provbook.notebook_rdf.__main__ import app\n'
+                      'try:\n'
+                      '    app()\n'
+                      'except SystemExit:\n'
+                      '    pass')),
+    # On their own: the notebook server imports nbformat, which would hide it here.
+    ('server_extension', ('', 'import provbook.webapp.nb_server_extension')),
+    # What _load_jupyter_server_extension imports to register the diff handlers.
+    ('server_extension_load', ('', 'import provbook.webapp.nb_server_extension, provbook.webapp.nbdimeserver')),
+])
+
+# Dependencies that should only be imported by the code using them.
+HEAVY_MODULES = ['rdflib', 'rdflib.plugins.sparql', 'nbformat', 'nbdime', 'jsonschema', 'jinja2', 'tornado',
+                 'notebook']
+
+MARKER = '-- provbook importtime --'
+
+SCRIPT = """import os, sys, time
+{prelude}
+before = set(sys.modules)
+sys.stderr.write({marker!r} + '\\n')
+sys.stderr.flush()
+start_time = time.time()
+{statement}
+seconds = time.time() - start_time
+sys.stdout = sys.__stdout__
+print({marker!r})
+print(repr((seconds, len(set(sys.modules) - before), [name for name in {heavy!r} if name in sys.modules and name not in before])))
+"""
+
+IMPORT_TIME_RE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)')
+
+
+def parse_importtime(stderr):
+    """Return the (module, self us, cumulative us, depth) imported after the marker."""
+    modules = []
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    for line in lines:
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1)), int(match.group(2)),
+                            (len(match.group(3)) - 1) // 2))
+    return modules
+
+
+def run_target(prelude, statement, python=None):
+    """Import `statement` once after `prelude` and return its measurement."""
+    script = SCRIPT.format(prelude=prelude, statement=statement, marker=MARKER, heavy=HEAVY_MODULES)
+    process = subprocess.Popen([python or sys.executable, '-X', 'importtime', '-c', script],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    stdout, stderr = stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+    modules = parse_importtime(stderr)
+    if process.returncode != 0 or MARKER not in stdout:
+        error = [line for line in stderr.splitlines() if not IMPORT_TIME_RE.match(line)]
+        return {'error': error[-1] if error else 'exit code {0}'.format(process.returncode)}
+    seconds, module_count, heavy = eval(stdout.split(MARKER, 1)[1].strip())
+    return {
+        'seconds': seconds,
+        'import_seconds': sum(cumulative for _, _, cumulative, depth in modules if depth == 0) / 1e6,
+        'modules': module_count,
+        'heavy_modules': heavy,
+        'slowest': [[name, cumulative / 1e6] for name, _, cumulative, _ in
+                    sorted(modules, key=lambda module: module[2], reverse=True)],
+    }
+
+
+def run_importtime(targets=None, repeat=5, top=10, python=None, progress=None):
+    """Measure the import time of the `targets` and return the results."""
+    results = OrderedDict([
+        ('provbook', __version__),
+        ('commit', git_commit()),
+        ('python', platform.python_version()),
+        ('targets', OrderedDict()),
+    ])
+    for name in targets or TARGETS:
+        prelude, statement = TARGETS[name]
+        best = None
+        for _ in range(repeat):
+            result = run_target(prelude, statement, python)
+            if 'error' in result:
+                best = result
+                break
+            if best is None or result['seconds'] < best['seconds']:
+                best = result
+        if 'slowest' in best:
+            best['slowest'] = best['slowest'][:top]
+        results['targets'][name] = best
+        if progress is not None:
+            progress(name, best)
+    return results
+
+
+def print_result(name, result):
+    if 'error' in result:
+        print('{0:<21} failed: {1}'.format(name, result['error']))
+        return
+    print('{0:<21} {1:>8.3f}s {2:>8.3f}s imports {3:>5} modules  {4}'.format(
+        name, result['seconds'], result['import_seconds'], result['modules'],
+        ', '.join(result['heavy_modules']) or '-'))
+    for module, seconds in result['slowest']:
+        print('    {0:>8.3f}s {1}'.format(seconds, module))
+
+
+def command_line_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of notebook_rdf and of the server "
+                                                 "extension with python -X importtime.")
+    parser.add_argument('--targets', help="Comma-separated targets to measure: {0}".format(', '.join(TARGETS)))
+    parser.add_argument('--repeat', type=int, default=5, help="Runs of every target, the fastest one is kept")
+    parser.add_argument('--top', type=int, default=10, help="Number of the slowest modules to report")
+    parser.add_argument('--python', help="Interpreter to measure (default: this one)")
+    parser.add_argument('-o', '--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="Compare with the JSON results of an earlier run")
+    parser.add_argument('--threshold', type=float, default=25.0,
+                        help="Regression in percent of the import time that fails the comparison")
+    parser.add_argument('--target-threshold', action='append', default=[], metavar='TARGET=PERCENT',
+                        help="Threshold of one target, overriding --threshold")
+    return parser
+
+
+def main(argv=None):
+    parser = command_line_parser()
+    args = parser.parse_args(argv)
+    targets = args.targets.split(',') if args.targets else list(TARGETS)
+    unknown = [target for target in targets if target not in TARGETS]
+    if unknown:
+        parser.error("unknown targets: {0}".format(', '.join(unknown)))
+    target_thresholds = {}
+    for item in args.target_threshold:
+        target, _, percent = item.partition('=')
+        target_thresholds[target] = float(percent)
+
+    results = run_importtime(targets, args.repeat, args.top, args.python, progress=print_result)
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as fout:
+            fout.write(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with io.open(args.baseline, encoding='utf-8') as fin:
+            baseline = json.load(fin)
+        regressed = False
+        for name, metric, base, current, change, failed in compare(results, baseline, args.threshold,
+                                                                   target_thresholds, section='targets',
+                                                                   metrics=('import_seconds', 'seconds')):
+            regressed = regressed or failed
+            print('{0} {1:<21} {2:<14} {3:>10.4f} -> {4:<10.4f} {5:+.1f}%'.format(
+                'FAIL' if failed else '  ok', name, metric, base, current, change))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
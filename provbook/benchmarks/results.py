@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Comparison of benchmark results with a baseline."""
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.STDOUT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold=10.0, stage_thresholds=None, section='stages',
+            metrics=('seconds', 'peak_bytes')):
+    """Compare the `metrics` of every stage with a baseline.
+
+    Returns a list of (stage, metric, baseline, current, change in percent,
+    regressed), where a stage regressed if it got slower or larger than its
+    threshold in percent. The stages are in `section` of the results.
+    """
+    rows = []
+    for name, result in results[section].items():
+        base = baseline.get(section, {}).get(name)
+        if base is None:
+            continue
+        limit = (stage_thresholds or {}).get(name, threshold)
+        for metric in metrics:
+            if result.get(metric) is None or base.get(metric) is None:
+                continue
+            change = 100.0 * (result[metric] - base[metric]) / base[metric] if base[metric] else 0.0
+            rows.append((name, metric, base[metric], result[metric], change, change > limit))
+    return rows
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Compare the prepared queries of rdf2nb with queries parsed on every call.
+
+Every query of `rdf2nb --sparql` is run with the bindings of the cells,
+executions and outputs of an RDF file, once from its text as before and
+once prepared, and the time per call is printed for both.
+
+    python -m provbook.benchmarks.sparql notebook.ttl
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import time
+
+from ..notebook_rdf.formats import rdf_format_of
+from ..notebook_rdf.namespaces import PPLAN, REPRODUCE
+from ..notebook_rdf.rdf2nb import (QUERY_NAMESPACES, SPARQL_QUERIES, get_notebook_cells, prepared_query,
+                                   read_rdf_graph)
+
+
+def query_bindings(rdfgraph, max_calls):
+    """Return the bindings of the calls of every query while rebuilding the notebook."""
+    cell_indices = sorted(set(rdfgraph.objects(None, REPRODUCE.hasIndex)))
+    cells = sorted(set(rdfgraph.subjects(REPRODUCE.hasIndex, None)))
+    executions = sorted(set(rdfgraph.subjects(PPLAN.correspondsToStep, None)))
+    outputs = sorted(set(rdfgraph.subjects(REPRODUCE.hasSubOutput, None)))
+    bindings = {
+        'cell_source': [{'cell_index': index} for index in cell_indices],
+        'cell_output': [{'cell_index': index} for index in cell_indices],
+        'suboutput': [{'output': output} for output in outputs],
+        'cell_provenance': [{'cell': cell} for cell in cells],
+        'execution_output': [{'execution': execution} for execution in executions],
+        'notebook_cells': [{}],
+        'notebook_metadata': [{}],
+    }
+    return dict((name, calls[:max_calls]) for name, calls in bindings.items())
+
+
+def time_calls(rdfgraph, query, calls, repeat):
+    best = None
+    for _ in range(repeat):
+        start_time = time.time()
+        for bindings in calls:
+            list(rdfgraph.query(query, initNs=QUERY_NAMESPACES, initBindings=bindings))
+        elapsed = time.time() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(rdf_file, rdf_format=None, max_calls=200, repeat=3):
+    rdfgraph = read_rdf_graph(rdf_file, rdf_format or rdf_format_of(rdf_file, 'turtle'))
+    results = {'file': rdf_file, 'triples': len(rdfgraph), 'queries': {}}
+    for name, calls in sorted(query_bindings(rdfgraph, max_calls).items()):
+        if not calls:
+            continue
+        parsed = time_calls(rdfgraph, SPARQL_QUERIES[name], calls, repeat)
+        prepared = time_calls(rdfgraph, prepared_query(name), calls, repeat)
+        results['queries'][name] = {
+            'calls': len(calls),
+            'parsed_ms_per_call': 1000 * parsed / len(calls),
+            'prepared_ms_per_call': 1000 * prepared / len(calls),
+            'speedup': prepared and parsed / prepared,
+        }
+    start_time = time.time()
+    get_notebook_cells(rdfgraph)
+    results['rebuild_seconds'] = time.time() - start_time
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rdf_file', help="RDF file of a notebook")
+    parser.add_argument('--rdf-format', help="The RDF format, defaults to the extension of the file")
+    parser.add_argument('--max-calls', type=int, default=200,
+                        help="Maximum number of calls of every query")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of runs of the calls, the fastest one is kept")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.rdf_file, args.rdf_format, args.max_calls, args.repeat)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+        return
+    print('{0}: {1} triples'.format(results['file'], results['triples']))
+    print('{0:<18} {1:>6} {2:>12} {3:>12} {4:>8}'.format('query', 'calls', 'parsed ms', 'prepared ms', 'speedup'))
+    for name, result in sorted(results['queries'].items()):
+        print('{0:<18} {1:>6} {2:>12.3f} {3:>12.3f} {4:>7.1f}x'.format(
+            name, result['calls'], result['parsed_ms_per_call'], result['prepared_ms_per_call'], result['speedup']))
+    print('rebuild with prepared queries: {0:.2f}s'.format(results['rebuild_seconds']))
+
+
+if __name__ == '__main__':
+    main()
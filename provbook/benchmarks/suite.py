@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Stages of the benchmark suite, their measurement and comparison.
+
+A stage prepares its input outside of the measurement and returns a
+callable doing the measured work, which returns the number of items it
+processed. The wall time is the fastest of `repeat` runs. The peak memory
+is measured by tracemalloc in one more run, so its overhead does not
+count in the time.
+"""
+
+from __future__ import unicode_literals
+
+import io
+import platform
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import rdflib
+
+from .._version import __version__
+from ..notebook_rdf.graphindex import NotebookGraphIndex
+from ..notebook_rdf.nb2rdf import NBToRDFConverter
+from ..notebook_rdf.rdf2nb import get_notebook_cells, get_notebook_metadata
+from ..notebook_rdf.rdfstream import LineParser
+from ..provenance import decode_provenance
+from ..webapp.diffchain import CellDiffCache, iter_diff_chain
+from ..webapp.rundiff import diff_runs
+from .results import compare, git_commit
+
+
+def notebook_nt(notebook):
+    fout = io.StringIO()
+    NBToRDFConverter().stream_to_rdf('benchmark', notebook, fout, format='nt')
+    return fout.getvalue()
+
+
+def nb2rdf_turtle(notebook):
+    def run():
+        converter = NBToRDFConverter()
+        converter.convert_to_rdf('benchmark', notebook, format='turtle')
+        return len(converter.g)
+    return run
+
+
+def nb2rdf_nt(notebook):
+    def run():
+        return NBToRDFConverter().stream_to_rdf('benchmark', notebook, io.StringIO(), format='nt')
+    return run
+
+
+def rdf2nb_index(notebook):
+    nt = notebook_nt(notebook)
+
+    def run():
+        graph_index = NotebookGraphIndex()
+        LineParser(graph_index, 'nt').parse_file(io.StringIO(nt))
+        graph_index.get_notebook_cells()
+        graph_index.get_notebook_metadata()
+        return sum(len(objects) for predicates in graph_index.subjects.values() for objects in predicates.values())
+    return run
+
+
+def rdf2nb_sparql(notebook):
+    graph = rdflib.Graph()
+    graph.parse(data=notebook_nt(notebook), format='nt')
+
+    def run():
+        get_notebook_cells(graph)
+        get_notebook_metadata(graph)
+        return len(graph)
+    return run
+
+
+def cell_provenances(notebook):
+    return [decode_provenance(cell.metadata.get('provenance', []), cell.get('outputs')) for cell in notebook.cells]
+
+
+def diff_chain(notebook):
+    provenances = cell_provenances(notebook)
+
+    def run():
+        # A new cache, so every pair of executions is diffed.
+        cache = CellDiffCache(max_entries=1 << 30)
+        return sum(len(list(iter_diff_chain(cell, provenance, cache)))
+                   for cell, provenance in zip(notebook.cells, provenances))
+    return run
+
+
+def diff_first_last_run(notebook):
+    provenances = cell_provenances(notebook)
+
+    def run():
+        diff_runs(notebook, provenances, {'run': 0}, {'run': -1})
+        return len(notebook.cells)
+    return run
+
+
+# name: (stage, unit of the items it counts)
+STAGES = OrderedDict([
+    ('nb2rdf_turtle', (nb2rdf_turtle, 'triples')),
+    ('nb2rdf_nt', (nb2rdf_nt, 'triples')),
+    ('rdf2nb_index', (rdf2nb_index, 'triples')),
+    ('rdf2nb_sparql', (rdf2nb_sparql, 'triples')),
+    ('diff_chain', (diff_chain, 'executions')),
+    ('diff_runs', (diff_first_last_run, 'cells')),
+])
+
+
+def measure(run, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start_time = time.time()
+        count = run()
+        elapsed = time.time() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        run()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': best,
+        'count': count,
+        'throughput': best and count / best,
+        'peak_bytes': peak_bytes,
+    }
+
+
+def run_suite(notebook, stages=None, repeat=3, params=None, progress=None):
+    """Measure the `stages` on `notebook` and return the results."""
+    results = OrderedDict([
+        ('provbook', __version__),
+        ('commit', git_commit()),
+        ('python', platform.python_version()),
+        ('rdflib', rdflib.__version__),
+        ('params', params or {}),
+        ('stages', OrderedDict()),
+    ])
+    for name in stages or STAGES:
+        stage, unit = STAGES[name]
+        result = measure(stage(notebook), repeat)
+        result['unit'] = unit
+        results['stages'][name] = result
+        if progress is not None:
+            progress(name, result)
+    return results
@@ -10,7 +10,8 @@ define([
     'base/js/events',
     'notebook/js/codecell',
     'notebook/js/textcell',
-    'base/js/utils'
+    'base/js/utils',
+    'base/js/dialog'
 ], function (
     requirejs,
     $,
@@ -19,7 +20,8 @@ define([
     events,
     codecell,
     textcell,
-    utils
+    utils,
+    dialog
 ) {
     "use strict";
 
@@ -28,7 +30,18 @@ define([
     var CodeCell = codecell.CodeCell;
     var MarkdownCell = textcell.MarkdownCell;
     var RawCell = textcell.RawCell
-    var options = {};
+    var options = {
+        // 'metadata' keeps the history in cell.metadata.provenance, 'sidecar'
+        // appends it to the provenance store of the server extension.
+        provenance_store: 'metadata',
+        // Retention policy applied when the notebook is saved, 0 means no limit.
+        // See evict_provenance in provbook/provenance.py.
+        retention_max_executions: 0,
+        retention_max_age_days: 0,
+        retention_max_bytes: 0,
+        retention_keep_first: true,
+        retention_keep_errors: true
+    };
 
 
     var rgx_has_timezone = new RegExp('Z|[\\-+\u2212]\\d\\d(?::?\\d\\d)?$');
@@ -65,6 +78,328 @@ define([
         };
     }
 
+    function patch_CodeCell_clear_output () {
+        var old_clear_output = CodeCell.prototype.clear_output;
+        CodeCell.prototype.clear_output = function () {
+            detach_live_outputs(this);
+            return old_clear_output.apply(this, arguments);
+        };
+    }
+
+    // Provenance entries store their source as a delta against the source of
+    // the previous entry, and their outputs as a reference to an earlier entry
+    // or to the live outputs of the cell. See provbook/provenance.py.
+    function is_high_surrogate (code) {
+        return code >= 0xD800 && code <= 0xDBFF;
+    }
+
+    function is_low_surrogate (code) {
+        return code >= 0xDC00 && code <= 0xDFFF;
+    }
+
+    function source_delta (previous, source) {
+        var prefix = 0;
+        var max_prefix = Math.min(previous.length, source.length);
+        while (prefix < max_prefix && previous.charCodeAt(prefix) === source.charCodeAt(prefix)) {
+            prefix++;
+        }
+        if (prefix > 0 && is_high_surrogate(source.charCodeAt(prefix - 1))) {
+            prefix--;
+        }
+        var suffix = 0;
+        var max_suffix = max_prefix - prefix;
+        while (suffix < max_suffix &&
+               previous.charCodeAt(previous.length - 1 - suffix) === source.charCodeAt(source.length - 1 - suffix)) {
+            suffix++;
+        }
+        if (suffix > 0 && is_low_surrogate(source.charCodeAt(source.length - suffix))) {
+            suffix--;
+        }
+        return {
+            prefix: prefix,
+            suffix: suffix,
+            text: source.substring(prefix, source.length - suffix)
+        };
+    }
+
+    function apply_source_delta (previous, delta) {
+        return previous.substring(0, delta.prefix) + delta.text + previous.substring(previous.length - delta.suffix);
+    }
+
+    // Return the provenance entries stored in the metadata of the cell.
+    function decode_inline_provenance (cell) {
+        var provenance = cell.metadata.provenance || [];
+        var decoded = [];
+        for (var i = 0; i < provenance.length; i++) {
+            var entry = $.extend({}, provenance[i]);
+            if (entry.hasOwnProperty('source_delta')) {
+                var previous = (i > 0 && decoded[i - 1].source) || '';
+                entry.source = apply_source_delta(previous, entry.source_delta);
+                delete entry.source_delta;
+            }
+            if (entry.hasOwnProperty('outputs_ref')) {
+                if (entry.outputs_ref === 'cell') {
+                    entry.outputs = cell.output_area ? cell.output_area.outputs : [];
+                } else {
+                    entry.outputs = decoded[entry.outputs_ref].outputs;
+                }
+                delete entry.outputs_ref;
+            }
+            decoded.push(entry);
+        }
+        return decoded;
+    }
+
+    // Return the provenance entries of the cell with full sources and outputs.
+    function decode_provenance (cell) {
+        var decoded = decode_inline_provenance(cell);
+        var stored = store_entries[cell.metadata.provbook_id];
+        if (options.provenance_store === 'sidecar' && stored !== undefined && stored.length > 0) {
+            decoded = evict_provenance(decoded.concat(stored), moment());
+        }
+        return decoded;
+    }
+
+    // Entries of the provenance store by provbook_id, see provbook/store.py.
+    var store_entries = {};
+    var pending_store_entries = null;
+    var store_requests = Promise.resolve();
+
+    function store_url () {
+        return utils.url_path_join(Jupyter.notebook.base_url, 'provbook/api/provenance',
+                                   utils.encode_uri_components(Jupyter.notebook.notebook_path));
+    }
+
+    function load_provenance_store () {
+        return utils.promising_ajax(store_url(), {type: 'GET', dataType: 'json'}).then(function (data) {
+            store_entries = data.cells;
+        }).catch(function (reason) {
+            console.error(log_prefix, 'Could not load the provenance store:', reason);
+        });
+    }
+
+    // Send the entries appended in the same tick in one request, in order.
+    function flush_store_entries () {
+        var data = JSON.stringify({cells: pending_store_entries});
+        var url = store_url();
+        pending_store_entries = null;
+        store_requests = store_requests.then(function () {
+            return utils.promising_ajax(url, {type: 'POST', contentType: 'application/json', data: data});
+        }).catch(function (reason) {
+            console.error(log_prefix, 'Could not store provenance:', reason);
+        });
+    }
+
+    function post_store_entry (cell_id, entry) {
+        if (pending_store_entries === null) {
+            pending_store_entries = {};
+            setTimeout(flush_store_entries, 0);
+        }
+        if (!pending_store_entries.hasOwnProperty(cell_id)) {
+            pending_store_entries[cell_id] = [];
+        }
+        pending_store_entries[cell_id].push(entry);
+    }
+
+    // Return the provbook_id of the cell. A cell pasted from another one
+    // gets its own id and a copy of the stored history.
+    function store_cell_id (cell) {
+        var cell_id = cell.metadata.provbook_id;
+        var is_copy = cell_id !== undefined && Jupyter.notebook.get_cells().some(function (other) {
+            return other !== cell && other.metadata.provbook_id === cell_id;
+        });
+        if (cell_id === undefined || is_copy) {
+            var entries = (store_entries[cell_id] || []).slice();
+            cell_id = cell.metadata.provbook_id = utils.uuid();
+            store_entries[cell_id] = [];
+            entries.forEach(function (entry) {
+                store_entries[cell_id].push(entry);
+                post_store_entry(cell_id, entry);
+            });
+        } else if (!store_entries.hasOwnProperty(cell_id)) {
+            store_entries[cell_id] = [];
+        }
+        return cell_id;
+    }
+
+    function clear_store_entries (cells) {
+        var cell_ids = [];
+        cells.forEach(function (cell) {
+            var cell_id = cell.metadata.provbook_id;
+            if (cell_id !== undefined && store_entries.hasOwnProperty(cell_id)) {
+                delete store_entries[cell_id];
+                cell_ids.push(cell_id);
+            }
+        });
+        if (cell_ids.length === 0) {
+            return;
+        }
+        var url = store_url() + '?' + $.param({cell_id: cell_ids}, true);
+        store_requests = store_requests.then(function () {
+            return utils.promising_ajax(url, {type: 'DELETE'});
+        }).catch(function (reason) {
+            console.error(log_prefix, 'Could not clear the provenance store:', reason);
+        });
+    }
+
+    // Copy the live outputs into the first entry referring to them before
+    // they change, the other entries then refer to that one.
+    function detach_live_outputs (cell) {
+        var provenance = cell.metadata.provenance || [];
+        var detached;
+        provenance.forEach(function (entry, i) {
+            if (entry.outputs_ref === 'cell') {
+                if (detached === undefined) {
+                    detached = i;
+                    delete entry.outputs_ref;
+                    entry.outputs = cell.output_area.outputs;
+                } else {
+                    entry.outputs_ref = detached;
+                }
+            }
+        });
+    }
+
+    // Append an entry to the provenance of the cell in the compact encoding.
+    // `entry.outputs`, if given, must be the live outputs of the cell.
+    function push_provenance_entry (cell, entry) {
+        if (options.provenance_store === 'sidecar') {
+            var cell_id = store_cell_id(cell);
+            var stored = JSON.parse(JSON.stringify(entry));
+            store_entries[cell_id].push(stored);
+            post_store_entry(cell_id, stored);
+            return;
+        }
+        if (!cell.metadata.hasOwnProperty("provenance")) {
+            cell.metadata.provenance = [];
+        }
+        var provenance = cell.metadata.provenance;
+        if (entry.hasOwnProperty('outputs')) {
+            detach_live_outputs(cell);
+        }
+        var decoded = decode_inline_provenance(cell);
+        var previous = decoded[decoded.length - 1];
+        if (previous !== undefined && typeof previous.source === 'string') {
+            entry.source_delta = source_delta(previous.source, entry.source);
+            delete entry.source;
+        }
+        if (entry.hasOwnProperty('outputs')) {
+            entry.outputs_ref = 'cell';
+            if (previous !== undefined && JSON.stringify(previous.outputs) === JSON.stringify(entry.outputs)) {
+                // The entries with the same outputs refer to the live outputs
+                // too, rather than one of them keeping a copy.
+                var last = provenance[provenance.length - 1];
+                var copy = last.hasOwnProperty('outputs_ref') ? last.outputs_ref : provenance.length - 1;
+                provenance.forEach(function (other, i) {
+                    if (i === copy || other.outputs_ref === copy) {
+                        delete other.outputs;
+                        other.outputs_ref = 'cell';
+                    }
+                });
+            }
+            delete entry.outputs;
+        }
+        provenance.push(entry);
+    }
+
+    // Store decoded provenance entries back in the compact encoding.
+    function encode_provenance (cell, entries) {
+        var encoded = [];
+        var live_outputs = cell.output_area ? JSON.stringify(cell.output_area.outputs) : undefined;
+        entries.forEach(function (entry, i) {
+            var encoded_entry = $.extend({}, entry);
+            var previous = entries[i - 1];
+            if (previous !== undefined && typeof previous.source === 'string' && typeof entry.source === 'string') {
+                encoded_entry.source_delta = source_delta(previous.source, entry.source);
+                delete encoded_entry.source;
+            }
+            if (entry.hasOwnProperty('outputs')) {
+                var outputs = JSON.stringify(entry.outputs);
+                if (previous !== undefined && JSON.stringify(previous.outputs) === outputs) {
+                    var last = encoded[i - 1];
+                    encoded_entry.outputs_ref = last.hasOwnProperty('outputs_ref') ? last.outputs_ref : i - 1;
+                    delete encoded_entry.outputs;
+                } else if (outputs === live_outputs) {
+                    encoded_entry.outputs_ref = 'cell';
+                    delete encoded_entry.outputs;
+                }
+            }
+            encoded.push(encoded_entry);
+        });
+        return encoded;
+    }
+
+    function entry_size (entry) {
+        return new Blob([JSON.stringify(entry)]).size;
+    }
+
+    function is_error_entry (entry) {
+        return (entry.outputs || []).some(function (output) {
+            return output.output_type === 'error';
+        });
+    }
+
+    // Return the decoded provenance entries kept by the retention policy.
+    function evict_provenance (entries, now) {
+        var max_executions = options.retention_max_executions;
+        var max_age_days = options.retention_max_age_days;
+        var max_bytes = options.retention_max_bytes;
+        var oldest_time = moment(now).subtract(max_age_days, 'days');
+        var is_protected = entries.map(function (entry, i) {
+            return (options.retention_keep_first && i === 0) ||
+                   (options.retention_keep_errors && is_error_entry(entry));
+        });
+        var keep = entries.map(function (entry, i) {
+            var kept = true;
+            if (max_executions && i < entries.length - max_executions) {
+                kept = false;
+            }
+            if (max_age_days) {
+                var entry_time = moment(entry.start_time || entry.last_modified, moment.ISO_8601);
+                if (entry_time.isValid() && entry_time.isBefore(oldest_time)) {
+                    kept = false;
+                }
+            }
+            return kept || is_protected[i];
+        });
+        if (max_bytes) {
+            var sizes = entries.map(entry_size);
+            var total_size = 0;
+            entries.forEach(function (entry, i) {
+                if (keep[i]) {
+                    total_size += sizes[i];
+                }
+            });
+            for (var i = 0; i < entries.length && total_size > max_bytes; i++) {
+                if (keep[i] && !is_protected[i]) {
+                    keep[i] = false;
+                    total_size -= sizes[i];
+                }
+            }
+        }
+        return entries.filter(function (entry, i) {
+            return keep[i];
+        });
+    }
+
+    function apply_retention_policy () {
+        if (!(options.retention_max_executions || options.retention_max_age_days || options.retention_max_bytes)) {
+            return;
+        }
+        var now = moment();
+        Jupyter.notebook.get_cells().forEach(function (cell) {
+            var provenance = cell.metadata.provenance;
+            if (provenance === undefined || provenance.length === 0) {
+                return;
+            }
+            var decoded = decode_inline_provenance(cell);
+            var kept = evict_provenance(decoded, now);
+            if (kept.length < decoded.length) {
+                cell.metadata.provenance = encode_provenance(cell, kept);
+            }
+        });
+    }
+
     function human_readable_duration (duration_ms, item_count) {
         if (duration_ms < 1000) {
             return Math.round(duration_ms) + 'ms';
@@ -101,9 +436,6 @@ define([
 
     //Add provenance data to the metadata of the code cell.
     function update_provenance_metadata_codecell (cell) {
-      if (!cell.metadata.hasOwnProperty("provenance")) {
-            cell.metadata.provenance = [];
-      }
       var execution_time, start_time, end_time = 'Unknown';
       if (cell.metadata.hasOwnProperty("ExecutionTime")) {
         var start_time = moment(cell.metadata['ExecutionTime']['start_time']),
@@ -114,7 +446,7 @@ define([
             execution_time = human_readable_duration(exec_time);
         }
       }
-      cell.metadata.provenance.push({
+      push_provenance_entry(cell, {
         outputs: cell.output_area.outputs,
         source: cell.get_text(),
         start_time: start_time,
@@ -125,6 +457,7 @@ define([
 
     //Clear provenance data from the metadata of the cell.
     function clear_provenance_data (cells) {
+        clear_store_entries(cells);
         cells.forEach(function (cell, idx, arr) {
             delete cell.metadata.provenance;
             delete cell.metadata.ExecutionTime;
@@ -201,6 +534,18 @@ define([
                   })
           )
           .appendTo(provenance_submenu);
+
+      $('<li/>')
+          .attr('title', 'Compare two runs of the whole notebook')
+          .append(
+              $('<a href="#">')
+                  .text('Compare runs (all cells)')
+                  .on('click', function (evt) {
+                      evt.preventDefault();
+                      ProvBookRunDiffView();
+                  })
+          )
+          .appendTo(provenance_submenu);
     }
 
     function add_css(url) {
@@ -268,10 +613,7 @@ define([
 
     // Update the provenance data which includes the save time and the source for each text cell.
     function update_provenance_metadata_textcell(cell) {
-      if (!cell.metadata['provenance']) {
-        cell.metadata['provenance'] = [];
-      }
-      cell.metadata.provenance.push({
+      push_provenance_entry(cell, {
         source: cell.get_text(),
         last_modified: Jupyter.notebook.last_modified
       });
@@ -282,17 +624,15 @@ define([
           if (!(cell instanceof CodeCell || cell instanceof MarkdownCell || cell instanceof RawCell)) {
                 return $();
           }
-          if (!cell.metadata['provenance']) {
-            cell.metadata['provenance'] = [];
-
+          if (decode_provenance(cell).length === 0) {
             if (cell instanceof MarkdownCell || cell instanceof RawCell) {
-              cell.metadata.provenance.push({
+              push_provenance_entry(cell, {
                 source: cell.get_text(),
                 last_modified: Jupyter.notebook.last_modified
               });
             } else if (cell instanceof CodeCell ) {
               var execution_time = 'Unknown', start_time = 'Unknown', end_time = 'Unknown';
-              cell.metadata.provenance.push({
+              push_provenance_entry(cell, {
                 outputs: cell.output_area.outputs,
                 source: cell.get_text(),
                 start_time: start_time,
@@ -306,7 +646,7 @@ define([
 
     // Create slider and provenance area to display the provenance of the text cell.
     function update_provenance_area_textcell (cell) {
-      var number_of_executions = cell.metadata['provenance'].length;
+      var number_of_executions = decode_provenance(cell).length;
       var cell_id = cell.cell_id;
       var min_val = 0;
       var max_val = number_of_executions-1;
@@ -318,26 +658,26 @@ define([
         value: min_val,
         orientation: "horizontal",
         create: function(evt, ui) {
-          var last_modified = cell.metadata['provenance'][min_val]['last_modified'];
+          var last_modified = decode_provenance(cell)[min_val]['last_modified'];
           if (last_modified) {
             last_modified = moment(last_modified).format();
           }
           $('.slider-time.' + cell_id).html(last_modified);
           $('.provenance_area.' + cell_id).html(function(){
-            var source = cell.metadata['provenance'][min_val]['source'];
+            var source = decode_provenance(cell)[min_val]['source'];
             var prov_hist = '<div>Source: ' + source +'</div>'
             return prov_hist;
           });
 
         },
         slide: function(evt, ui) {
-          var last_modified = cell.metadata['provenance'][ui.value]['last_modified'];
+          var last_modified = decode_provenance(cell)[ui.value]['last_modified'];
           if (last_modified) {
             last_modified = moment(last_modified).format();
           }
           $('.slider-time.' + cell_id).html(last_modified);
           $('.provenance_area.' + cell_id).html(function(){
-            var source = cell.metadata['provenance'][ui.value]['source'];
+            var source = decode_provenance(cell)[ui.value]['source'];
             var prov_hist = '<div>Source: ' + source +'</div>'
             return prov_hist;
           });
@@ -392,7 +732,7 @@ define([
 
     // Update provenance for code cells.
     function update_provenance_area_codecell (cell) {
-      var number_of_executions = cell.metadata['provenance'].length;
+      var number_of_executions = decode_provenance(cell).length;
       var min_val = 0;
       var max_val = number_of_executions-1;
       var cell_id = cell.cell_id;
@@ -406,14 +746,14 @@ define([
         value: min_val,
         orientation: "horizontal",
         create: function(evt, ui) {
-          var start_time = cell.metadata['provenance'][min_val]['start_time']
+          var start_time = decode_provenance(cell)[min_val]['start_time']
           if (start_time) {
             start_time = moment(start_time).format();
           }
           $('.slider-time.' + cell_id).html(start_time);
           $('.provenance_area.' + cell_id).html(function(){
-            var no_of_executions = cell.metadata['provenance'];
-            var prov_hist = get_provenance_entry(cell.metadata['provenance'], min_val);
+            var no_of_executions = decode_provenance(cell);
+            var prov_hist = get_provenance_entry(no_of_executions, min_val);
             prov_hist = '<p>Number of Runs:' + no_of_executions.length + '</p>' + prov_hist;
             return prov_hist;
           });
@@ -421,15 +761,15 @@ define([
         },
         slide: function(evt, ui) {
           $('.slider-time.' + cell_id).html(function(){
-            var start_time = cell.metadata['provenance'][ui.value]['start_time'];
+            var start_time = decode_provenance(cell)[ui.value]['start_time'];
             if (start_time) {
               start_time = moment(start_time).format();
             }
             return start_time;
           });
           $('.provenance_area.' + cell_id).html(function(){
-            var no_of_executions = cell.metadata['provenance']
-            var prov_hist = get_provenance_entry(cell.metadata['provenance'], ui.value);
+            var no_of_executions = decode_provenance(cell);
+            var prov_hist = get_provenance_entry(no_of_executions, ui.value);
             prov_hist = '<p>Number of Runs:' + no_of_executions.length + '</p>' + prov_hist;
             return prov_hist;
           });
@@ -439,7 +779,7 @@ define([
 
     // Check the type of cell and call respective functions for each type of cell.
     function update_provenance_area (cell) {
-      if ( !('provenance' in cell.metadata && cell.metadata['provenance'].length > 0)) {
+      if (decode_provenance(cell).length === 0) {
         return;
       }
       if ( cell instanceof MarkdownCell || cell instanceof RawCell ) {
@@ -510,22 +850,19 @@ define([
 	  }
 
 
-    // Calls the notebook_rdf extension to download the provenance data in RDF.
-    var callNbconvert = function () {
-      events.off('notebook_saved.Notebook');
-      var open_tab = true;
-  		var kernel = Jupyter.notebook.kernel;
-  		var notebook_name = Jupyter.notebook.notebook_name;
-      var extension = '.ttl'
-      var command = 'import os; os.system(\'notebook_rdf ' + notebook_name + '\')';
-
-  		function callback_opendocument() {
-  			if (open_tab === true) {
-  				var url = utils.splitext(notebook_name)[0] + extension;
-  				window.open(url, '_blank');
-  			}
-  		}
-  		kernel.execute(command, { shell: { reply : callback_opendocument } });
+    // Saves the notebook and downloads its RDF, converted by the ProvBook server extension.
+    var download_rdf = function (format) {
+      var url = utils.url_path_join(Jupyter.notebook.base_url, 'provbook/api/rdf',
+                                    utils.encode_uri_components(Jupyter.notebook.notebook_path)) +
+                '?' + $.param({format: format});
+      Jupyter.notebook.save_notebook().then(function () {
+        var link = document.createElement('a');
+        link.href = url;
+        link.download = '';
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+      });
     };
 
     function update_provenance_metadata(cell) {
@@ -542,7 +879,12 @@ define([
       var downloadSubMenu = $('<li id="download_html_embed"><a href="#">RDF (.ttl)</a></li>');
       download_menu.append(downloadSubMenu);
       downloadSubMenu.click(function () {
-          callNbconvert();
+          download_rdf('turtle');
+      });
+      var downloadNTriplesMenu = $('<li id="download_rdf_nt"><a href="#">RDF N-Triples (.nt)</a></li>');
+      download_menu.append(downloadNTriplesMenu);
+      downloadNTriplesMenu.click(function () {
+          download_rdf('nt');
       });
     }
 
@@ -586,7 +928,7 @@ define([
                 getprovdiff(base_selected_execution, remote_selected_execution);
             });
             select_remote.appendTo(provenance_book_diff_area);
-            var cell_provenance = cell.metadata['provenance'];
+            var cell_provenance = decode_provenance(cell);
             $('.provenance_book_diff_area.' + cell_id).html(function(){
                 add_option(select_base, cell_provenance);
                 add_option(select_remote, cell_provenance);
@@ -648,6 +990,55 @@ define([
         window.open(url);
     };
 
+    // Open the diff of two runs of the notebook, given by number or by time.
+    var getrundiff = function (base_run, remote_run, window_seconds) {
+        var nb_dir = utils.url_path_split(Jupyter.notebook.notebook_path)[0];
+        var name = Jupyter.notebook.notebook_name;
+        var base = path_join(nb_dir, name);
+        var url = window.location.origin + '/' + path_join(Jupyter.notebook.base_url, 'provbookdiff');
+        var run_param = function (side, run) {
+            run = $.trim(run);
+            if (/^-?\d+$/.test(run)) {
+                return '&' + side + '_run=' + run;
+            }
+            return '&' + side + '_time=' + encodeURIComponent(run);
+        };
+        url = url + '?base=' + base + run_param('base', base_run) + run_param('remote', remote_run) +
+          '&window=' + encodeURIComponent(window_seconds);
+        window.open(url);
+    };
+
+    var ProvBookRunDiffView = function () {
+        var base_input = $('<input type="text" class="form-control"/>').val('0');
+        var remote_input = $('<input type="text" class="form-control"/>').val('-1');
+        var window_input = $('<input type="number" min="0" class="form-control"/>').val('0');
+        var body = $('<div/>')
+            .append($('<p/>').text('Select two runs by number, where 0 is the original execution and -1 the latest, ' +
+                                   'or by the time the run started. A run selected by time includes the executions ' +
+                                   'started up to the given number of seconds later.'))
+            .append($('<label/>').text('Base run'))
+            .append(base_input)
+            .append($('<label/>').text('Remote run'))
+            .append(remote_input)
+            .append($('<label/>').text('Window (seconds)'))
+            .append(window_input);
+        dialog.modal({
+            title: 'Provenance difference of runs',
+            body: body,
+            notebook: Jupyter.notebook,
+            keyboard_manager: Jupyter.keyboard_manager,
+            buttons: {
+                'Cancel': {},
+                'Compare': {
+                    'class': 'btn-primary',
+                    'click': function () {
+                        getrundiff(base_input.val(), remote_input.val(), window_input.val() || 0);
+                    }
+                }
+            }
+        });
+    };
+
     var register_provbook = function() {
         if ($.ui === undefined ) {
             requirejs(['jquery-ui'], function ($) {}, function (err) {
@@ -671,13 +1062,19 @@ define([
             $.extend(true, options, Jupyter.notebook.config.data[mod_name]);
         }, function on_config_load_error (reason) {
             console.warn(log_prefix, 'Using defaults after error loading config:', reason);
+        }).then(function load_store () {
+            if (options.provenance_store === 'sidecar') {
+                return load_provenance_store();
+            }
         }).then(function do_stuff_with_config () {
             update_original_notebook_provenance();
             patch_CodeCell_get_callbacks();
+            patch_CodeCell_clear_output();
             add_toolbar_buttons(); // Buttons for the provenance of selected and all cells
             create_provenance_menu();
             create_download_rdf_menu();
             events.on('checkpoint_created.Notebook', update_provenance_metadata);
+            events.on('before_save.Notebook', apply_retention_policy);
 
         }).catch(function on_error (reason) {
             console.error(log_prefix, 'Error:', reason);
@@ -4,3 +4,21 @@ from __future__ import absolute_import
 #from .rdf2nb import *
 from .__main__ import *
 
+# The converters import rdflib and nbformat, so they are only imported
+# when they are first used as attributes of the package (Python 3.7+).
+LAZY_ATTRIBUTES = {
+    'NBToRDFConverter': 'nb2rdf',
+    'convert_rdf_to_notebook': 'rdf2nb',
+    'convert_store_to_notebooks': 'rdf2nb',
+    'open_rdf_store': 'sqlitestore',
+    'PPLAN': 'namespaces',
+    'PROV': 'namespaces',
+    'REPRODUCE': 'namespaces',
+}
+
+
+def __getattr__(name):
+    if name not in LAZY_ATTRIBUTES:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    import importlib
+    return getattr(importlib.import_module('.' + LAZY_ATTRIBUTES[name], __name__), name)
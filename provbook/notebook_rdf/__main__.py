@@ -4,9 +4,17 @@
 # Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
 
 from __future__ import absolute_import
+from __future__ import print_function
 import argparse
-from .nb2rdf import NBToRDFConverter
-from .rdf2nb import convert_rdf_to_notebook
+# The converters, rdflib and nbformat are imported by the functions using
+# them, so that parsing the arguments and --help do not wait for them.
+from .batch import find_input_files, convert_files
+from .dataset import DATASET_BASE_IRI, NOTEBOOK_IRI_SCHEMES
+from .formats import LINE_FORMATS, RDF_FORMATS, rdf_format_of
+from .payloads import PayloadPolicy, parse_mime_patterns
+from .profiling import Profiler, cprofile_path, write_profile_report
+from .watch import DEBOUNCE_SECONDS, watch_files
+from ..provenance import load_retention_policy
 import sys
 import os
 
@@ -16,9 +24,35 @@ Example usage of notebook_rdf
 Convert your notebook to RDF
     python3.5 notebook_rdf --from notebook your_notebook.ipynb --to RDF
     python3.5 notebook_rdf your_notebook.ipynb
+Stream the RDF of a large notebook to N-Triples, one cell at a time
+    python3.5 notebook_rdf --stream nt your_notebook.ipynb
+Convert a notebook larger than memory, reading and writing it one cell at a time
+    python3.5 notebook_rdf --stream-input --stream nt your_large_notebook.ipynb
+Only export the text and JSON outputs, and hashes of the other outputs and of outputs over 64 KB
+    python3.5 notebook_rdf --include-mime 'text/*,application/json' --max-payload 65536 your_notebook.ipynb
+Convert the cells of a large notebook to N-Triples in 8 processes
+    python3.5 notebook_rdf --cell-jobs 8 --stream nt your_large_notebook.ipynb
+Convert your notebook to N-Quads, written one cell at a time
+    python3.5 notebook_rdf --rdf-format nquads your_notebook.ipynb
+Convert a directory of notebooks into one N-Quads dataset, a named graph per notebook
+    python3.5 notebook_rdf --dataset corpus.nq notebooks/
+Add a directory of notebooks to a persistent store, a named graph per notebook
+    python3.5 notebook_rdf --store corpus.sqlite notebooks/
+Query the store, or rebuild the notebooks stored in it
+    python3.5 notebook_rdf --store corpus.sqlite --query 'select (count(*) as ?n) where { ?s ?p ?o }'
+    python3.5 notebook_rdf --from RDF --store corpus.sqlite
 Convert your RDF to notebook
     python3.5 notebook_rdf --from RDF notebook_rdf.ttl --to notebook
     python3.5 notebook_rdf notebook_rdf.ttl
+    python3.5 notebook_rdf notebook_rdf.nt
+Report the time and memory of every phase of the conversion, with a cProfile dump
+    python3.5 notebook_rdf --profile report.json --cprofile conversion.prof your_notebook.ipynb
+Convert all notebooks in a directory with 8 processes
+    python3.5 notebook_rdf --jobs 8 notebooks/
+Convert the notebooks of a directory again whenever they are saved, logging every pass
+    python3.5 notebook_rdf --watch --status-log watch.log notebooks/
+Convert RDF files matching a glob pattern back to notebooks
+    python3.5 notebook_rdf --from RDF 'exports/*.ttl'
 """
 
 
@@ -28,10 +62,11 @@ def command_line_parser():
                   """
     parser = argparse.ArgumentParser(description=description,
                                      epilog=example_use)
-    parser.add_argument('input_file',
-                        help="The input file",
-                        nargs="?",
-                        default='-')
+    parser.add_argument('inputs',
+                        metavar='input_file',
+                        help=("The input file. Several files, directories "
+                              "or glob patterns are converted in a batch"),
+                        nargs="*")
     parser.add_argument('-o', '--output',
                     help=("output file, (default STDOUT). "
                           "If flag used but no file given, use "
@@ -52,6 +87,125 @@ def command_line_parser():
                         choices=('notebook', 'RDF'),
                         help=("The format to convert to, defaults to RDF "
                               "or file extension"))
+    parser.add_argument('--stream',
+                        help=("Write the RDF to the output file one cell at a time "
+                              "as N-Triples or Turtle instead of building "
+                              "the whole graph in memory"),
+                        choices=('nt', 'turtle'))
+    parser.add_argument('--rdf-format',
+                        help=("The RDF format to write or to read, defaults to turtle "
+                              "or the extension of the RDF file. nt and nquads are "
+                              "written one cell at a time and read line by line"),
+                        choices=tuple(RDF_FORMATS))
+    parser.add_argument('--dataset',
+                        metavar='OUTPUT',
+                        help=("Convert all the input notebooks into this N-Quads file, "
+                              "each notebook into its own named graph with IRIs "
+                              "that include the notebook"))
+    parser.add_argument('--notebook-iri',
+                        help=("The notebook id in the IRIs of --dataset: its path "
+                              "(default) or the SHA-256 of its content"),
+                        choices=NOTEBOOK_IRI_SCHEMES,
+                        default='path')
+    parser.add_argument('--base-iri',
+                        help=("The IRI the notebook ids of --dataset are appended to, "
+                              "also used to name the notebooks rebuilt from a dataset"),
+                        default=DATASET_BASE_IRI)
+    parser.add_argument('--store',
+                        metavar='SPEC',
+                        help=("Add the input notebooks to this persistent RDF store "
+                              "like --dataset, or with --from RDF rebuild the notebooks "
+                              "of the store, or those given by id. SPEC is a SQLite "
+                              "file or <rdflib store plugin>:<configuration>"))
+    parser.add_argument('--query',
+                        metavar='SPARQL',
+                        help="Run a SPARQL query on --store and print the result as CSV")
+    parser.add_argument('--incremental',
+                        help=("Only convert the cells and executions that changed since "
+                              "the last run and patch the previous output, using a "
+                              "manifest written next to it"),
+                        action='store_true')
+    parser.add_argument('--dedup',
+                        help=("Store identical sources and output payloads once, "
+                              "as blob nodes named after their SHA-256. Off by default: "
+                              "the RDF gets larger when few payloads repeat"),
+                        action='store_true')
+    parser.add_argument('--blob-dir',
+                        help=("Deduplicate payloads and write the ones of at least "
+                              "--blob-size bytes to files in this directory"))
+    parser.add_argument('--blob-size',
+                        help="Minimum size in bytes of payloads written to --blob-dir",
+                        type=int,
+                        default=65536)
+    parser.add_argument('--stream-input',
+                        help=("Parse the notebook one cell at a time instead of loading it "
+                              "whole, for notebooks of nbformat 4 too large for memory. "
+                              "Best with --stream, --dataset or --store"),
+                        action='store_true')
+    parser.add_argument('--include-mime',
+                        help=("Only export the output payloads of these MIME types, as "
+                              "comma-separated patterns such as text/*,application/json. "
+                              "Stream outputs are text/plain"),
+                        metavar='PATTERNS',
+                        action='append')
+    parser.add_argument('--exclude-mime',
+                        help=("Do not export the output payloads of these MIME types, as "
+                              "comma-separated patterns such as image/*,application/vnd.*"),
+                        metavar='PATTERNS',
+                        action='append')
+    parser.add_argument('--max-payload',
+                        help=("Maximum size in bytes of an exported output payload. Larger and "
+                              "filtered out payloads are replaced by their SHA-256, size and MIME type"),
+                        metavar='BYTES',
+                        type=int)
+    parser.add_argument('--apply-retention',
+                        help=("Convert only the provenance entries kept by the retention policy of "
+                              "the provbook nbconfig. The executions are numbered after the eviction"),
+                        action='store_true')
+    parser.add_argument('--sparql',
+                        help=("Rebuild the notebook from RDF with one SPARQL query "
+                              "per cell instead of a single indexed pass over the graph"),
+                        action='store_true')
+    parser.add_argument('--profile',
+                        metavar='REPORT',
+                        help=("Write the time, triples, bytes and peak memory of every phase "
+                              "of the conversion of every file to this JSON report"))
+    parser.add_argument('--profile-memory',
+                        help=("Also trace the peak memory allocated in every phase of --profile, "
+                              "which makes the conversion several times slower"),
+                        action='store_true')
+    parser.add_argument('--cprofile',
+                        metavar='FILE',
+                        help=("Write the cProfile statistics of the conversion to FILE, "
+                              "or of every file of a batch next to FILE"))
+    parser.add_argument('-j', '--jobs',
+                        help=("Number of processes converting a batch of files, "
+                              "defaults to the number of CPUs"),
+                        type=int)
+    parser.add_argument('--cell-jobs',
+                        help=("Number of processes converting the cells of a notebook, for "
+                              "N-Triples and N-Quads"),
+                        type=int,
+                        default=1)
+    parser.add_argument('--watch',
+                        help=("Keep converting the input notebooks, and the notebooks of the "
+                              "input directories, whenever they are saved, until interrupted"),
+                        action='store_true')
+    parser.add_argument('--debounce',
+                        metavar='SECONDS',
+                        help=("With --watch, convert a notebook once it has not been saved "
+                              "for SECONDS"),
+                        type=float,
+                        default=DEBOUNCE_SECONDS)
+    parser.add_argument('--poll',
+                        metavar='SECONDS',
+                        help=("With --watch, check the notebooks for changes every SECONDS "
+                              "instead of using inotify, for network file systems"),
+                        type=float)
+    parser.add_argument('--status-log',
+                        metavar='FILE',
+                        help=("With --watch, append the conversion time and latency of the "
+                              "files of every pass to FILE as lines of JSON"))
     parser.add_argument('--examples',
                         help=('Show example usage'),
                         action='store_true')
@@ -63,9 +217,8 @@ def file_extension_detect(filename):
     based on the file extension.
     """
     _, extension = os.path.splitext(filename)
-    rdf_exts = ['.ttl', '.nt', '.jsonld', '.json']
     nb_exts = ['.ipynb']
-    if extension in rdf_exts:
+    if rdf_format_of(filename):
         return 'RDF'
     elif extension in nb_exts:
         return 'notebook'
@@ -73,15 +226,48 @@ def file_extension_detect(filename):
         return None
 
 
-def main(args, help=''):
-    if args.examples:
-        print(examples)
-        sys.exit()
+def make_converter(args, profiler=None):
+    from .nb2rdf import NBToRDFConverter
+    payload_policy = None
+    if args.include_mime or args.exclude_mime or args.max_payload is not None:
+        payload_policy = PayloadPolicy(parse_mime_patterns(args.include_mime), parse_mime_patterns(args.exclude_mime),
+                                       args.max_payload)
+    return NBToRDFConverter(dedup=args.dedup,
+                            blob_dir=args.blob_dir,
+                            blob_size=args.blob_size,
+                            retention=load_retention_policy() if args.apply_retention else None,
+                            stream_input=args.stream_input,
+                            payload_policy=payload_policy,
+                            cell_jobs=args.cell_jobs,
+                            profiler=profiler)
+
+
+def make_profiler(args, input_file, batch=False):
+    """Return the Profiler of the conversion of `input_file`, or None."""
+    if not (getattr(args, 'profile', None) or getattr(args, 'cprofile', None)):
+        return None
+    cprofile_file = args.cprofile
+    if cprofile_file and batch:
+        cprofile_file = cprofile_path(cprofile_file, input_file)
+    return Profiler(memory=getattr(args, 'profile_memory', False), cprofile_file=cprofile_file)
 
-    if len(sys.argv) == 1:
-        parser.print_help(sys.stderr)
-        sys.exit()
 
+def query_store(args):
+    from .namespaces import PPLAN, PROV, REPRODUCE
+    from .sqlitestore import open_rdf_store
+    rdf_store = open_rdf_store(args.store, create=False)
+    try:
+        result = rdf_store.query(args.query, initNs={'p-plan': PPLAN, 'repr': REPRODUCE, 'prov': PROV})
+        if result.type == 'ASK':
+            print(str(result.askAnswer).lower())
+        else:
+            output = result.serialize(format='csv' if result.type == 'SELECT' else 'nt')
+            getattr(sys.stdout, 'buffer', sys.stdout).write(output)
+    finally:
+        rdf_store.close()
+
+
+def convert(args, profiler=None):
     informat = args.informat or file_extension_detect(args.input_file) or 'notebook'
     if args.outformat:
         outformat = args.outformat
@@ -90,10 +276,92 @@ def main(args, help=''):
     else:
         outformat = 'notebook'
     if informat=='notebook' and outformat=='RDF':
-        nbtordfconverter = NBToRDFConverter()
+        nbtordfconverter = make_converter(args, profiler)
         nbtordfconverter.convert_notebook_to_rdf(args)
     if informat=='RDF' and outformat=='notebook':
-        convert_rdf_to_notebook(args)
+        from .rdf2nb import convert_rdf_to_notebook
+        convert_rdf_to_notebook(args, profiler)
+
+
+def main(args, help=''):
+    if args.examples:
+        print(examples)
+        sys.exit()
+
+    if args.stream and args.rdf_format and args.stream != args.rdf_format:
+        print("--stream {0} conflicts with --rdf-format {1}".format(args.stream, args.rdf_format), file=sys.stderr)
+        sys.exit(2)
+    if args.dataset and (args.incremental or args.informat == 'RDF' or
+                         (args.rdf_format or args.stream or 'nquads') != 'nquads'):
+        print("--dataset converts notebooks to N-Quads and cannot be combined with --incremental", file=sys.stderr)
+        sys.exit(2)
+    if args.store and (args.incremental or (args.rdf_format or args.stream or 'nquads') != 'nquads'):
+        print("--store adds notebooks as named graphs and cannot be combined with --incremental, "
+              "--stream or --rdf-format", file=sys.stderr)
+        sys.exit(2)
+    if args.query and not args.store:
+        print("--query needs --store", file=sys.stderr)
+        sys.exit(2)
+
+    if args.store and (args.query or args.informat == 'RDF'):
+        try:
+            if args.query:
+                query_store(args)
+            else:
+                from .rdf2nb import convert_store_to_notebooks
+                convert_store_to_notebooks(args)
+        except IOError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        return
+    if args.cell_jobs > 1:
+        rdf_format = args.rdf_format or args.stream or ('nquads' if args.dataset or args.store else 'turtle')
+        if rdf_format not in LINE_FORMATS or args.incremental or args.informat == 'RDF':
+            print("--cell-jobs writes N-Triples or N-Quads, use --stream nt, --rdf-format nquads, --dataset "
+                  "or --store, without --incremental", file=sys.stderr)
+            sys.exit(2)
+        if args.jobs and args.jobs > 1:
+            print("--cell-jobs converts one notebook at a time and cannot be combined with --jobs", file=sys.stderr)
+            sys.exit(2)
+    if args.watch and (args.dataset or args.query or args.informat == 'RDF' or args.cell_jobs > 1):
+        print("--watch converts notebooks to RDF files next to them or to --store, and cannot be combined "
+              "with --dataset, --query, --from RDF or --cell-jobs", file=sys.stderr)
+        sys.exit(2)
+    if args.incremental and (args.rdf_format or args.stream) == 'json-ld':
+        print("--incremental cannot patch JSON-LD, use turtle, nt or nquads", file=sys.stderr)
+        sys.exit(2)
+
+    if not args.inputs:
+        print(help, file=sys.stderr)
+        sys.exit()
+
+    if args.watch:
+        failed = watch_files(args.inputs, args, file_extension_detect, jobs=args.jobs, debounce=args.debounce,
+                             poll_interval=args.poll, status_log=args.status_log)
+        if failed:
+            sys.exit(1)
+        return
+
+    if len(args.inputs) == 1 and os.path.isfile(args.inputs[0]) and not args.jobs and not args.dataset and not args.store:
+        args.input_file = args.inputs[0]
+        profiler = make_profiler(args, args.input_file)
+        if profiler is None:
+            convert(args)
+            return
+        profiler.start()
+        try:
+            convert(args, profiler)
+        finally:
+            profiler.stop()
+            if args.profile:
+                write_profile_report(args.profile, [profiler.report(file=args.input_file)])
+        return
+
+    informat = args.informat or 'notebook'
+    input_files = find_input_files(args.inputs, informat, file_extension_detect)
+    failed = convert_files(input_files, args, jobs=1 if args.cell_jobs > 1 else args.jobs)
+    if failed:
+        sys.exit(1)
 
 def app():
     parser = command_line_parser()
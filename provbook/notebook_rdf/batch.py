@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+from __future__ import print_function
+
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+from .profiling import write_profile_report
+
+
+def find_input_files(inputs, informat, file_extension_detect):
+    """Expand files, directories and glob patterns into a list of files.
+
+    Directories are searched recursively for files of `informat`.
+    Files and glob matches are kept whatever their extension, the format
+    of each one is detected when it is converted.
+    """
+    input_files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if d != '.ipynb_checkpoints')
+                for filename in sorted(files):
+                    if file_extension_detect(filename) == informat:
+                        input_files.append(os.path.join(root, filename))
+        elif os.path.isfile(path):
+            input_files.append(path)
+        else:
+            input_files.extend(sorted(f for f in glob.glob(path) if os.path.isfile(f)))
+    seen = set()
+    unique_files = []
+    for input_file in input_files:
+        if input_file not in seen:
+            seen.add(input_file)
+            unique_files.append(input_file)
+    return unique_files
+
+
+def run_job(convert_job, work):
+    """Run `convert_job(input_file, args, profiler)` for a file of the batch.
+
+    Returns (input file, ok, time, error, result of the job, profile report).
+    """
+    input_file, options = work
+    from .__main__ import make_profiler
+    args = argparse.Namespace(**options)
+    profiler = make_profiler(args, input_file, batch=True)
+    if profiler is not None:
+        profiler.start()
+    start_time = time.time()
+    error = result = None
+    try:
+        result = convert_job(input_file, args, profiler)
+    except Exception as e:
+        error = '{0}: {1}'.format(type(e).__name__, e)
+    elapsed = time.time() - start_time
+    report = None
+    if profiler is not None:
+        profiler.stop()
+        report = profiler.report(file=input_file, ok=error is None, error=error)
+    return input_file, error is None, elapsed, error, result, report
+
+
+def convert_notebook_file(input_file, args, profiler):
+    from .__main__ import convert
+    args.input_file = input_file
+    convert(args, profiler)
+
+
+def convert_dataset_notebook(input_file, args, profiler):
+    from .__main__ import make_converter
+    from .sqlitestore import parse_store_spec
+    fout = io.StringIO()
+    converter = make_converter(args, profiler)
+    converter.blob_base_dir = os.path.dirname(args.dataset or parse_store_spec(args.store)[1]) or os.curdir
+    converter.convert_notebook_to_dataset(input_file, fout, args.notebook_iri, args.base_iri)
+    return fout.getvalue()
+
+
+def convert_file(work):
+    return run_job(convert_notebook_file, work)
+
+
+def convert_dataset_file(work):
+    return run_job(convert_dataset_notebook, work)
+
+
+def job_options(args):
+    """Return the options of the command line sent with every file to the workers."""
+    options = dict(vars(args))
+    options.pop('input_file', None)
+    options.pop('inputs', None)
+    return options
+
+
+def convert_files(input_files, args, jobs=None):
+    """Convert `input_files` in a pool of `jobs` processes.
+
+    A status line is printed for every file as soon as it is converted,
+    followed by a throughput summary. With `args.dataset`, the N-Quads of
+    every notebook are appended to that file as soon as it is converted.
+    With `args.store`, they are added to that store by this process only,
+    and committed file by file. With `args.profile`, the profile reports of
+    all files are written there at the end. Returns the number of failures.
+    """
+    options = job_options(args)
+    work = [(input_file, options) for input_file in input_files]
+    jobs = max(1, min(jobs or multiprocessing.cpu_count(), len(work)))
+
+    job = convert_dataset_file if options.get('dataset') or options.get('store') else convert_file
+
+    start_time = time.time()
+    if jobs == 1:
+        pool = None
+        results = map(job, work)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap_unordered(job, work)
+
+    dataset = io.open(options['dataset'], 'w', encoding='utf-8') if options.get('dataset') else None
+    rdf_store = loader = None
+    if options.get('store'):
+        from .sqlitestore import StoreLoader, open_rdf_store
+        rdf_store = open_rdf_store(options['store'])
+        loader = StoreLoader(rdf_store)
+    converted = failed = 0
+    reports = []
+    input_bytes = 0
+    try:
+        for input_file, ok, elapsed, error, quads, report in results:
+            if report is not None:
+                reports.append(report)
+            if ok:
+                converted += 1
+                input_bytes += os.path.getsize(input_file)
+                if dataset is not None:
+                    dataset.write(quads)
+                if loader is not None:
+                    loader.load(quads)
+                print('[ok] {0} ({1:.2f}s)'.format(input_file, elapsed))
+            else:
+                failed += 1
+                print('[failed] {0} ({1:.2f}s): {2}'.format(input_file, elapsed, error), file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if dataset is not None:
+            dataset.close()
+        if rdf_store is not None:
+            rdf_store.close(commit_pending_transaction=True)
+
+    if options.get('profile'):
+        write_profile_report(options['profile'], reports)
+
+    total_time = time.time() - start_time
+    rate = total_time and converted / total_time
+    print('Converted {0} of {1} files in {2:.2f}s with {3} jobs '
+          '({4:.2f} files/s, {5:.2f} MB/s), {6} failed'.format(
+              converted, len(input_files), total_time, jobs, rate,
+              total_time and input_bytes / total_time / 1e6, failed))
+    return failed
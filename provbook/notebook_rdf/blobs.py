@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+import hashlib
+import io
+import os
+
+from rdflib import Literal, URIRef
+from rdflib.namespace import RDF
+
+from .namespaces import PROV
+
+
+def blob_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_blob(blob_dir, digest, data):
+    """Write `data` to `blob_dir` under its digest, unless it is already there.
+
+    Processes converting in parallel may write the same blob, so it is
+    written to a file of the process and renamed.
+    """
+    blob_path = os.path.join(blob_dir, digest[:2], digest)
+    if not os.path.exists(blob_path):
+        try:
+            os.makedirs(os.path.dirname(blob_path))
+        except OSError:
+            if not os.path.isdir(os.path.dirname(blob_path)):
+                raise
+        temp_path = '{0}.{1}.tmp'.format(blob_path, os.getpid())
+        with io.open(temp_path, 'wb') as fout:
+            fout.write(data)
+        try:
+            os.rename(temp_path, blob_path)
+        except OSError:
+            # Windows does not rename over the blob written by another process.
+            os.remove(temp_path)
+    return blob_path
+
+
+def read_blob(base_dir, location):
+    with io.open(os.path.join(base_dir, str(location)), 'rb') as fin:
+        return Literal(fin.read().decode('utf-8'))
+
+
+def resolve_blob(rdfgraph, blob, base_dir):
+    """Return the content of a blob node as a Literal, or None."""
+    for value in rdfgraph.objects(blob, RDF.value):
+        return value
+    for location in rdfgraph.objects(blob, PROV.atLocation):
+        return read_blob(base_dir, location)
+
+
+def inline_blobs(rdfgraph, base_dir):
+    """Replace every blob node used as an rdf:value by its content."""
+    contents = {}
+    for subject, blob in list(rdfgraph.subject_objects(RDF.value)):
+        if not isinstance(blob, URIRef):
+            continue
+        if blob not in contents:
+            contents[blob] = resolve_blob(rdfgraph, blob, base_dir)
+        if contents[blob] is not None:
+            rdfgraph.remove((subject, RDF.value, blob))
+            rdfgraph.add((subject, RDF.value, contents[blob]))
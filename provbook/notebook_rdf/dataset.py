@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Identity of notebooks in a dataset of many notebooks.
+
+In a dataset, the IRIs of the cells, executions and outputs of a notebook
+are minted in a namespace of their own, `<base IRI><notebook id>#`, and
+its triples are put into the named graph `<base IRI><notebook id>`. The id
+is the path of the notebook, or the SHA-256 of its content.
+"""
+
+import hashlib
+import io
+import os
+
+from six.moves.urllib.parse import quote, unquote
+
+DATASET_BASE_IRI = 'https://w3id.org/reproduceme/notebook/'
+
+NOTEBOOK_IRI_SCHEMES = ('path', 'hash')
+
+
+def notebook_id(notebook_file, scheme='path'):
+    """Return the id of a notebook in the IRIs of a dataset."""
+    if scheme == 'hash':
+        digest = hashlib.sha256()
+        with io.open(notebook_file, 'rb') as fin:
+            for block in iter(lambda: fin.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    path = os.path.relpath(notebook_file)
+    if path.split(os.sep)[0] == os.pardir:
+        path = os.path.abspath(notebook_file).lstrip(os.sep)
+    return quote(path.replace(os.sep, '/'), safe='/')
+
+
+def dataset_notebook_path(graph_name, base_iri=DATASET_BASE_IRI):
+    """Return the relative path of the notebook rebuilt from a named graph."""
+    name = graph_name[len(base_iri):] if graph_name.startswith(base_iri) else quote(graph_name, safe='')
+    parts = [part for part in unquote(name).split('/') if part not in ('', os.curdir, os.pardir)]
+    path = os.path.join(*parts) if parts else 'notebook'
+    if not path.endswith('.ipynb'):
+        path += '.ipynb'
+    return path
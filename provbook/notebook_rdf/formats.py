@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+import os
+from collections import OrderedDict
+
+# RDF formats of notebook_rdf and the extension of their files.
+RDF_FORMATS = OrderedDict([
+    ('turtle', 'ttl'),
+    ('nt', 'nt'),
+    ('nquads', 'nq'),
+    ('json-ld', 'jsonld'),
+])
+
+RDF_EXTENSIONS = {
+    '.ttl': 'turtle',
+    '.nt': 'nt',
+    '.nq': 'nquads',
+    '.jsonld': 'json-ld',
+    '.json': 'json-ld',
+}
+
+# One statement per line: written while converting and read without a graph.
+LINE_FORMATS = ('nt', 'nquads')
+
+
+def rdf_format_of(filename, default=None):
+    """Return the RDF format of a file from its extension."""
+    return RDF_EXTENSIONS.get(os.path.splitext(filename)[1].lower(), default)
+
+
+def rdf_output_file(input_file, rdf_format):
+    """Return the RDF file a notebook is converted to, next to the notebook."""
+    notebook_name = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.join(os.path.dirname(input_file), notebook_name + "." + RDF_FORMATS[rdf_format])
+
+
+def serializer_format(format):
+    """Return the rdflib serializer writing `format` from a graph without contexts."""
+    # N-Quads of the default graph are N-Triples.
+    return 'nt' if format == 'nquads' else format
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+from collections import OrderedDict, defaultdict
+from itertools import product
+
+from rdflib import URIRef
+from rdflib.namespace import RDF
+import nbformat.v4.nbbase as nbbase
+
+from .blobs import read_blob
+from .namespaces import PPLAN, REPRODUCE, PROV
+from .payloads import rebuilt_payload
+
+
+def _row_key(row):
+    # Unbound values sort first, as they do for SPARQL result rows.
+    return tuple((0,) if term is None else (1, term) for term in row)
+
+
+class NotebookGraphIndex(object):
+    """Rebuild a notebook from its RDF graph without SPARQL.
+
+    The graph is walked once to index the objects of every subject by
+    predicate. Cells, executions, outputs and suboutputs are then read
+    from the index, so the work grows linearly with the number of triples.
+    Sources and outputs deduplicated into blob nodes are resolved to their
+    content. The result is the same notebook as the one assembled by the queries in
+    rdf2nb, except that the outputs of an execution are always ordered by
+    their IRI instead of by the order of the variables of `select *`.
+    """
+
+    def __init__(self, rdfgraph=None, base_dir='.'):
+        self.base_dir = base_dir
+        self.blobs = {}
+        self.subjects = defaultdict(lambda: defaultdict(list))
+        self.notebooks = []
+        self.cells = []
+        self.executions = defaultdict(list)
+        self.triple_count = 0
+        if rdfgraph is not None:
+            for subject, predicate, obj in rdfgraph:
+                self.triple(subject, predicate, obj)
+
+    def triple(self, subject, predicate, obj):
+        """Index a triple, so the index is also a sink of rdfstream.LineParser."""
+        self.triple_count += 1
+        self.subjects[subject][predicate].append(obj)
+        if predicate == RDF.type:
+            if obj == PPLAN.Step:
+                self.cells.append(subject)
+            elif obj == REPRODUCE.Notebook:
+                self.notebooks.append(subject)
+        elif predicate == PPLAN.correspondsToStep:
+            self.executions[obj].append(subject)
+
+    def values(self, subject, predicate):
+        predicates = self.subjects.get(subject)
+        if predicates is None:
+            return []
+        values = predicates.get(predicate, [])
+        if predicate == RDF.value:
+            return [self.resolve_blob(value) for value in values]
+        return values
+
+    def resolve_blob(self, value):
+        if not isinstance(value, URIRef):
+            return value
+        if value not in self.blobs:
+            content = self.values(value, RDF.value)
+            if content:
+                self.blobs[value] = content[0]
+            else:
+                locations = self.values(value, PROV.atLocation)
+                self.blobs[value] = read_blob(self.base_dir, locations[0]) if locations else value
+        return self.blobs[value]
+
+    def rows(self, subject, required=(), optional=()):
+        """Return the sorted combinations of the values of `subject`.
+
+        A missing required predicate yields no rows, a missing optional
+        predicate yields None, like a SPARQL OPTIONAL clause.
+        """
+        columns = []
+        for predicate in required:
+            values = self.values(subject, predicate)
+            if not values:
+                return []
+            columns.append(values)
+        for predicate in optional:
+            columns.append(self.values(subject, predicate) or [None])
+        return sorted(product(*columns), key=_row_key)
+
+    def get_suboutput_rows(self, output):
+        suboutput_rows = []
+        for suboutput in self.values(output, REPRODUCE.hasSubOutput):
+            for datatype, value, digest, size in self.rows(suboutput,
+                                                           required=(REPRODUCE.hasDataType,),
+                                                           optional=(RDF.value,
+                                                                     REPRODUCE.hasHash,
+                                                                     REPRODUCE.hasByteLength)):
+                value = rebuilt_payload(value, datatype, digest, size)
+                if value is not None:
+                    suboutput_rows.append((suboutput, value, datatype))
+        return sorted(suboutput_rows, key=_row_key)
+
+    def get_suboutput_data(self, output):
+        data = {}
+        for suboutput, value, datatype in self.get_suboutput_rows(output):
+            data[str(datatype)] = str(value)
+        return data
+
+    def get_cell_source(self, cell):
+        source_rows = []
+        for source in self.values(cell, PPLAN.hasInputVar):
+            for source_value in self.values(source, RDF.value):
+                source_rows.append((source, source_value))
+        if source_rows:
+            return sorted(source_rows, key=_row_key)[0][1]
+
+    def get_cell_output(self, cell):
+        output_rows = []
+        for output in self.values(cell, PPLAN.hasOutputVar):
+            for row in self.rows(output, optional=(RDF.value,
+                                                   REPRODUCE.hasType,
+                                                   REPRODUCE.hasErrorName,
+                                                   REPRODUCE.hasErrorTraceback,
+                                                   REPRODUCE.hasExecutionCount,
+                                                   REPRODUCE.hasHash,
+                                                   REPRODUCE.hasByteLength)):
+                output_rows.append((output,) + row)
+        for output_node, output_value, output_type, error_name, error_traceback, execution_count, digest, size in sorted(output_rows, key=_row_key):
+            # The text of a stream left out by the payload policy of the export is a placeholder.
+            output_value = rebuilt_payload(output_value, 'text/plain', digest, size)
+            if not output_type:
+                continue
+            output_type = str(output_type)
+            output = {
+                'output_type': output_type,
+            }
+            if output_type == 'execute_result' or output_type == 'display_data':
+                suboutput_rows = self.get_suboutput_rows(output_node)
+                output['data'] = self.get_suboutput_data(output_node)
+                if output_value and suboutput_rows:
+                    suboutput, value, datatype = suboutput_rows[-1]
+                    output['data'] = {
+                        str(datatype): str(value)
+                    }
+                output['metadata'] = {}
+                if execution_count:
+                    output['execution_count'] = int(execution_count)
+            elif output_type == 'stream':
+                output['name'] = 'stdout'
+                output['text'] = output_value or ''
+            elif output_type == 'error':
+                output['ename'] = error_name
+                output['evalue'] = str(output_value)
+                output['traceback'] = []
+            return output
+
+    def get_execution_outputs(self, execution):
+        output_rows = []
+        for output in self.values(execution, PROV.generated):
+            for row in self.rows(output,
+                                 required=(REPRODUCE.hasType,),
+                                 optional=(RDF.value,
+                                           REPRODUCE.hasErrorName,
+                                           REPRODUCE.hasErrorTraceback,
+                                           REPRODUCE.hasExecutionCount,
+                                           REPRODUCE.hasHash,
+                                           REPRODUCE.hasByteLength)):
+                output_rows.append((output,) + row)
+        outputs = []
+        for output_node, output_type, output_value, error_name, error_traceback, execution_count, digest, size in sorted(output_rows, key=_row_key):
+            # The text of a stream left out by the payload policy of the export is a placeholder.
+            output_value = rebuilt_payload(output_value, 'text/plain', digest, size)
+            output_type = str(output_type)
+            output = {
+                'output_type': output_type,
+            }
+            if output_type == 'execute_result' or output_type == 'display_data':
+                output['data'] = self.get_suboutput_data(output_node)
+            elif output_type == 'stream':
+                output['name'] = 'stdout'
+                output['text'] = output_value or ''
+            elif output_type == 'error':
+                output['ename'] = error_name
+                output['evalue'] = str(output_value)
+                output['traceback'] = []
+            outputs.append(output)
+        return outputs
+
+    def create_provenance(self, cell):
+        provenance_metadata = {}
+        execution_rows = []
+        for execution in self.executions.get(cell, []):
+            for ended, started, execution_time, source in self.rows(execution, required=(PROV.endedAtTime,
+                                                                                         PROV.startedAtTime,
+                                                                                         REPRODUCE.executionTime,
+                                                                                         PROV.used)):
+                for source_value in self.values(source, RDF.value) or [None]:
+                    execution_rows.append((execution, ended, started, execution_time, source, source_value))
+        for execution, ended, started, execution_time, source, source_value in sorted(execution_rows, key=_row_key):
+            if 'provenance' not in provenance_metadata:
+                provenance_metadata['provenance'] = []
+            provenance_metadata['provenance'].append({
+                'end_time': ended,
+                'start_time': started,
+                'execution_time': execution_time,
+                'source': source_value,
+                'outputs': self.get_execution_outputs(execution)
+                }
+            )
+        return provenance_metadata
+
+    def create_cell(self, cell, **kwargs):
+        cell_type = str(kwargs['cell_type'])
+        source = self.get_cell_source(cell)
+        if source:
+            kwargs['source'] = source
+        kwargs['metadata'] = self.create_provenance(cell)
+        if cell_type == 'code':
+            output = self.get_cell_output(cell)
+            kwargs['outputs'] = [nbbase.new_output(**output)] if output else []
+            return nbbase.new_code_cell(**kwargs)
+        elif cell_type == 'markdown':
+            return nbbase.new_markdown_cell(**kwargs)
+        elif cell_type == 'raw':
+            return nbbase.new_raw_cell(**kwargs)
+
+    def get_notebook_cells(self):
+        cell_rows = []
+        for cell in self.cells:
+            for row in self.rows(cell, required=(REPRODUCE.hasCellType, REPRODUCE.hasIndex),
+                                 optional=(REPRODUCE.hasExecutionCount,)):
+                cell_rows.append((cell,) + row)
+        notebook_cells = []
+        for cell, cell_type, cell_index, cell_execution_count in sorted(cell_rows, key=lambda row: int(row[2])):
+            kwargs = {
+                'cell_type': str(cell_type),
+            }
+            if cell_execution_count:
+                kwargs['execution_count'] = int(cell_execution_count)
+            notebook_cells.append(self.create_cell(cell, **kwargs))
+        return notebook_cells
+
+    def get_notebook_metadata(self):
+        metadata = {}
+        notebook_rows = []
+        for notebook in self.notebooks:
+            for row in self.rows(notebook, optional=(REPRODUCE.hasKernelDisplayName,
+                                                     REPRODUCE.hasKernelName,
+                                                     PROV.wasAttributedTo,
+                                                     REPRODUCE.hasProgrammingLanguage,
+                                                     REPRODUCE.hasProgrammingLanguageExtension,
+                                                     REPRODUCE.hasProgrammingLanguageVersion)):
+                notebook_rows.append((notebook,) + row)
+        for row in sorted(notebook_rows, key=_row_key):
+            notebook, kernel_display_name, kernel_name, agent, language, language_extension, language_version = row
+            if kernel_display_name:
+                metadata['kernelspec'] = {
+                    'display_name': str(kernel_display_name),
+                    'name': str(kernel_name),
+                }
+            if language:
+                metadata['language_info'] = {
+                    'file_extension': str(language_extension),
+                    'name': str(language),
+                    'version': str(language_version),
+                }
+            if agent and 'authors' not in metadata:
+                metadata['authors'] = []
+            if agent:
+                metadata['authors'].append({'name': str(agent)})
+        return metadata
+
+
+class DatasetGraphIndex(object):
+    """Index every named graph of a dataset on its own.
+
+    A sink of rdfstream.LineParser for N-Quads with the notebooks of a
+    dataset, see dataset.py. `graphs` maps every graph name, or None for
+    the default graph, to the NotebookGraphIndex of its triples.
+    """
+
+    def __init__(self, base_dir='.'):
+        self.base_dir = base_dir
+        self.graphs = OrderedDict()
+
+    def quad(self, subject, predicate, obj, graph_name):
+        graph_index = self.graphs.get(graph_name)
+        if graph_index is None:
+            graph_index = self.graphs[graph_name] = NotebookGraphIndex(base_dir=self.base_dir)
+        graph_index.triple(subject, predicate, obj)
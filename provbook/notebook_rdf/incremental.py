@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+import hashlib
+import io
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(output_file):
+    return output_file + '.manifest.json'
+
+
+def content_hash(node):
+    return hashlib.sha1(json.dumps(node, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_manifest(output_file, notebook_name, format):
+    """Return the manifest written with `output_file`, or None.
+
+    The manifest is only used if it was written for the same notebook and
+    format and the output file has not been modified since.
+    """
+    path = manifest_path(output_file)
+    if not (os.path.exists(path) and os.path.exists(output_file)):
+        return None
+    try:
+        with io.open(path, encoding='utf-8') as fin:
+            manifest = json.load(fin)
+    except ValueError:
+        return None
+    stat = os.stat(output_file)
+    if (manifest.get('version') != MANIFEST_VERSION or
+            manifest.get('notebook') != notebook_name or
+            manifest.get('format') != format or
+            manifest.get('size') != stat.st_size or
+            manifest.get('mtime') != stat.st_mtime):
+        return None
+    return manifest
+
+
+def write_chunks(output_file, notebook_name, format, prefixes, chunks):
+    """Write the output file from new and unchanged chunks, then its manifest.
+
+    `chunks` is a list of (key, hash, old_chunk, data, blobs) tuples.
+    Chunks with data are written as they are, the others are copied from
+    the previous output file at the offset recorded in `old_chunk`. `blobs`
+    lists the digests of the blobs used by the chunk.
+    """
+    temp_file = output_file + '.tmp'
+    manifest_chunks = []
+    old_output = io.open(output_file, 'rb') if os.path.exists(output_file) else None
+    try:
+        with io.open(temp_file, 'wb') as fout:
+            fout.write(''.join(prefixes).encode('utf-8'))
+            for key, chunk_hash, old_chunk, data, blobs in chunks:
+                if data is None:
+                    old_output.seek(old_chunk['offset'])
+                    data = old_output.read(old_chunk['length'])
+                manifest_chunk = {
+                    'key': key,
+                    'hash': chunk_hash,
+                    'offset': fout.tell(),
+                    'length': len(data),
+                }
+                if blobs:
+                    manifest_chunk['blobs'] = blobs
+                manifest_chunks.append(manifest_chunk)
+                fout.write(data)
+    finally:
+        if old_output is not None:
+            old_output.close()
+    getattr(os, 'replace', os.rename)(temp_file, output_file)
+
+    stat = os.stat(output_file)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'notebook': notebook_name,
+        'format': format,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'prefixes': prefixes,
+        'chunks': manifest_chunks,
+    }
+    with io.open(manifest_path(output_file), 'w', encoding='utf-8') as fout:
+        fout.write(json.dumps(manifest, ensure_ascii=False))
+    return manifest
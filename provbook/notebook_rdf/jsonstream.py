@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Reading a notebook file one cell at a time.
+
+nbformat parses the whole file into a NotebookNode tree, and the text of
+the file is in memory as well while it does. A notebook of a few GB with
+its provenance does not fit. JSONStream scans the JSON of a file in chunks
+and only decodes the values it is asked for, so a StreamingNotebook holds
+one cell at a time: the memory it needs is that of the largest cell.
+
+The notebook is read twice: once for its metadata, which nbformat writes
+after the cells, skipping the cells, then once for the cells.
+"""
+
+from __future__ import unicode_literals
+
+import io
+import json
+import re
+
+import nbformat
+from nbformat.v4.rwbase import rejoin_lines, strip_transient
+
+from .profiling import NO_PROFILER
+
+CHUNK_SIZE = 1 << 20
+
+WHITESPACE = re.compile(r'\s*')
+STRUCTURE = re.compile(r'["{}\[\]]')
+SCALAR_END = re.compile(r'[\s,}\]]')
+
+
+class JSONStream(object):
+    """Scanner of the JSON text of a file, read in chunks of `chunk_size`.
+
+    `iter_object` and `iter_array` walk the members of an object or an
+    array; the caller reads or skips the value of a member before the next
+    one. Skipped values are scanned without being kept in memory.
+    """
+
+    def __init__(self, fin, chunk_size=CHUNK_SIZE):
+        self.fin = fin
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        # Text of the value being read from earlier chunks, and where it
+        # starts in the current one.
+        self.pieces = None
+        self.mark = None
+
+    def more(self):
+        """Read the next chunk into the buffer, keeping the marked text."""
+        data = self.fin.read(self.chunk_size)
+        if not data:
+            raise ValueError("Unexpected end of the JSON file")
+        if self.mark is not None:
+            self.pieces.append(self.buf[self.mark:])
+            self.mark = 0
+        self.pos -= len(self.buf)
+        self.buf = data
+
+    def peek(self):
+        self.pos = WHITESPACE.match(self.buf, self.pos).end()
+        while self.pos >= len(self.buf):
+            self.more()
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+        return self.buf[self.pos]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected {0!r} in the JSON file, found {1!r}".format(char, self.buf[self.pos]))
+        self.pos += 1
+
+    def scan_string(self):
+        # After the opening quote. A quote, or the end of the chunk, after
+        # an odd number of backslashes is escaped.
+        while True:
+            quote = self.buf.find('"', self.pos)
+            end = len(self.buf) if quote < 0 else quote
+            backslash = end
+            while backslash > self.pos and self.buf[backslash - 1] == '\\':
+                backslash -= 1
+            escaped = (end - backslash) % 2
+            if quote < 0:
+                # Skip the first character of the next chunk if it is escaped.
+                self.pos = end + escaped
+                self.more()
+                continue
+            self.pos = quote + 1
+            if not escaped:
+                return
+
+    def scan_value(self):
+        char = self.peek()
+        self.pos += 1
+        if char == '"':
+            self.scan_string()
+        elif char in '{[':
+            depth = 1
+            while depth:
+                match = STRUCTURE.search(self.buf, self.pos)
+                if match is None:
+                    self.pos = len(self.buf)
+                    self.more()
+                    continue
+                self.pos = match.end()
+                char = match.group()
+                if char == '"':
+                    self.scan_string()
+                elif char in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+        else:
+            while True:
+                match = SCALAR_END.search(self.buf, self.pos)
+                if match is not None:
+                    self.pos = match.start()
+                    return
+                self.pos = len(self.buf)
+                try:
+                    self.more()
+                except ValueError:
+                    # A number or literal at the end of the file.
+                    return
+
+    def read_text(self):
+        """Return the JSON text of the next value."""
+        self.peek()
+        self.pieces, self.mark = [], self.pos
+        try:
+            self.scan_value()
+            self.pieces.append(self.buf[self.mark:self.pos])
+            return ''.join(self.pieces)
+        finally:
+            self.pieces = self.mark = None
+
+    def read_value(self):
+        """Decode the next value."""
+        return json.loads(self.read_text())
+
+    def skip_value(self):
+        """Scan the next value without decoding it."""
+        self.scan_value()
+
+    def iter_members(self, close):
+        if self.peek() == close:
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == close:
+                return
+            if char != ',':
+                raise ValueError("Expected ',' or {0!r} in the JSON file, found {1!r}".format(close, char))
+
+    def iter_object(self):
+        """Yield the key of every member of the next object."""
+        self.expect('{')
+        for _ in self.iter_members('}'):
+            key = self.read_value()
+            self.expect(':')
+            yield key
+
+    def iter_array(self):
+        """Yield the index of every element of the next array."""
+        self.expect('[')
+        for index, _ in enumerate(self.iter_members(']')):
+            yield index
+
+
+def notebook_part(cells, metadata=None):
+    """Return a notebook of `cells` and `metadata` as the reader of nbformat returns it."""
+    return strip_transient(rejoin_lines(nbformat.from_dict({'cells': cells, 'metadata': metadata or {}})))
+
+
+def parse_cell(text):
+    """Return the NotebookNode of the JSON text of a cell."""
+    return notebook_part([json.loads(text)]).cells[0]
+
+
+class StreamingNotebook(object):
+    """A notebook file whose cells are parsed as they are iterated.
+
+    It reads like the dict of a notebook of nbformat 4: its `cells` are an
+    iterator of NotebookNode parsed one at a time from the file, the other
+    sections are read ahead. The notebook is not validated.
+    """
+
+    def __init__(self, path, profiler=None, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.profiler = profiler or NO_PROFILER
+        self.chunk_size = chunk_size
+        self.sections = None
+
+    def open_stream(self):
+        return JSONStream(io.open(self.path, encoding='utf-8'), self.chunk_size)
+
+    def read_sections(self):
+        if self.sections is None:
+            sections = {}
+            stream = self.open_stream()
+            try:
+                for key in stream.iter_object():
+                    if key in ('cells', 'worksheets'):
+                        sections[key] = None
+                        stream.skip_value()
+                    else:
+                        sections[key] = stream.read_value()
+            finally:
+                stream.fin.close()
+            self.sections = sections
+        return self.sections
+
+    @property
+    def nbformat(self):
+        return self.read_sections().get('nbformat')
+
+    def iter_cells(self, parse=True):
+        """Yield the cells, or their JSON text without `parse`."""
+        stream = self.open_stream()
+        try:
+            for key in stream.iter_object():
+                if key != 'cells':
+                    stream.skip_value()
+                    continue
+                for _ in stream.iter_array():
+                    with self.profiler.phase('read notebook'):
+                        cell = stream.read_text()
+                        if parse:
+                            cell = parse_cell(cell)
+                    yield cell
+        finally:
+            stream.fin.close()
+
+    def __iter__(self):
+        return iter(self.read_sections())
+
+    def __contains__(self, key):
+        return key in self.read_sections()
+
+    def __getitem__(self, key):
+        if key == 'cells' and key in self.read_sections():
+            return self.iter_cells()
+        if key == 'metadata':
+            return notebook_part([], self.read_sections()[key]).metadata
+        return nbformat.from_dict(self.read_sections()[key])
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+from rdflib import Namespace
+
+PPLAN = Namespace("http://purl.org/net/p-plan/#")
+REPRODUCE = Namespace("https://w3id.org/reproduceme#")
+PROV = Namespace("http://www.w3.org/ns/prov/#")
@@ -4,8 +4,11 @@
 
 import six
 import io
+import multiprocessing
 import os
 import os.path
+from collections import deque
+from itertools import islice
 
 from rdflib import URIRef, BNode, Literal, Namespace, Graph, plugin
 from rdflib.serializer import Serializer
@@ -17,12 +20,50 @@ import nbformat
 import nbformat.v4.nbbase as nbbase
 import argparse
 
+from ..store import ProvenanceStore, read_cell_provenance
+from .blobs import blob_digest, write_blob
+from .dataset import DATASET_BASE_IRI, notebook_id
+from .formats import LINE_FORMATS, rdf_output_file, serializer_format
+from .incremental import content_hash, load_manifest, write_chunks
+from .jsonstream import StreamingNotebook, parse_cell
+from .profiling import NO_PROFILER
+from .rdfstream import RDFStreamWriter, split_prefixes
+from .sqlitestore import StoreLoader
+
+# Cells sent at once to a process of a parallel conversion.
+CELL_BATCH_SIZE = 8
+
 class NBToRDFConverter():
-    def __init__(self):
+    # Shorter values stay literals, a blob node would take more space.
+    dedup_min_length = 64
+
+    def __init__(self, dedup=False, blob_dir=None, blob_size=65536, retention=None, rdf_store=None, profiler=None,
+                 stream_input=False, payload_policy=None, cell_jobs=1):
         self.g = Graph()
+        self.retention = retention
+        # Processes converting the cells of a notebook to N-Triples, see write_cells_parallel.
+        self.cell_jobs = cell_jobs
+        # The output payloads exported, see payloads.py.
+        self.payload_policy = payload_policy
+        # Parse the notebooks one cell at a time, see jsonstream.py.
+        self.stream_input = stream_input
+        # Records the phases of the conversions, see profiling.py.
+        self.profiler = profiler or NO_PROFILER
+        # Dataset on a persistent store the notebooks are appended to, see sqlitestore.py.
+        self.rdf_store = rdf_store
+        self.store = None
+        self.graph_name = None
+        self.dedup = dedup or bool(blob_dir)
+        self.blob_dir = blob_dir
+        self.blob_size = blob_size
+        self.blob_base_dir = os.getcwd()
+        self.blobs = set()
+        self.used_blobs = set()
         self.pplan = Namespace("http://purl.org/net/p-plan/#")
         self.reproduce = Namespace("https://w3id.org/reproduceme#")
         self.prov = Namespace("http://www.w3.org/ns/prov/#")
+        # Namespace of the IRIs minted for the parts of the notebook.
+        self.namespace = self.reproduce
         self.notebook = URIRef(self.reproduce["Notebook"])
         self.step = URIRef(self.pplan["Step"])
         self.variable = URIRef(self.pplan["Variable"])
@@ -34,13 +75,64 @@ class NBToRDFConverter():
         self.cell_execution_count = {}
         self.initialise_graph()
 
+    def node(self, name):
+        """Return the IRI of a notebook, cell, execution, source or output."""
+        return URIRef(self.namespace[name])
+
+    def set_dataset_notebook(self, notebook_id, base_iri=DATASET_BASE_IRI):
+        """Mint the IRIs of the notebook in its own namespace and named graph."""
+        self.graph_name = URIRef(base_iri + notebook_id)
+        self.namespace = Namespace(self.graph_name + '#')
+        # The blobs of the notebook are in its named graph too.
+        self.blobs = set()
+
+    def clear_graph(self):
+        # A new graph is much faster than removing every triple of the store.
+        self.g = Graph()
+        self.initialise_graph()
+
     def initialise_graph(self):
         self.g.bind('p-plan', self.pplan)
         self.g.bind('repr', self.reproduce)
         self.g.bind('prov', self.prov)
 
+    def value_node(self, value):
+        """Return the node to use as the rdf:value of a source or output.
+
+        With deduplication, identical texts share one blob node named after
+        their SHA-256. The blob holds the text as its rdf:value, or the
+        location of a file in the blob directory for large texts. Like the
+        other nodes, blobs are shared within a notebook, not across the
+        notebooks of a dataset.
+        """
+        if not self.dedup or not isinstance(value, six.string_types) or len(value) < self.dedup_min_length:
+            return Literal(value)
+        data = value.encode('utf-8')
+        digest = blob_digest(data)
+        blob = self.node("Blob" + digest)
+        self.used_blobs.add(digest)
+        if digest not in self.blobs:
+            self.blobs.add(digest)
+            if self.blob_dir and len(data) >= self.blob_size:
+                blob_path = write_blob(self.blob_dir, digest, data)
+                self.g.add( (blob, self.prov.atLocation, Literal(os.path.relpath(blob_path, self.blob_base_dir))) )
+            else:
+                self.g.add( (blob, RDF.value, Literal(value)) )
+        return blob
+
+    def add_payload(self, node, mime_type, value):
+        """Add the rdf:value of an output payload, or its summary if the payload policy leaves it out."""
+        summary = self.payload_policy.summary(mime_type, value) if self.payload_policy is not None else None
+        if summary is None:
+            self.g.add( (node, RDF.value, self.value_node(value)) )
+            return
+        digest, size = summary
+        self.g.add( (node, self.reproduce.hasDataType, Literal(mime_type)) )
+        self.g.add( (node, self.reproduce.hasHash, Literal('sha256:' + digest)) )
+        self.g.add( (node, self.reproduce.hasByteLength, Literal(size, datatype=XSD.integer)) )
+
     def convert_notebook_metadata(self, notebook_name, notebook_metadata):
-        notebook_node = URIRef(self.reproduce[notebook_name])
+        notebook_node = self.node(notebook_name)
 
         self.g.add( (notebook_node, RDF.type, self.notebook) )
         if 'language_info' in notebook_metadata:
@@ -68,7 +160,7 @@ class NBToRDFConverter():
         error_traceback = None
         if 'outputs' in cell_node and cell_node.outputs:
             for index, cell_node_output in enumerate(cell_node.outputs):
-                output = URIRef(self.reproduce["Output" + str(cell_index)])
+                output = self.node("Output" + str(cell_index))
                 output_type = cell_node_output.output_type
                 self.g.add( (output, RDF.type, self.variable) )
                 self.g.add( (cell, self.pplan.hasOutputVar, output) ) if output else None
@@ -78,11 +170,11 @@ class NBToRDFConverter():
                     for key, value in cell_node_output.data.items():
                         output_datatype = key
                         output_val = value
-                        suboutput = URIRef(self.reproduce["Output" + str(cell_index) + "Suboutput" + str(output_index)])
+                        suboutput = self.node("Output" + str(cell_index) + "Suboutput" + str(output_index))
 
                         self.g.add( (output, self.reproduce.hasSubOutput, suboutput) )
                         self.g.add( (suboutput, self.reproduce.hasDataType, Literal(output_datatype)) )
-                        self.g.add( (suboutput, RDF.value, Literal(output_val)) )
+                        self.add_payload(suboutput, output_datatype, output_val)
                         output_index = output_index + 1
                     if 'execution_count' in cell_node_output:
                         output_execution_count = cell_node_output.execution_count
@@ -90,8 +182,7 @@ class NBToRDFConverter():
                             self.g.add( (output, self.reproduce.hasExecutionCount, Literal(output_execution_count)) )
                 elif (output_type == 'stream'):
                     output_val = cell_node_output.text
-                    output_variable_value = Literal(output_val)
-                    self.g.add( (output, RDF.value, output_variable_value) ) if output_variable_value else None
+                    self.add_payload(output, 'text/plain', output_val) if output_val else None
                 elif (output_type == 'error'):
                     output_val = cell_node_output.evalue
                     error_name = cell_node_output.ename
@@ -109,7 +200,7 @@ class NBToRDFConverter():
         output_datatype = None
         for output_index, out_val in enumerate(output):
             output_type = out_val.output_type
-            execution_output = URIRef(self.reproduce["Cell" + str(cell_index) + "Execution" + str(prov_index) + "Output" + str(output_index)])
+            execution_output = self.node("Cell" + str(cell_index) + "Execution" + str(prov_index) + "Output" + str(output_index))
             self.g.add( (execution_activity, self.prov.generated, execution_output) ) if execution_output else None
             self.g.add( (execution_output, self.reproduce.hasType, Literal(output_type)) ) if output_type else None
             if (output_type == 'execute_result' or output_type == 'display_data'):
@@ -117,15 +208,15 @@ class NBToRDFConverter():
                 for key, val in out_val.data.items():
                     output_datatype = key
                     output_val = val
-                    execution_suboutput = URIRef(self.reproduce["Cell" + str(cell_index) + "Execution" + str(prov_index) + "Suboutput" + str(output_index)])
+                    execution_suboutput = self.node("Cell" + str(cell_index) + "Execution" + str(prov_index) + "Suboutput" + str(output_index))
 
                     self.g.add( (execution_output, self.reproduce.hasSubOutput, execution_suboutput) )
                     self.g.add( (execution_suboutput, self.reproduce.hasDataType, Literal(output_datatype)) )
-                    self.g.add( (execution_suboutput, RDF.value, Literal(output_val)) )
+                    self.add_payload(execution_suboutput, output_datatype, output_val)
                     output_index = output_index + 1
             elif (output_type == 'stream'):
                 output_val = output[output_index].text
-                self.g.add( (execution_output, RDF.value, Literal(output_val)) ) if output_val else None
+                self.add_payload(execution_output, 'text/plain', output_val) if output_val else None
             elif (output_type == 'error'):
                 output_val = output[output_index].evalue
                 error_name = output[output_index].ename
@@ -133,28 +224,34 @@ class NBToRDFConverter():
                 self.g.add( (execution_output, RDF.value, Literal(output_val)) ) if output_val else None
 
 
+    def get_cell_provenance(self, cell_node):
+        return read_cell_provenance(cell_node, self.store, self.retention)
+
     def convert_provenance_metadata(self, cell, cell_node, cell_index):
-        for prov_index, provenance in enumerate(cell_node.metadata.provenance):
-            start_time = provenance['start_time'] if 'start_time' in provenance else None
-            end_time = provenance['end_time'] if 'end_time' in provenance else None
-            source = provenance['source'] if 'source' in provenance else None
-            source_entity = URIRef(self.reproduce["Cell" + str(cell_index) + "Execution" + str(prov_index) + "Source"]) if source else None
-            execution_time = provenance['execution_time'] if 'execution_time' in provenance else None
-            execution_activity = URIRef(self.reproduce["Cell" + str(cell_index) + "Execution" + str(prov_index)])
-
-            output = self.extract_output_from_cell(execution_activity, cell_index, prov_index, provenance['outputs']) if 'outputs' in provenance else None
-
-            self.g.add( (execution_activity, RDF.type, self.cellexecution) )
-            self.g.add( (execution_activity, self.pplan.correspondsToStep, cell) )
-            self.g.add( (execution_activity, self.prov.startedAtTime, Literal(start_time)) ) if start_time else None
-            self.g.add( (execution_activity, self.prov.endedAtTime, Literal(end_time)) ) if end_time else None
-            self.g.add( (execution_activity, self.reproduce.executionTime, Literal(execution_time)) ) if execution_time else None
-            self.g.add( (execution_activity, self.prov.used, source_entity) ) if source else None
-            self.g.add( (source_entity, RDF.value, Literal(source)) ) if source else None
-            self.g.add( (execution_activity, self.prov.generated, Literal(output)) ) if output else None
-
-    def convert_common_cell_metadata(self, cell, cell_node, cell_index):
-        if 'provenance' in cell_node.metadata:
+        for prov_index, provenance in enumerate(self.get_cell_provenance(cell_node)):
+            self.convert_provenance_entry(cell, cell_index, prov_index, provenance)
+
+    def convert_provenance_entry(self, cell, cell_index, prov_index, provenance):
+        start_time = provenance['start_time'] if 'start_time' in provenance else None
+        end_time = provenance['end_time'] if 'end_time' in provenance else None
+        source = provenance['source'] if 'source' in provenance else None
+        source_entity = self.node("Cell" + str(cell_index) + "Execution" + str(prov_index) + "Source") if source else None
+        execution_time = provenance['execution_time'] if 'execution_time' in provenance else None
+        execution_activity = self.node("Cell" + str(cell_index) + "Execution" + str(prov_index))
+
+        output = self.extract_output_from_cell(execution_activity, cell_index, prov_index, provenance['outputs']) if 'outputs' in provenance else None
+
+        self.g.add( (execution_activity, RDF.type, self.cellexecution) )
+        self.g.add( (execution_activity, self.pplan.correspondsToStep, cell) )
+        self.g.add( (execution_activity, self.prov.startedAtTime, Literal(start_time)) ) if start_time else None
+        self.g.add( (execution_activity, self.prov.endedAtTime, Literal(end_time)) ) if end_time else None
+        self.g.add( (execution_activity, self.reproduce.executionTime, Literal(execution_time)) ) if execution_time else None
+        self.g.add( (execution_activity, self.prov.used, source_entity) ) if source else None
+        self.g.add( (source_entity, RDF.value, self.value_node(source)) ) if source else None
+        self.g.add( (execution_activity, self.prov.generated, Literal(output)) ) if output else None
+
+    def convert_common_cell_metadata(self, cell, cell_node, cell_index, with_provenance=True):
+        if with_provenance and 'provenance' in cell_node.metadata:
             self.convert_provenance_metadata(cell, cell_node, cell_index)
 
         self.g.add( (cell, RDF.type, self.step) )
@@ -162,35 +259,239 @@ class NBToRDFConverter():
         self.g.add( (cell, self.reproduce.hasCellType, Literal(cell_node['cell_type'])) ) if cell_node['cell_type'] else None
 
         if 'source' in cell_node:
-            source = URIRef(self.reproduce["Source" + str(cell_index)])
-            source_variable_value = Literal(cell_node.source)
+            source = self.node("Source" + str(cell_index))
             self.g.add( (cell, self.pplan.hasInputVar, source) )
             self.g.add( (source, RDF.type, self.variable) )
-            self.g.add( (source, RDF.value, source_variable_value) ) if source_variable_value else None
+            self.g.add( (source, RDF.value, self.value_node(cell_node.source)) ) if cell_node.source else None
+
 
 
+    def convert_cell(self, notebook_node, cell_index, cell_node, with_provenance=True):
+        cell = self.node("Cell" + str(cell_index))
+        self.g.add( (cell, self.pplan.isStepOfPlan, notebook_node) )
+        self.convert_common_cell_metadata(cell, cell_node, cell_index, with_provenance)
+        if 'cell_type' in cell_node and cell_node.cell_type == 'code':
+            self.convert_code_cell_metadata(cell, cell_node, cell_index)
 
     def convert_cell_metadata(self, notebook_name, cell_data):
-        notebook_node = URIRef(self.reproduce[notebook_name])
+        notebook_node = self.node(notebook_name)
         for cell_index, cell_node in enumerate(cell_data):
-            cell = URIRef(self.reproduce["Cell" + str(cell_index)])
-            self.g.add( (cell, self.pplan.isStepOfPlan, notebook_node) )
-            self.convert_common_cell_metadata(cell, cell_node, cell_index)
-            if 'cell_type' in cell_node and cell_node.cell_type == 'code':
-                self.convert_code_cell_metadata(cell, cell_node, cell_index)
+            self.convert_cell(notebook_node, cell_index, cell_node)
+
+    def get_notebook_name(self, notebook_name):
+        return ''.join(nb_name for nb_name in notebook_name if nb_name.isalnum())
+
+    def flush_graph(self, writer):
+        with self.profiler.phase('serialize') as counts:
+            counts['triples'] = len(self.g)
+            writer.write(self.g)
+            self.clear_graph()
+
+    def stream_to_rdf(self, notebook_name, notebook_json, fout, format='nt'):
+        """Write the RDF of the notebook to `fout` one cell at a time.
 
+        The triples of a cell are serialized and dropped from the graph
+        before the next cell is converted.
+        """
+        return self.write_cells(notebook_name, notebook_json, RDFStreamWriter(fout, format, graph_name=self.graph_name))
 
+    def stream_to_store(self, notebook_name, notebook_json):
+        """Add the RDF of the notebook to `rdf_store` one cell at a time.
 
-    def convert_to_rdf(self, notebook_name, notebook_json):
-        format = 'turtle'
-        notebook_name = ''.join(nb_name for nb_name in notebook_name if nb_name.isalnum())
-        for section in notebook_json:
-            if section == 'cells':
-                self.convert_cell_metadata(notebook_name, notebook_json[section])
+        The triples go into the named graph of the notebook, replacing the
+        ones of a previous conversion.
+        """
+        loader = StoreLoader(self.rdf_store, self.graph_name)
+        loader.open_graph(self.graph_name)
+        self.write_cells(notebook_name, notebook_json, loader)
+        loader.commit()
+        return loader.triple_count
 
-            if section == 'metadata':
-                self.convert_notebook_metadata(notebook_name, notebook_json[section])
-        return self.g.serialize(format=format)
+    def write_cells(self, notebook_name, notebook_json, writer):
+        notebook_name = self.get_notebook_name(notebook_name)
+        if 'metadata' in notebook_json:
+            with self.profiler.phase('build graph') as counts:
+                self.convert_notebook_metadata(notebook_name, notebook_json['metadata'])
+                counts['triples'] = len(self.g)
+            self.flush_graph(writer)
+        if self.cell_jobs > 1:
+            if isinstance(notebook_json, StreamingNotebook):
+                # The processes parse the cells themselves.
+                cells = notebook_json.iter_cells(parse=False) if 'cells' in notebook_json else []
+            else:
+                cells = notebook_json.get('cells', [])
+            self.write_cells_parallel(notebook_name, cells, writer)
+            return writer.triple_count
+        notebook_node = self.node(notebook_name)
+        for cell_index, cell_node in enumerate(notebook_json.get('cells', [])):
+            with self.profiler.phase('build graph') as counts:
+                self.convert_cell(notebook_node, cell_index, cell_node)
+                counts['triples'] = len(self.g)
+            self.flush_graph(writer)
+        return writer.triple_count
+
+    def write_cells_parallel(self, notebook_name, cells, writer):
+        """Convert batches of cells to N-Triples in `cell_jobs` processes and write them in order.
+
+        The IRIs of a cell only depend on its index, so the batches are
+        converted independently. A few batches per process are in flight at
+        a time, so the cells of a notebook read one at a time are not all in
+        memory. A deduplicated blob is written once, with the first batch
+        using it.
+        """
+        pool = multiprocessing.Pool(self.cell_jobs, init_cell_worker, (self.cell_worker_options(),))
+        written_blobs = set()
+        pending = deque()
+        try:
+            cells = enumerate(cells)
+            while True:
+                batch = list(islice(cells, CELL_BATCH_SIZE))
+                if batch:
+                    pending.append(pool.apply_async(convert_cell_batch, (notebook_name, batch)))
+                if pending and (not batch or len(pending) >= 2 * self.cell_jobs):
+                    self.write_cell_batch(pending.popleft().get(), writer, written_blobs)
+                elif not batch:
+                    break
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+
+    def write_cell_batch(self, result, writer, written_blobs):
+        data, triple_count, blobs = result
+        with self.profiler.phase('write') as counts:
+            writer.write_ntriples(data, triple_count)
+            counts['triples'] = triple_count
+            for digest, (blob_data, blob_triple_count) in sorted(blobs.items()):
+                if digest not in written_blobs:
+                    written_blobs.add(digest)
+                    writer.write_ntriples(blob_data, blob_triple_count)
+                    counts['triples'] += blob_triple_count
+
+    def cell_worker_options(self):
+        return {
+            'converter': dict(dedup=self.dedup, blob_dir=self.blob_dir, blob_size=self.blob_size,
+                              retention=self.retention, payload_policy=self.payload_policy),
+            'namespace': six.text_type(self.namespace),
+            'blob_base_dir': self.blob_base_dir,
+            'store_path': self.store.path if self.store is not None else None,
+        }
+
+    def convert_cells_ntriples(self, notebook_name, cells):
+        """Return the N-Triples of `cells`, a list of (index, cell or its JSON text), in a process of a parallel conversion.
+
+        Returns (data, triple count, blobs) where `blobs` maps the digest of
+        every blob used by the cells to the N-Triples of the blob and their count.
+        """
+        notebook_node = self.node(notebook_name)
+        fout = io.StringIO()
+        writer = RDFStreamWriter(fout, 'nt')
+        self.blobs = set()
+        self.used_blobs = set()
+        blobs = {}
+        for cell_index, cell_node in cells:
+            if isinstance(cell_node, six.string_types):
+                cell_node = parse_cell(cell_node)
+            self.convert_cell(notebook_node, cell_index, cell_node)
+            for digest in self.used_blobs - set(blobs):
+                blob = self.node("Blob" + digest)
+                blob_graph = Graph()
+                for triple in list(self.g.triples((blob, None, None))):
+                    blob_graph.add(triple)
+                    self.g.remove(triple)
+                blobs[digest] = (six.ensure_text(blob_graph.serialize(format='nt')), len(blob_graph))
+            writer.write(self.g)
+            self.clear_graph()
+        return fout.getvalue(), writer.triple_count, blobs
+
+    def iter_chunks(self, notebook_name, notebook_json):
+        """Yield (key, content, convert, args) for each independent part of the notebook.
+
+        The parts are the notebook metadata, every cell without its
+        provenance and every provenance entry of a cell. Calling
+        `convert(*args)` adds the triples of a part to the graph.
+        """
+        notebook_node = self.node(notebook_name)
+        notebook_metadata = notebook_json.get('metadata', {})
+        yield 'metadata', notebook_metadata, self.convert_notebook_metadata, (notebook_name, notebook_metadata)
+        for cell_index, cell_node in enumerate(notebook_json.get('cells', [])):
+            cell = self.node("Cell" + str(cell_index))
+            cell_content = dict((key, value) for key, value in cell_node.items() if key != 'metadata')
+            yield 'cell/%d' % cell_index, cell_content, self.convert_cell, (notebook_node, cell_index, cell_node, False)
+            for prov_index, provenance in enumerate(self.get_cell_provenance(cell_node)):
+                yield ('cell/%d/execution/%d' % (cell_index, prov_index), provenance,
+                       self.convert_provenance_entry, (cell, cell_index, prov_index, provenance))
+
+    def convert_incremental(self, notebook_name, notebook_json, output_file, format='nt'):
+        """Update `output_file` with the triples of the parts that changed.
+
+        A manifest next to the output file records a hash and the byte
+        range of every part of the notebook. Parts whose hash is unchanged
+        since the last run are copied from the previous output, the others
+        are converted again. Deduplicated blobs are parts of their own, kept
+        as long as a part uses them. Returns the number of converted parts.
+        """
+        notebook_name = self.get_notebook_name(notebook_name)
+        manifest = load_manifest(output_file, notebook_name, format)
+        old_chunks = dict((chunk['key'], chunk) for chunk in manifest['chunks']) if manifest else {}
+        prefixes = list(manifest['prefixes']) if manifest else []
+        # Blobs are parts of their own, shared by all the parts using them.
+        old_blob_chunks = dict((key[len('blob/'):], chunk) for key, chunk in old_chunks.items() if key.startswith('blob/'))
+        new_blob_triples = {}
+        used_blobs = set()
+        self.blobs = set(old_blob_chunks)
+        chunks = []
+        converted = 0
+        for key, content, convert, convert_args in self.iter_chunks(notebook_name, notebook_json):
+            if self.payload_policy is not None:
+                # Parts converted with another policy are converted again.
+                content = [self.payload_policy.as_dict(), content]
+            chunk_hash = content_hash(content)
+            old_chunk = old_chunks.get(key)
+            if old_chunk and old_chunk['hash'] == chunk_hash:
+                chunks.append((key, chunk_hash, old_chunk, None, old_chunk.get('blobs', [])))
+                used_blobs.update(old_chunk.get('blobs', []))
+                continue
+            self.used_blobs = set()
+            convert(*convert_args)
+            for digest in self.used_blobs - set(old_blob_chunks) - set(new_blob_triples):
+                blob = self.node("Blob" + digest)
+                new_blob_triples[digest] = list(self.g.triples((blob, None, None)))
+                self.g.remove((blob, None, None))
+            chunks.append((key, chunk_hash, None, self.serialize_chunk(format, prefixes), sorted(self.used_blobs)))
+            used_blobs.update(self.used_blobs)
+            converted += 1
+        for digest in sorted(used_blobs):
+            if digest in new_blob_triples:
+                for triple in new_blob_triples[digest]:
+                    self.g.add(triple)
+                chunks.append(('blob/' + digest, digest, None, self.serialize_chunk(format, prefixes), []))
+            else:
+                chunks.append(('blob/' + digest, digest, old_blob_chunks[digest], None, []))
+        write_chunks(output_file, notebook_name, format, prefixes, chunks)
+        return converted
+
+    def serialize_chunk(self, format, prefixes):
+        chunk_prefixes, data = split_prefixes(six.ensure_text(self.g.serialize(format=serializer_format(format))))
+        self.clear_graph()
+        prefixes.extend(prefix for prefix in chunk_prefixes if prefix not in prefixes)
+        return data.encode('utf-8')
+
+    def convert_to_rdf(self, notebook_name, notebook_json, format='turtle'):
+        notebook_name = self.get_notebook_name(notebook_name)
+        with self.profiler.phase('build graph') as counts:
+            for section in notebook_json:
+                if section == 'cells':
+                    self.convert_cell_metadata(notebook_name, notebook_json[section])
+
+                if section == 'metadata':
+                    self.convert_notebook_metadata(notebook_name, notebook_json[section])
+            counts['triples'] = len(self.g)
+        with self.profiler.phase('serialize') as counts:
+            data = self.g.serialize(format=serializer_format(format))
+            counts['triples'] = len(self.g)
+            counts['bytes'] = len(six.ensure_binary(data))
+        return data
 
 
     def convert_notebook_to_rdf(self, args):
@@ -198,11 +499,81 @@ class NBToRDFConverter():
         notebook_file = os.path.basename(infile)
         notebook_name, extension = os.path.splitext(notebook_file)
         input_file_directory = os.path.dirname(infile)
-        output_file_extension = 'ttl'
-        output_file = os.path.join(input_file_directory, notebook_name + "." + output_file_extension)
+        self.blob_base_dir = input_file_directory or os.curdir
+        stream_format = getattr(args, 'stream', None)
+        rdf_format = getattr(args, 'rdf_format', None) or stream_format or 'turtle'
+        if rdf_format in LINE_FORMATS:
+            # Line-based formats are always written one cell at a time.
+            stream_format = rdf_format
+        output_file = rdf_output_file(infile, rdf_format)
+
+        notebook_json = self.read_notebook(infile)
+        self.store = ProvenanceStore.open(infile)
+        try:
+            return self.write_notebook_rdf(notebook_name, notebook_json, output_file, stream_format, args,
+                                           rdf_format=rdf_format)
+        finally:
+            if self.store is not None:
+                self.store.close()
+                self.store = None
+
+    def read_notebook(self, infile):
+        with self.profiler.phase('read notebook') as counts:
+            counts['bytes'] = os.path.getsize(infile)
+            if self.stream_input:
+                notebook_json = StreamingNotebook(infile, self.profiler)
+                # Older notebooks are converted to nbformat 4 as a whole.
+                if notebook_json.nbformat == 4:
+                    return notebook_json
+            return nbformat.reads(io.open(infile, encoding='utf-8').read(), as_version=4)
 
-        notebook = io.open(infile).read()
-        notebook_json = nbformat.reads(notebook, as_version=4)
-        nbconvert_rdf = self.convert_to_rdf(notebook_name, notebook_json)
-        io.open(output_file, 'w').write(six.ensure_text(nbconvert_rdf))
+    def write_notebook_rdf(self, notebook_name, notebook_json, output_file, stream_format, args, rdf_format='turtle'):
+        if getattr(args, 'incremental', False):
+            with self.profiler.phase('incremental'):
+                self.convert_incremental(notebook_name, notebook_json, output_file, format=stream_format or rdf_format)
+            return output_file
+        if stream_format:
+            with io.open(output_file, 'w', encoding='utf-8') as fout:
+                self.stream_to_rdf(notebook_name, notebook_json, fout, format=stream_format)
+            return output_file
+        nbconvert_rdf = self.convert_to_rdf(notebook_name, notebook_json, format=rdf_format)
+        with self.profiler.phase('write') as counts:
+            counts['bytes'] = len(six.ensure_binary(nbconvert_rdf))
+            io.open(output_file, 'w').write(six.ensure_text(nbconvert_rdf))
         return nbconvert_rdf
+
+    def convert_notebook_to_dataset(self, infile, fout=None, notebook_iri='path', base_iri=DATASET_BASE_IRI):
+        """Append the N-Quads of a notebook in its own named graph to `fout`.
+
+        Without `fout`, the notebook is added to `rdf_store` instead.
+        Returns the number of quads.
+        """
+        notebook_name = os.path.splitext(os.path.basename(infile))[0]
+        notebook_json = self.read_notebook(infile)
+        self.set_dataset_notebook(notebook_id(infile, notebook_iri), base_iri)
+        self.store = ProvenanceStore.open(infile)
+        try:
+            if fout is None:
+                return self.stream_to_store(notebook_name, notebook_json)
+            return self.stream_to_rdf(notebook_name, notebook_json, fout, format='nquads')
+        finally:
+            if self.store is not None:
+                self.store.close()
+                self.store = None
+
+
+# The converter of a process of write_cells_parallel.
+cell_worker = None
+
+
+def init_cell_worker(options):
+    global cell_worker
+    cell_worker = NBToRDFConverter(**options['converter'])
+    cell_worker.namespace = Namespace(options['namespace'])
+    cell_worker.blob_base_dir = options['blob_base_dir']
+    if options['store_path'] is not None:
+        cell_worker.store = ProvenanceStore(options['store_path'])
+
+
+def convert_cell_batch(notebook_name, cells):
+    return cell_worker.convert_cells_ntriples(notebook_name, cells)
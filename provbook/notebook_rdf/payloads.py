@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Which output payloads are exported to RDF.
+
+The MIME types of the outputs of execute_result and display_data are
+matched against include and exclude patterns, such as `text/*` or
+`application/vnd.*`; the text of stream outputs is `text/plain`. A payload
+whose MIME type is not included, or which is larger than the maximum
+payload size, is not exported: its output gets the SHA-256, the length in
+bytes and the MIME type of the payload instead of its rdf:value. When the
+notebook is rebuilt from RDF, such a payload is replaced by a placeholder
+under its MIME type.
+"""
+
+import fnmatch
+import hashlib
+import json
+
+import six
+
+
+def parse_mime_patterns(values):
+    """Return the patterns of repeated, comma-separated options."""
+    return [pattern.strip() for value in values or [] for pattern in value.split(',') if pattern.strip()]
+
+
+class PayloadPolicy(object):
+    """The MIME types exported with `include` and `exclude` patterns, and the largest payload in bytes."""
+
+    def __init__(self, include=None, exclude=None, max_size=None):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.max_size = max_size
+
+    def exports_mime(self, mime_type):
+        if self.include and not any(fnmatch.fnmatchcase(mime_type, pattern) for pattern in self.include):
+            return False
+        return not any(fnmatch.fnmatchcase(mime_type, pattern) for pattern in self.exclude)
+
+    def summary(self, mime_type, value):
+        """Return (digest, size) of a payload that is not exported, or None."""
+        exported = self.exports_mime(mime_type)
+        if exported and self.max_size is None:
+            return None
+        data = payload_bytes(value)
+        if exported and len(data) <= self.max_size:
+            return None
+        return hashlib.sha256(data).hexdigest(), len(data)
+
+    def as_dict(self):
+        return {'include': self.include, 'exclude': self.exclude, 'max_size': self.max_size}
+
+
+def payload_bytes(value):
+    if isinstance(value, six.string_types):
+        return value.encode('utf-8')
+    # JSON payloads, application/json for instance.
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def rebuilt_payload(value, mime_type, digest=None, size=None):
+    """Return the exported value of a payload, or the placeholder of one that was not exported."""
+    if value is not None:
+        return six.text_type(value)
+    if digest is None:
+        return None
+    return u'[{0} omitted by the RDF export: {1} bytes, {2}]'.format(mime_type, size, digest)
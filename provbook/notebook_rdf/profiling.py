@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Time, size and memory of the phases of a conversion.
+
+The converters record their phases, such as reading the notebook,
+building the graph, serializing or parsing the RDF and rebuilding the
+notebook, in a Profiler passed to them. A phase entered several times,
+once per cell for instance, adds up its time, triples and bytes.
+
+The memory of a phase is the maximum resident set size of the process at
+its end, which costs nothing to read. With `memory=True`, the peak of the
+memory allocated by Python during the phase is also measured with
+tracemalloc, which makes the conversion several times slower.
+"""
+
+import cProfile
+import json
+import io
+import os
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import six
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+
+def max_rss_bytes():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes, except on macOS.
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class Profiler(object):
+    """Record the phases of conversions, and optionally a cProfile of them.
+
+    `start` and `stop` bracket the profiled conversion. With `memory`, the
+    peak memory of the phases is traced. With `cprofile_file`, the cProfile
+    statistics of that time are dumped to this file.
+    """
+
+    def __init__(self, memory=False, cprofile_file=None):
+        self.memory = memory and tracemalloc is not None
+        self.cprofile_file = cprofile_file
+        self.cprofile = None
+        self.phases = OrderedDict()
+        self.start_time = None
+        self.seconds = 0.0
+        self.tracing = False
+
+    def start(self):
+        self.start_time = time.time()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        if self.cprofile_file:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def stop(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            directory = os.path.dirname(self.cprofile_file)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.cprofile.dump_stats(self.cprofile_file)
+            self.cprofile = None
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+        if self.start_time is not None:
+            self.seconds = time.time() - self.start_time
+
+    @contextmanager
+    def phase(self, name):
+        """Measure the block as phase `name`.
+
+        The block sets the `triples` and `bytes` it handled in the dict it
+        gets.
+        """
+        counts = {}
+        base_memory = None
+        if self.memory and tracemalloc.is_tracing():
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+        start_time = time.time()
+        try:
+            yield counts
+        finally:
+            record = self.phases.get(name)
+            if record is None:
+                record = self.phases[name] = OrderedDict([
+                    ('name', name), ('calls', 0), ('seconds', 0.0), ('triples', 0), ('bytes', 0)])
+            record['calls'] += 1
+            record['seconds'] += time.time() - start_time
+            record['triples'] += counts.get('triples', 0)
+            record['bytes'] += counts.get('bytes', 0)
+            record['max_rss_bytes'] = max_rss_bytes()
+            if base_memory is not None:
+                peak_bytes = tracemalloc.get_traced_memory()[1] - base_memory
+                record['peak_bytes'] = max(record.get('peak_bytes', 0), peak_bytes)
+
+    def report(self, **info):
+        """Return the phases and `info` as a dict for a JSON report."""
+        report = OrderedDict(info)
+        report['seconds'] = self.seconds
+        report['max_rss_bytes'] = max_rss_bytes()
+        if self.memory:
+            report['peak_bytes'] = max([phase.get('peak_bytes', 0) for phase in self.phases.values()] or [0])
+        report['phases'] = list(self.phases.values())
+        if self.cprofile_file:
+            report['cprofile'] = self.cprofile_file
+        return report
+
+
+class NoProfiler(object):
+    """Profiler of the conversions that are not profiled."""
+
+    @contextmanager
+    def phase(self, name):
+        yield {}
+
+
+NO_PROFILER = NoProfiler()
+
+
+def cprofile_path(cprofile_file, input_file):
+    """Return the cProfile dump of `input_file` in a batch, next to `cprofile_file`."""
+    stem, extension = os.path.splitext(cprofile_file)
+    name = os.path.normpath(input_file).lstrip(os.sep).replace(os.sep, '_')
+    return '{0}.{1}{2}'.format(stem, name, extension or '.prof')
+
+
+def write_profile_report(report_file, reports):
+    """Write the reports of the converted files as JSON, the slowest first."""
+    reports = sorted(reports, key=lambda report: report['seconds'], reverse=True)
+    with io.open(report_file, 'w', encoding='utf-8') as fout:
+        fout.write(six.text_type(json.dumps({'files': reports}, indent=2, ensure_ascii=False)))
@@ -6,55 +6,139 @@
 import io
 import os
 import os.path
+from collections import OrderedDict
 
 from rdflib import Graph
+from rdflib.namespace import RDF, XSD
+from rdflib.plugins.parsers.ntriples import NTGraphSink
 import nbformat
 import nbformat.v4.nbbase as nbbase
 import argparse
+import six
+
+from .blobs import inline_blobs
+from .formats import LINE_FORMATS, rdf_format_of
+from .dataset import DATASET_BASE_IRI, dataset_notebook_path
+from .graphindex import DatasetGraphIndex, NotebookGraphIndex
+from .namespaces import PPLAN, PROV, REPRODUCE
+from .payloads import rebuilt_payload
+from .profiling import NO_PROFILER
+from .rdfstream import LineParser
+from .sqlitestore import open_rdf_store, parse_store_spec
+
+# The queries of --sparql, run for every cell and execution. They are parsed
+# and planned once, and the nodes and indices of a call are bound to their
+# variables with initBindings instead of being pasted into the query text.
+SPARQL_QUERIES = OrderedDict([
+    ('cell_source',
+     'select ?cell ?source ?source_value where { ?cell repr:hasIndex ?cell_index .'
+     '?cell p-plan:hasInputVar ?source . ?source rdf:value ?source_value }'),
+    ('cell_output',
+     'select * where { \
+        ?cell repr:hasIndex ?cell_index . \
+        OPTIONAL { ?cell p-plan:hasOutputVar ?output  . \
+        OPTIONAL { ?output rdf:value ?output_value  } . \
+        OPTIONAL { ?output repr:hasType ?output_type } . \
+        OPTIONAL { ?output repr:hasErrorName ?output_errorname } . \
+        OPTIONAL { ?output repr:hasErrorTraceback ?output_errortraceback } . \
+        OPTIONAL { ?output repr:hasExecutionCount ?execution_count } . \
+        OPTIONAL { ?output repr:hasHash ?output_hash } . \
+        OPTIONAL { ?output repr:hasByteLength ?output_bytelength } . } . } '),
+    ('suboutput',
+     'select * where { ?output repr:hasSubOutput ?suboutput . \
+        ?suboutput repr:hasDataType ?output_datatype . \
+        OPTIONAL { ?suboutput rdf:value ?output_value } . \
+        OPTIONAL { ?suboutput repr:hasHash ?output_hash } . \
+        OPTIONAL { ?suboutput repr:hasByteLength ?output_bytelength } . } '),
+    ('cell_provenance',
+     'select ?execution ?endedAtTime ?startedAtTime ?executionTime ?source ?source_value where { \
+        ?cell rdf:type p-plan:Step . \
+        ?execution p-plan:correspondsToStep ?cell  . \
+        ?execution prov:endedAtTime ?endedAtTime  . \
+        ?execution prov:startedAtTime ?startedAtTime  . \
+        ?execution repr:executionTime ?executionTime  . \
+        ?execution prov:used ?source . \
+        OPTIONAL { ?source rdf:value ?source_value } . \
+        } '),
+    ('execution_output',
+     'select * where { ?execution prov:generated ?output . \
+        ?output repr:hasType ?output_type . \
+        OPTIONAL { ?output rdf:value ?output_value } . \
+        OPTIONAL { ?output repr:hasErrorName ?output_errorname } . \
+        OPTIONAL { ?output repr:hasErrorTraceback ?output_errortraceback } . \
+        OPTIONAL { ?output repr:hasExecutionCount ?execution_count } . \
+        OPTIONAL { ?output repr:hasHash ?output_hash } . \
+        OPTIONAL { ?output repr:hasByteLength ?output_bytelength } . } '),
+    ('notebook_cells',
+     'select ?cell ?cell_type ?cell_index ?cell_execution_count where { \
+        ?cell rdf:type p-plan:Step . \
+        ?cell repr:hasCellType ?cell_type . \
+        ?cell repr:hasIndex ?cell_index . \
+        OPTIONAL { ?cell repr:hasExecutionCount ?cell_execution_count } . \
+        } ORDER BY xsd:integer(?cell_index)'),
+    ('notebook_metadata',
+     'select * where { \
+        ?notebook rdf:type repr:Notebook . \
+        OPTIONAL { ?notebook repr:hasKernelDisplayName ?kernel_display_name } . \
+        OPTIONAL { ?notebook repr:hasKernelName ?kernel_name } . \
+        OPTIONAL { ?notebook prov:wasAttributedTo ?agent } .\
+        OPTIONAL { ?notebook repr:hasProgrammingLanguage ?programminglanguage } . \
+        OPTIONAL { ?notebook repr:hasProgrammingLanguageExtension ?programminglanguage_extension } . \
+        OPTIONAL { ?notebook repr:hasProgrammingLanguageVersion ?programminglanguage_version } . \
+        }'),
+])
+
+# The namespaces of the queries. The prefixes of the RDF file do not matter,
+# rdflib renames `prov` of a Turtle file to `prov1`, for instance.
+QUERY_NAMESPACES = {'p-plan': PPLAN, 'repr': REPRODUCE, 'prov': PROV, 'rdf': RDF, 'xsd': XSD}
+
+# The queries prepared so far. Only --sparql uses them, so they, and the
+# SPARQL engine of rdflib, are prepared on first use.
+PREPARED_QUERIES = {}
+
+
+def prepared_query(name):
+    query = PREPARED_QUERIES.get(name)
+    if query is None:
+        from rdflib.plugins.sparql import prepareQuery
+        query = PREPARED_QUERIES[name] = prepareQuery(SPARQL_QUERIES[name], initNs=QUERY_NAMESPACES)
+    return query
+
+
+def run_query(rdfgraph, name, **bindings):
+    return rdfgraph.query(prepared_query(name), initBindings=bindings)
+
 
 def get_cell_source(rdfgraph, cell_index):
-    for row in sorted(rdfgraph.query(
-        'select ?cell ?source ?source_value where { ?cell repr:hasIndex ' + cell_index + ' .' \
-        '?cell p-plan:hasInputVar ?source . ?source rdf:value ?source_value }'
-            )):
+    for row in sorted(run_query(rdfgraph, 'cell_source', cell_index=cell_index)):
         return row.source_value
 
 def get_cell_output(rdfgraph, cell_index):
     output = []
-    for row in sorted(rdfgraph.query(
-        'select * where { \
-            ?cell repr:hasIndex ' + cell_index + ' . \
-            OPTIONAL { ?cell p-plan:hasOutputVar ?output  . \
-            OPTIONAL { ?output rdf:value ?output_value  } . \
-            OPTIONAL { ?output repr:hasType ?output_type } . \
-            OPTIONAL { ?output repr:hasErrorName ?output_errorname } . \
-            OPTIONAL { ?output repr:hasErrorTraceback ?output_errortraceback } . \
-            OPTIONAL { ?output repr:hasExecutionCount ?execution_count } . } . } '
-        )):
+    for row in sorted(run_query(rdfgraph, 'cell_output', cell_index=cell_index)):
             if row.output_type:
                 output_type = str(row.output_type)
                 output = {
                     'output_type' : str(row.output_type),
                 }
 
-                output_value = str(row.output_value)
+                # The text of a stream left out by the payload policy of the export is a placeholder.
+                row_value = rebuilt_payload(row.output_value, 'text/plain', row.output_hash, row.output_bytelength)
+                output_value = str(row_value)
                 if output_type == 'execute_result' or output_type == 'display_data':
-                    repr_output = 'repr:' + row.output.split('#')[1]
-
                     output['data'] = {}
-                    for suboutput_row in sorted(rdfgraph.query(
-                        'select * where { ' + repr_output + ' repr:hasSubOutput ?suboutput . \
-                            ?suboutput rdf:value ?output_value . \
-                            ?suboutput repr:hasDataType ?output_datatype } '
-                    )):
+                    for suboutput_row in sorted(run_query(rdfgraph, 'suboutput', output=row.output)):
 
-                        output_value = str(suboutput_row.output_value)
                         output_datatype = str(suboutput_row.output_datatype)
+                        output_value = rebuilt_payload(suboutput_row.output_value, output_datatype,
+                                                       suboutput_row.output_hash, suboutput_row.output_bytelength)
+                        if output_value is None:
+                            continue
 
                         output['data'].update({
                             output_datatype: output_value
                         })
-                    if (row.output_value):
+                    if (row_value):
                         output['data'] = {
                             output_datatype : output_value
                         }
@@ -64,7 +148,8 @@ def get_cell_output(rdfgraph, cell_index):
                         output['execution_count'] = int(row.execution_count)
                 elif output_type == 'stream':
                     output['name'] = 'stdout'
-                    output['text'] = output_value
+                    # Empty, or left out by the payload policy of the export.
+                    output['text'] = row_value or ''
                 elif output_type == 'error':
                     output['ename'] = row.output_errorname
                     output['evalue'] = output_value
@@ -98,47 +183,29 @@ def create_cells(rdfgraph, cell, cell_index, **kwargs):
 def create_provenance(rdfgraph, cell,  cell_index, **kwargs):
     provenance_metadata = {}
 
-    repr_cell = 'repr:' + cell.split('#')[1]
-    for row in sorted(rdfgraph.query(
-            'select ?execution ?endedAtTime ?startedAtTime ?executionTime ?source ?source_value where { ' + repr_cell + ' rdf:type p-plan:Step . \
-            ?execution p-plan:correspondsToStep ' + repr_cell + '  . \
-            ?execution prov:endedAtTime ?endedAtTime  . \
-            ?execution prov:startedAtTime ?startedAtTime  . \
-            ?execution repr:executionTime ?executionTime  . \
-            ?execution prov:used ?source . \
-            OPTIONAL { ?source rdf:value ?source_value } . \
-            } '
-    )):
+    for row in sorted(run_query(rdfgraph, 'cell_provenance', cell=cell)):
         if 'provenance' not in provenance_metadata:
             provenance_metadata['provenance'] = []
-        execution = 'repr:' + row.execution.split('#')[1]
         output = []
         output_provenance = []
-        for output_row in sorted(rdfgraph.query(
-            'select * where { ' + execution + ' prov:generated ?output . \
-            ?output repr:hasType ?output_type . \
-            OPTIONAL { ?output rdf:value ?output_value } . \
-            OPTIONAL { ?output repr:hasErrorName ?output_errorname } . \
-            OPTIONAL { ?output repr:hasErrorTraceback ?output_errortraceback } . \
-            OPTIONAL { ?output repr:hasExecutionCount ?execution_count } . } '
-        )):
+        for output_row in sorted(run_query(rdfgraph, 'execution_output', execution=row.execution)):
             output_type = str(output_row.output_type)
             output = {
                 'output_type' : str(output_row.output_type),
             }
-            output_value = str(output_row.output_value)
+            # The text of a stream left out by the payload policy of the export is a placeholder.
+            row_value = rebuilt_payload(output_row.output_value, 'text/plain',
+                                        output_row.output_hash, output_row.output_bytelength)
+            output_value = str(row_value)
             if output_type == 'execute_result' or output_type == 'display_data':
-                repr_output = 'repr:' + output_row.output.split('#')[1]
-
                 output['data'] = {}
-                for suboutput_row in sorted(rdfgraph.query(
-                    'select * where { ' + repr_output + ' repr:hasSubOutput ?suboutput . \
-                        ?suboutput rdf:value ?output_value . \
-                        ?suboutput repr:hasDataType ?output_datatype } '
-                )):
+                for suboutput_row in sorted(run_query(rdfgraph, 'suboutput', output=output_row.output)):
                     if suboutput_row:
-                        output_value = str(suboutput_row.output_value)
                         output_datatype = str(suboutput_row.output_datatype)
+                        output_value = rebuilt_payload(suboutput_row.output_value, output_datatype,
+                                                       suboutput_row.output_hash, suboutput_row.output_bytelength)
+                        if output_value is None:
+                            continue
 
                         output['data'].update({
                             output_datatype: output_value
@@ -152,7 +219,7 @@ def create_provenance(rdfgraph, cell,  cell_index, **kwargs):
                             output['execution_count'] = int(output_row.execution_count)
             elif output_type == 'stream':
                 output['name'] = 'stdout'
-                output['text'] = output_value
+                output['text'] = row_value or ''
             elif output_type == 'error':
                 output['ename'] = output_row.output_errorname
                 output['evalue'] = output_value
@@ -178,14 +245,7 @@ def create_cell_output(**output):
 
 def get_notebook_cells(rdfgraph):
     notebook_cells = []
-    for row in rdfgraph.query(
-            'select ?cell ?cell_type ?cell_index ?cell_execution_count where { \
-            ?cell rdf:type p-plan:Step . \
-            ?cell repr:hasCellType ?cell_type . \
-            ?cell repr:hasIndex ?cell_index . \
-            OPTIONAL { ?cell repr:hasExecutionCount ?cell_execution_count } . \
-        } ORDER BY xsd:integer(?cell_index)'
-    ):
+    for row in run_query(rdfgraph, 'notebook_cells'):
         kwargs = {
             'cell_type': str(row.cell_type),
         }
@@ -199,17 +259,7 @@ def get_notebook_cells(rdfgraph):
 def get_notebook_metadata(rdfgraph):
     metadata = {}
 
-    for row in sorted(rdfgraph.query(
-        'select * where { \
-            ?notebook rdf:type repr:Notebook . \
-            OPTIONAL { ?notebook repr:hasKernelDisplayName ?kernel_display_name } . \
-            OPTIONAL { ?notebook repr:hasKernelName ?kernel_name } . \
-            OPTIONAL { ?notebook prov:wasAttributedTo ?agent } .\
-            OPTIONAL { ?notebook repr:hasProgrammingLanguage ?programminglanguage } . \
-            OPTIONAL { ?notebook repr:hasProgrammingLanguageExtension ?programminglanguage_extension } . \
-            OPTIONAL { ?notebook repr:hasProgrammingLanguageVersion ?programminglanguage_version } . \
-        }'
-    )):
+    for row in sorted(run_query(rdfgraph, 'notebook_metadata')):
         if row.kernel_display_name:
             metadata['kernelspec'] = {
                 'display_name' : str(row.kernel_display_name),
@@ -228,8 +278,17 @@ def get_notebook_metadata(rdfgraph):
     return metadata
 
 
+def read_rdf_graph(infile, rdf_format):
+    nbrdf = Graph()
+    if rdf_format in LINE_FORMATS:
+        with io.open(infile, encoding='utf-8') as fin:
+            LineParser(NTGraphSink(nbrdf), rdf_format).parse_file(fin)
+        return nbrdf
+    return nbrdf.parse(infile, format=rdf_format)
 
-def convert_rdf_to_notebook(args):
+
+def convert_rdf_to_notebook(args, profiler=None):
+    profiler = profiler or NO_PROFILER
     infile = args.input_file
 
     input_file = os.path.basename(infile)
@@ -239,13 +298,100 @@ def convert_rdf_to_notebook(args):
     output_file = os.path.join(input_file_directory, notebook_name + "_rdf2nb." + output_file_extension)
     print("Converting RDF file {0} to notebook {1}".format(input_file,output_file))
 
-    notebook = io.open(infile).read()
-    g = Graph()
-    nbrdf = g.parse(infile, format="turtle")
-    nbconvert_rdf = get_notebook_cells(nbrdf)
-    metadata = get_notebook_metadata(nbrdf)
-    nb = nbbase.new_notebook(cells=nbconvert_rdf, metadata=metadata)
-    validate_result = nbbase.validate(nb)
-    with io.open(output_file, 'w', encoding='utf-8') as fout:
-        nbformat.write(nb, fout, version=max(nbformat.versions))
+    rdf_format = getattr(args, 'rdf_format', None) or rdf_format_of(infile, 'turtle')
+    base_dir = input_file_directory or os.curdir
+    if getattr(args, 'sparql', False):
+        with profiler.phase('parse') as counts:
+            nbrdf = read_rdf_graph(infile, rdf_format)
+            counts['triples'] = len(nbrdf)
+            counts['bytes'] = os.path.getsize(infile)
+        with profiler.phase('inline blobs'):
+            inline_blobs(nbrdf, base_dir)
+        with profiler.phase('sparql cells'):
+            nbconvert_rdf = get_notebook_cells(nbrdf)
+        with profiler.phase('sparql metadata'):
+            metadata = get_notebook_metadata(nbrdf)
+    elif rdf_format == 'nquads':
+        # Index the statements as they are read, without building a graph,
+        # and rebuild a notebook from every named graph of a dataset.
+        with profiler.phase('parse and index') as counts:
+            dataset_index = DatasetGraphIndex(base_dir=base_dir)
+            with io.open(infile, encoding='utf-8') as fin:
+                LineParser(dataset_index, rdf_format).parse_file(fin)
+            counts['triples'] = sum(graph_index.triple_count for graph_index in dataset_index.graphs.values())
+            counts['bytes'] = os.path.getsize(infile)
+        graph_index = dataset_index.graphs.pop(None, None)
+        dataset_dir = os.path.join(input_file_directory, notebook_name + "_rdf2nb")
+        base_iri = getattr(args, 'base_iri', None) or DATASET_BASE_IRI
+        for graph_name, named_graph_index in dataset_index.graphs.items():
+            dataset_file = os.path.join(dataset_dir, dataset_notebook_path(graph_name, base_iri))
+            cells, metadata = rebuild_notebook(named_graph_index, profiler)
+            write_notebook(cells, metadata, dataset_file, profiler)
+        if graph_index is None:
+            return
+        nbconvert_rdf, metadata = rebuild_notebook(graph_index, profiler)
+    else:
+        if rdf_format in LINE_FORMATS:
+            # Index the statements as they are read, without building a graph.
+            with profiler.phase('parse and index') as counts:
+                graph_index = NotebookGraphIndex(base_dir=base_dir)
+                with io.open(infile, encoding='utf-8') as fin:
+                    LineParser(graph_index, rdf_format).parse_file(fin)
+                counts['triples'] = graph_index.triple_count
+                counts['bytes'] = os.path.getsize(infile)
+        else:
+            with profiler.phase('parse') as counts:
+                nbrdf = read_rdf_graph(infile, rdf_format)
+                counts['triples'] = len(nbrdf)
+                counts['bytes'] = os.path.getsize(infile)
+            with profiler.phase('index') as counts:
+                graph_index = NotebookGraphIndex(nbrdf, base_dir)
+                counts['triples'] = graph_index.triple_count
+        nbconvert_rdf, metadata = rebuild_notebook(graph_index, profiler)
+    return write_notebook(nbconvert_rdf, metadata, output_file, profiler)
+
+
+def rebuild_notebook(graph_index, profiler):
+    with profiler.phase('rebuild notebook') as counts:
+        counts['triples'] = graph_index.triple_count
+        return graph_index.get_notebook_cells(), graph_index.get_notebook_metadata()
+
+
+def convert_store_to_notebooks(args):
+    """Rebuild the notebooks of the named graphs of `args.store`.
+
+    Only the notebooks whose ids or graph names are in `args.inputs` are
+    rebuilt if some are given. Every graph is read from the store on its
+    own, so memory holds one notebook at a time.
+    """
+    name, configuration = parse_store_spec(args.store)
+    base_iri = getattr(args, 'base_iri', None) or DATASET_BASE_IRI
+    store_directory = os.path.dirname(configuration)
+    dataset_dir = os.path.join(store_directory, os.path.splitext(os.path.basename(configuration))[0] + "_rdf2nb")
+    selected = set(getattr(args, 'inputs', None) or [])
+    rdf_store = open_rdf_store(args.store, create=False)
+    try:
+        for graph in rdf_store.store.contexts():
+            graph_name = six.text_type(graph.identifier)
+            if selected and graph_name not in selected and graph_name[len(base_iri):] not in selected:
+                continue
+            graph_index = NotebookGraphIndex(graph, store_directory or os.curdir)
+            if not graph_index.cells and not graph_index.notebooks:
+                continue
+            output_file = os.path.join(dataset_dir, dataset_notebook_path(graph_name, base_iri))
+            print("Converting graph {0} to notebook {1}".format(graph_name, output_file))
+            write_notebook(graph_index.get_notebook_cells(), graph_index.get_notebook_metadata(), output_file)
+    finally:
+        rdf_store.close()
+
+
+def write_notebook(cells, metadata, output_file, profiler=NO_PROFILER):
+    with profiler.phase('write notebook') as counts:
+        nb = nbbase.new_notebook(cells=cells, metadata=metadata)
+        validate_result = nbbase.validate(nb)
+        if os.path.dirname(output_file) and not os.path.isdir(os.path.dirname(output_file)):
+            os.makedirs(os.path.dirname(output_file))
+        with io.open(output_file, 'w', encoding='utf-8') as fout:
+            nbformat.write(nb, fout, version=max(nbformat.versions))
+        counts['bytes'] = os.path.getsize(output_file)
         return nb
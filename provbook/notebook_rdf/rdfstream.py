@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+import codecs
+import re
+
+import six
+from rdflib import BNode, Literal, URIRef
+try:
+    from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+except ImportError:
+    # rdflib < 6
+    from rdflib.plugins.parsers.ntriples import NTriplesParser as W3CNTriplesParser
+from rdflib.plugins.parsers.ntriples import ParseError, r_tail, r_wspace, r_wspaces, unquote
+
+from .formats import LINE_FORMATS, serializer_format
+
+STREAM_FORMATS = ('nt', 'nquads', 'turtle')
+
+
+def split_prefixes(data):
+    """Split serialized Turtle into its @prefix lines and its body."""
+    lines = data.splitlines(True)
+    header_length = 0
+    for line in lines:
+        if not line.startswith('@prefix'):
+            break
+        header_length += 1
+    return lines[:header_length], ''.join(lines[header_length:])
+
+
+class RDFStreamWriter(object):
+    """Append the triples of a graph to an open text file chunk by chunk.
+
+    Every chunk is serialized on its own, so only the triples of the
+    current chunk are held in memory. N-Triples chunks are written as they
+    are. Turtle chunks share the prefixes of the graph: each prefix is
+    declared once, before the first chunk that uses it. N-Quads are put
+    into the named graph `graph_name`, or into the default graph.
+    """
+
+    def __init__(self, fout, format='nt', graph_name=None):
+        if format not in STREAM_FORMATS:
+            raise ValueError("Cannot stream RDF as {0}, use one of {1}".format(format, ', '.join(STREAM_FORMATS)))
+        if graph_name is not None and format != 'nquads':
+            raise ValueError("Only N-Quads can be written into a named graph")
+        self.fout = fout
+        self.format = format
+        self.graph_suffix = ' {0} .\n'.format(graph_name.n3()) if graph_name is not None else None
+        self.prefixes = set()
+        self.triple_count = 0
+
+    def write(self, graph):
+        if not len(graph):
+            return
+        data = six.ensure_text(graph.serialize(format=serializer_format(self.format)))
+        if self.format == 'turtle':
+            self.triple_count += len(graph)
+            self.fout.write(self.strip_declared_prefixes(data))
+        else:
+            self.write_ntriples(data, len(graph))
+
+    def write_ntriples(self, data, triple_count):
+        """Append `triple_count` triples serialized as N-Triples elsewhere, by another process for instance."""
+        if self.format == 'turtle':
+            raise ValueError("Cannot append N-Triples to Turtle")
+        self.triple_count += triple_count
+        if self.graph_suffix is not None:
+            # Every N-Triples line ends with ' .'
+            data = ''.join(line[:-2] + self.graph_suffix for line in data.splitlines() if line)
+        self.fout.write(data)
+
+    def strip_declared_prefixes(self, data):
+        prefixes, body = split_prefixes(data)
+        header = []
+        for line in prefixes:
+            if line not in self.prefixes:
+                self.prefixes.add(line)
+                header.append(line)
+        return ''.join(header) + body
+
+
+# A line with IRIs and blank node labels without escapes, and a literal
+# whose escapes are decoded only if it has any. Other lines are left to
+# the rdflib parser.
+_IRI = r'<([^<>"{}|^`\\\s]*)>'
+_BNODE = r'_:([-\w.:]+)'
+_LITERAL = r'"([^"\\]*(?:\\.[^"\\]*)*)"(?:@([a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^' + _IRI + r')?'
+_TRIPLE = r'\s*(?:{0}|{1})\s*{0}\s*(?:{0}|{1}|{2})'.format(_IRI, _BNODE, _LITERAL)
+_GRAPH = r'(?:\s*(?:{0}|{1}))?'.format(_IRI, _BNODE)
+_END = r'\s*\.\s*(?:#.*)?$'
+r_fast_triple = re.compile(_TRIPLE + _END)
+r_fast_quad = re.compile(_TRIPLE + _GRAPH + _END)
+
+
+class LineParser(W3CNTriplesParser):
+    """Parse N-Triples or N-Quads line by line into `sink.triple(s, p, o)`.
+
+    Statements are passed on as they are read instead of being added to a
+    graph. N-Quads are passed to `sink.quad(s, p, o, graph_name)` if the
+    sink has one, with None for the default graph, and otherwise to
+    `sink.triple`, dropping their graph.
+    """
+
+    def __init__(self, sink, format='nt'):
+        if format not in LINE_FORMATS:
+            raise ValueError("Cannot parse {0} line by line, use one of {1}".format(format, ', '.join(LINE_FORMATS)))
+        W3CNTriplesParser.__init__(self, sink)
+        self.quads = format == 'nquads'
+        self.add_quad = getattr(sink, 'quad', None) if self.quads else None
+        self.fast_line = r_fast_quad if self.quads else r_fast_triple
+        self.uris = {}
+
+    def parse_file(self, fin):
+        if not hasattr(fin, 'encoding'):
+            fin = codecs.getreader('utf-8')(fin)
+        for line in fin:
+            match = self.fast_line.match(line)
+            if match is not None:
+                self.add(*self.fast_terms(match.groups()))
+                continue
+            self.line = line.rstrip('\r\n')
+            try:
+                self.parseline()
+            except ParseError as e:
+                raise ParseError("Invalid line ({0}): {1!r}".format(e, line))
+        return self.sink
+
+    def add(self, subject, predicate, obj, graph_name=None):
+        if self.add_quad is not None:
+            self.add_quad(subject, predicate, obj, graph_name)
+        else:
+            self.sink.triple(subject, predicate, obj)
+
+    def fast_terms(self, groups):
+        subject_iri, subject_bnode, predicate, obj_iri, obj_bnode, value, lang, datatype = groups[:8]
+        subject = self.uri(subject_iri) if subject_iri is not None else self.bnode(subject_bnode)
+        if obj_iri is not None:
+            obj = self.uri(obj_iri)
+        elif obj_bnode is not None:
+            obj = self.bnode(obj_bnode)
+        else:
+            if '\\' in value:
+                value = unquote(value)
+            obj = Literal(value, lang, self.uri(datatype) if datatype else None)
+        if len(groups) > 8 and groups[8] is not None:
+            return subject, self.uri(predicate), obj, self.uri(groups[8])
+        if len(groups) > 8 and groups[9] is not None:
+            return subject, self.uri(predicate), obj, self.bnode(groups[9])
+        return subject, self.uri(predicate), obj
+
+    def uri(self, iri):
+        # The same few predicates, types and datatypes are on every line.
+        uri = self.uris.get(iri)
+        if uri is None:
+            uri = self.uris[iri] = URIRef(iri)
+        return uri
+
+    def bnode(self, label):
+        bnode = self._bnode_ids.get(label)
+        if bnode is None:
+            bnode = self._bnode_ids[label] = BNode()
+        return bnode
+
+    def parseline(self, bnode_context=None):
+        self.eat(r_wspace)
+        if not self.line or self.line.startswith('#'):
+            return
+        subject = self.subject()
+        self.eat(r_wspaces)
+        predicate = self.predicate()
+        self.eat(r_wspaces)
+        obj = self.object()
+        graph_name = None
+        if self.quads:
+            self.eat(r_wspace)
+            graph_name = self.uriref() or self.nodeid() or None
+        self.eat(r_tail)
+        if self.line:
+            raise ParseError("Trailing garbage")
+        self.add(subject, predicate, obj, graph_name)
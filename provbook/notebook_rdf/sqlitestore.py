@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Persistent triple store for the RDF of a corpus of notebooks.
+
+Notebooks converted with `--store` are appended to a store on disk, each
+into its own named graph with the IRIs of a dataset, see dataset.py, and
+rebuilt or queried from it without reading RDF files again. The default
+store is SQLiteStore, a single SQLite file. Any other rdflib store plugin
+with persistence, e.g. `BerkeleyDB:corpus.db` or `Oxigraph:corpus`, is
+selected with a `<plugin name>:<configuration>` specification.
+"""
+
+import json
+import os
+import sqlite3
+
+import six
+from rdflib import BNode, Dataset, Literal, URIRef, plugin
+from rdflib.graph import Graph
+from rdflib.store import Store, VALID_STORE, NO_STORE
+
+from .rdfstream import LineParser
+
+# Statements added to the store in one batch while loading.
+LOAD_BATCH_SIZE = 10000
+
+
+def encode_term(term):
+    if isinstance(term, Literal):
+        datatype = six.text_type(term.datatype) if term.datatype is not None else None
+        return 'L' + json.dumps([six.text_type(term), term.language, datatype])
+    if isinstance(term, BNode):
+        return 'B' + term
+    return 'U' + term
+
+
+def decode_term(value):
+    kind, value = value[0], value[1:]
+    if kind == 'L':
+        lexical, language, datatype = json.loads(value)
+        return Literal(lexical, lang=language, datatype=URIRef(datatype) if datatype is not None else None)
+    if kind == 'B':
+        return BNode(value)
+    return URIRef(value)
+
+
+class SQLiteStore(Store):
+    """Context-aware rdflib store in a SQLite database.
+
+    Statements are kept in one table, with indexes for lookups by graph,
+    subject, and predicate and object. Terms are stored as text, so the
+    file can also be read without rdflib.
+    """
+
+    context_aware = True
+    graph_aware = True
+    formula_aware = False
+    transaction_aware = True
+
+    def __init__(self, configuration=None, identifier=None):
+        self.connection = None
+        self.prefixes = {}
+        Store.__init__(self, configuration, identifier)
+
+    def open(self, configuration, create=False):
+        if not create and not os.path.exists(configuration):
+            return NO_STORE
+        self.connection = sqlite3.connect(configuration)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS quads ('
+                's TEXT NOT NULL, p TEXT NOT NULL, o TEXT NOT NULL, g TEXT NOT NULL, '
+                'PRIMARY KEY (g, s, p, o))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS quads_spo ON quads (s, p, o)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS quads_po ON quads (p, o)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS graphs (g TEXT PRIMARY KEY)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS namespaces (prefix TEXT PRIMARY KEY, uri TEXT NOT NULL)')
+        self.prefixes = dict(self.connection.execute('SELECT prefix, uri FROM namespaces'))
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction=False):
+        if self.connection is not None:
+            if commit_pending_transaction:
+                self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def destroy(self, configuration):
+        self.close()
+        if os.path.exists(configuration):
+            os.remove(configuration)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def add(self, triple, context, quoted=False):
+        Store.add(self, triple, context, quoted)
+        self.addN([triple + (context,)])
+
+    def addN(self, quads):
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO quads (s, p, o, g) VALUES (?, ?, ?, ?)',
+            ((encode_term(s), encode_term(p), encode_term(o), encode_term(context.identifier))
+             for s, p, o, context in quads))
+
+    def where(self, triple_pattern, context):
+        clauses = []
+        params = []
+        for column, term in zip('spo', triple_pattern):
+            if term is not None:
+                clauses.append(column + ' = ?')
+                params.append(encode_term(term))
+        if context is not None:
+            clauses.append('g = ?')
+            params.append(encode_term(context.identifier))
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def remove(self, triple_pattern, context=None):
+        where, params = self.where(triple_pattern, context)
+        self.connection.execute('DELETE FROM quads' + where, params)
+
+    def triples(self, triple_pattern, context=None):
+        where, params = self.where(triple_pattern, context)
+        if context is not None:
+            for s, p, o in self.connection.execute('SELECT s, p, o FROM quads' + where, params):
+                yield (decode_term(s), decode_term(p), decode_term(o)), iter([context])
+            return
+        for s, p, o in self.connection.execute('SELECT DISTINCT s, p, o FROM quads' + where, params):
+            triple = (decode_term(s), decode_term(p), decode_term(o))
+            yield triple, self.contexts(triple)
+
+    def __len__(self, context=None):
+        if context is not None:
+            return self.connection.execute('SELECT COUNT(*) FROM quads WHERE g = ?',
+                                           (encode_term(context.identifier),)).fetchone()[0]
+        return self.connection.execute('SELECT COUNT(*) FROM (SELECT DISTINCT s, p, o FROM quads)').fetchone()[0]
+
+    def contexts(self, triple=None):
+        if triple is None:
+            rows = self.connection.execute('SELECT g FROM graphs UNION SELECT DISTINCT g FROM quads').fetchall()
+        else:
+            where, params = self.where(triple, None)
+            rows = self.connection.execute('SELECT DISTINCT g FROM quads' + where, params).fetchall()
+        for (g,) in rows:
+            yield Graph(store=self, identifier=decode_term(g))
+
+    def add_graph(self, graph):
+        self.connection.execute('INSERT OR IGNORE INTO graphs (g) VALUES (?)', (encode_term(graph.identifier),))
+
+    def remove_graph(self, graph):
+        self.remove((None, None, None), graph)
+        self.connection.execute('DELETE FROM graphs WHERE g = ?', (encode_term(graph.identifier),))
+
+    def bind(self, prefix, namespace, override=True):
+        if not override and (prefix in self.prefixes or self.prefix(namespace) is not None):
+            return
+        for old_prefix in [p for p, uri in self.prefixes.items() if uri == six.text_type(namespace)]:
+            del self.prefixes[old_prefix]
+            self.connection.execute('DELETE FROM namespaces WHERE prefix = ?', (old_prefix,))
+        self.prefixes[prefix] = six.text_type(namespace)
+        self.connection.execute('INSERT OR REPLACE INTO namespaces (prefix, uri) VALUES (?, ?)',
+                                (prefix, six.text_type(namespace)))
+
+    def namespace(self, prefix):
+        uri = self.prefixes.get(prefix)
+        return URIRef(uri) if uri is not None else None
+
+    def prefix(self, namespace):
+        for prefix, uri in self.prefixes.items():
+            if uri == six.text_type(namespace):
+                return prefix
+        return None
+
+    def namespaces(self):
+        for prefix, uri in list(self.prefixes.items()):
+            yield prefix, URIRef(uri)
+
+
+plugin.register('ProvBookSQLite', Store, 'provbook.notebook_rdf.sqlitestore', 'SQLiteStore')
+
+
+def parse_store_spec(spec):
+    """Split a store specification into a plugin name and its configuration.
+
+    `spec` is the path of a SQLiteStore file, or `<plugin>:<configuration>`
+    for another rdflib store plugin.
+    """
+    if ':' in spec:
+        plugin_name, configuration = spec.split(':', 1)
+        try:
+            plugin.get(plugin_name, Store)
+        except plugin.PluginException:
+            pass  # A path with a colon, such as C:\corpus.sqlite
+        else:
+            return plugin_name, configuration
+    return 'ProvBookSQLite', spec
+
+
+def open_rdf_store(spec, create=True):
+    """Return a Dataset on the persistent store `spec`."""
+    name, configuration = parse_store_spec(spec)
+    store = plugin.get(name, Store)()
+    if store.open(configuration, create=create) == NO_STORE:
+        raise IOError("No RDF store at {0}".format(configuration))
+    return Dataset(store=store, default_union=True)
+
+
+class StoreLoader(object):
+    """Add the statements of converted notebooks to a store in batches.
+
+    The previous statements of every named graph loaded are removed
+    first, so a notebook converted again replaces its old version. The
+    loader reads N-Quads with `load`, and also takes the graphs of
+    NBToRDFConverter.stream_to_store like an RDFStreamWriter.
+    """
+
+    def __init__(self, dataset, graph_name=None):
+        self.dataset = dataset
+        self.graph_name = graph_name
+        self.graphs = {}
+        self.batch = []
+        self.triple_count = 0
+
+    def load(self, quads):
+        """Load the N-Quads text or file `quads` and commit."""
+        LineParser(self, 'nquads').parse_file(six.StringIO(quads) if isinstance(quads, six.string_types) else quads)
+        self.commit()
+
+    def write(self, graph):
+        for subject, predicate, obj in graph:
+            self.quad(subject, predicate, obj, self.graph_name)
+
+    def write_ntriples(self, data, triple_count):
+        LineParser(self, 'nt').parse_file(six.StringIO(data))
+
+    def triple(self, subject, predicate, obj):
+        self.quad(subject, predicate, obj, self.graph_name)
+
+    def open_graph(self, graph_name):
+        """Return the graph `graph_name`, emptied the first time it is loaded."""
+        graph = self.graphs.get(graph_name)
+        if graph is None:
+            self.flush()
+            if graph_name is None:
+                graph = self.dataset.default_graph
+            else:
+                graph = self.dataset.graph(graph_name)
+            self.dataset.store.remove((None, None, None), graph)
+            self.graphs[graph_name] = graph
+        return graph
+
+    def quad(self, subject, predicate, obj, graph_name):
+        graph = self.open_graph(graph_name)
+        self.batch.append((subject, predicate, obj, graph))
+        if len(self.batch) >= LOAD_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.dataset.store.addN(self.batch)
+        self.triple_count += len(self.batch)
+        self.batch = []
+
+    def commit(self):
+        self.flush()
+        self.dataset.commit()
+        self.graphs.clear()
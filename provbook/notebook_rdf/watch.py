@@ -0,0 +1,404 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Converting the notebooks of directories again whenever they are saved.
+
+A watcher reports the paths that changed under the watched directories:
+InotifyWatcher with the inotify of Linux, called through ctypes, and
+PollingWatcher by comparing the size and modification time of the files
+every few seconds elsewhere, or on network file systems where inotify does
+not see the changes made by other machines. A notebook saved several times
+in a row, by autosave for instance, is converted once it has not changed
+for `debounce` seconds, in a pool of `jobs` processes. A notebook saved
+again while it is converted is converted once more after it.
+
+A pass lasts from the first conversion queued until the pool is idle. The
+conversion time of every file of a pass, and its latency from the save of
+the notebook to its RDF, are printed and appended as a line of JSON to the
+status log.
+"""
+
+from __future__ import print_function
+
+import errno
+import io
+import json
+import multiprocessing
+import os
+import select
+import signal
+import struct
+import sys
+import time
+from collections import OrderedDict
+
+import six
+
+from .batch import convert_dataset_file, convert_file, find_input_files, job_options
+from .formats import rdf_output_file
+from .profiling import write_profile_report
+
+DEBOUNCE_SECONDS = 2.0
+POLL_SECONDS = 2.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def file_signature(path):
+    """Return the (modification time, size) of a file, or None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+class WatchedInputs(object):
+    """The notebooks of the inputs of --watch, now and to come.
+
+    Directories are watched recursively for files of `informat`; files and
+    the files matching glob patterns when the watch starts are watched
+    through their directory.
+    """
+
+    def __init__(self, inputs, informat, file_extension_detect):
+        self.informat = informat
+        self.file_extension_detect = file_extension_detect
+        self.directories = [os.path.normpath(path) for path in inputs if os.path.isdir(path)]
+        self.files = set(os.path.normpath(path)
+                         for path in find_input_files([path for path in inputs if not os.path.isdir(path)],
+                                                      informat, file_extension_detect))
+
+    def file_directories(self):
+        return sorted(set(os.path.dirname(path) or os.curdir for path in self.files))
+
+    def in_directories(self, path):
+        """Whether `path` is under a directory watched recursively, outside checkpoints."""
+        path = os.path.normpath(path)
+        return ('.ipynb_checkpoints' not in path.split(os.sep) and
+                any(directory == os.curdir or path.startswith(directory + os.sep) for directory in self.directories))
+
+    def matches(self, path):
+        path = os.path.normpath(path)
+        if path in self.files:
+            return True
+        # Not the copies Jupyter keeps while saving, such as .~name.ipynb
+        return (not os.path.basename(path).startswith('.') and
+                self.file_extension_detect(path) == self.informat and self.in_directories(path))
+
+    def find(self):
+        """Return the notebooks that exist now."""
+        found = find_input_files(self.directories + sorted(self.files), self.informat, self.file_extension_detect)
+        return [os.path.normpath(path) for path in found if self.matches(path)]
+
+
+class PollingWatcher(object):
+    """Report the notebooks whose size or modification time changed every `interval` seconds."""
+
+    def __init__(self, inputs, interval=POLL_SECONDS):
+        self.inputs = inputs
+        self.interval = interval
+        # A change is seen up to an interval after it is made.
+        self.delay = interval
+        self.snapshot = self.scan()
+        self.next_scan = time.time() + interval
+
+    def scan(self):
+        return dict((path, file_signature(path)) for path in self.inputs.find())
+
+    def changes(self, timeout):
+        """Wait at most `timeout` seconds and return the paths that changed."""
+        wait = self.next_scan - time.time()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        if wait > 0:
+            time.sleep(wait)
+        self.next_scan = time.time() + self.interval
+        snapshot = self.scan()
+        changed = set(path for path, signature in snapshot.items() if self.snapshot.get(path) != signature)
+        changed.update(path for path in self.snapshot if path not in snapshot)
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def load_libc_inotify():
+    """Return the C library if it has inotify, or None."""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init, libc.inotify_add_watch
+    except (ImportError, OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher(object):
+    """Report the paths of the files closed after writing, moved or deleted under the watched directories.
+
+    Raises OSError when inotify is not available, or when the directories
+    exceed the number of watches allowed to a user.
+    """
+
+    delay = 0.0
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.libc = load_libc_inotify()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise self.error()
+        self.directories = {}
+        try:
+            for directory in inputs.directories:
+                self.add_tree(directory)
+            for directory in inputs.file_directories():
+                self.add_directory(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def error(self, path=None):
+        import ctypes
+        code = ctypes.get_errno()
+        return OSError(code, os.strerror(code), path)
+
+    def add_directory(self, directory):
+        path = six.ensure_binary(directory, sys.getfilesystemencoding(), 'surrogateescape')
+        wd = self.libc.inotify_add_watch(self.fd, path, INOTIFY_MASK)
+        if wd < 0:
+            raise self.error(directory)
+        self.directories[wd] = directory
+
+    def add_tree(self, root):
+        """Watch `root` and its subdirectories, and return the files in them."""
+        files = []
+        for directory, dirs, filenames in os.walk(root):
+            dirs[:] = [name for name in dirs if name != '.ipynb_checkpoints']
+            self.add_directory(directory)
+            files.extend(os.path.join(directory, name) for name in filenames)
+        return files
+
+    def changes(self, timeout):
+        """Wait at most `timeout` seconds and return the paths that changed."""
+        changed = set()
+        while select.select([self.fd], [], [], timeout)[0]:
+            timeout = 0
+            data = os.read(self.fd, 65536)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = six.ensure_str(data[offset:offset + length].rstrip(b'\0'), sys.getfilesystemencoding(),
+                                      'surrogateescape')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost: report every notebook, the unchanged ones are skipped.
+                    changed.update(self.inputs.find())
+                    continue
+                directory = self.directories.get(wd)
+                if mask & IN_IGNORED:
+                    self.directories.pop(wd, None)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and self.inputs.in_directories(path):
+                        try:
+                            changed.update(self.add_tree(path))
+                        except OSError:
+                            # Deleted already, or out of watches.
+                            pass
+                    continue
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(inputs, poll_interval=None):
+    """Return an InotifyWatcher, or a PollingWatcher with `poll_interval` or without inotify."""
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(inputs)
+        except OSError as e:
+            print("inotify cannot watch the notebooks ({0}), checking them every {1:g}s".format(e, POLL_SECONDS),
+                  file=sys.stderr)
+            poll_interval = POLL_SECONDS
+    return PollingWatcher(inputs, poll_interval)
+
+
+def init_watch_worker():
+    # Ctrl-C stops the watch in the main process, which terminates the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt()
+
+
+def watch_files(inputs, args, file_extension_detect, jobs=None, debounce=DEBOUNCE_SECONDS, poll_interval=None,
+                status_log=None):
+    """Convert the notebooks of `inputs` whenever they change, until interrupted.
+
+    The notebooks are first converted if their RDF file is missing or older
+    than them, or all of them with `args.store`. Returns the number of
+    failures.
+    """
+    options = job_options(args)
+    jobs = max(1, jobs or multiprocessing.cpu_count())
+    job = convert_dataset_file if options.get('store') else convert_file
+    rdf_format = args.rdf_format or args.stream or 'turtle'
+    watched = WatchedInputs(inputs, 'notebook', file_extension_detect)
+    watcher = make_watcher(watched, poll_interval)
+
+    start_time = time.time()
+    # path: signature of the version converted last
+    converted = {}
+    # path: (first, last) time a change was seen
+    pending = OrderedDict()
+    # path: (result, signature, time it changed)
+    running = {}
+    for path in watched.find():
+        signature = file_signature(path)
+        output_file = None if options.get('store') else rdf_output_file(path, rdf_format)
+        if output_file and signature and os.path.isfile(output_file) and \
+                os.path.getmtime(output_file) >= signature[0]:
+            converted[path] = signature
+        else:
+            pending[path] = (start_time, start_time - debounce)
+    print("Watching {0} notebooks with {1}, {2} to convert".format(
+        len(converted) + len(pending), type(watcher).__name__, len(pending)))
+
+    pool = multiprocessing.Pool(jobs, init_watch_worker)
+    # Stopped like with Ctrl-C when run as a service.
+    sigterm_handler = signal.signal(signal.SIGTERM, interrupt)
+    rdf_store = loader = None
+    if options.get('store'):
+        from .sqlitestore import StoreLoader, open_rdf_store
+        rdf_store = open_rdf_store(options['store'])
+        loader = StoreLoader(rdf_store)
+    passes = failed = 0
+    pass_start = None
+    pass_files = []
+    reports = []
+    try:
+        while True:
+            if running:
+                timeout = 0.1
+            elif pending:
+                timeout = max(0.0, min(last for _, last in pending.values()) + debounce - time.time())
+            else:
+                timeout = 1.0
+            now = time.time()
+            for path in watcher.changes(timeout):
+                path = os.path.normpath(path)
+                if watched.matches(path):
+                    first, _ = pending.pop(path, (now, None))
+                    pending[path] = (first, now)
+
+            for path, (result, signature, changed_time) in list(running.items()):
+                if not result.ready():
+                    continue
+                del running[path]
+                input_file, ok, elapsed, error, quads, report = result.get()
+                if report is not None:
+                    reports.append(report)
+                if ok and loader is not None:
+                    try:
+                        loader.load(quads)
+                    except Exception as e:
+                        ok, error = False, '{0}: {1}'.format(type(e).__name__, e)
+                latency = time.time() - changed_time
+                status = OrderedDict([('file', path), ('ok', ok), ('seconds', round(elapsed, 3)),
+                                      ('latency', round(latency, 3))])
+                # A notebook that failed is converted again when it is saved again.
+                converted[path] = signature
+                if ok:
+                    print('[ok] {0} ({1:.2f}s, latency {2:.2f}s)'.format(path, elapsed, latency))
+                else:
+                    failed += 1
+                    status['error'] = error
+                    print('[failed] {0} ({1:.2f}s): {2}'.format(path, elapsed, error), file=sys.stderr)
+                pass_files.append(status)
+
+            now = time.time()
+            for path, (first, last) in list(pending.items()):
+                if len(running) >= jobs:
+                    break
+                if path in running or now - last < debounce:
+                    continue
+                del pending[path]
+                signature = file_signature(path)
+                if signature is None:
+                    if converted.pop(path, None) is not None:
+                        print('[deleted] {0}'.format(path))
+                    continue
+                if converted.get(path) == signature:
+                    continue
+                if pass_start is None:
+                    pass_start = now
+                # The latency runs from the save, seen by inotify or up to an interval
+                # earlier by the polling, or from the start of the watch for the
+                # notebooks saved before it.
+                changed_time = max(min(first, max(signature[0], first - watcher.delay)), start_time)
+                running[path] = (pool.apply_async(job, ((path, options),)), signature, changed_time)
+
+            if pass_start is not None and not running and not pending:
+                passes += 1
+                end_pass(passes, pass_start, pass_files, status_log)
+                if options.get('profile'):
+                    write_profile_report(options['profile'], reports)
+                pass_start = None
+                pass_files = []
+    except KeyboardInterrupt:
+        print("Stopped watching after {0} passes, {1} failed".format(passes, failed))
+    finally:
+        signal.signal(signal.SIGTERM, sigterm_handler)
+        pool.terminate()
+        pool.join()
+        watcher.close()
+        if rdf_store is not None:
+            rdf_store.close(commit_pending_transaction=True)
+    return failed
+
+
+def end_pass(number, pass_start, files, status_log=None):
+    """Print the summary of a pass and append its status to `status_log`."""
+    seconds = time.time() - pass_start
+    ok = sum(1 for status in files if status['ok'])
+    latency = max([status['latency'] for status in files] or [0.0])
+    print('Pass {0}: converted {1} of {2} files in {3:.2f}s, latency up to {4:.2f}s'.format(
+        number, ok, len(files), seconds, latency))
+    if status_log:
+        status = OrderedDict([
+            ('pass', number),
+            ('time', time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(pass_start))),
+            ('seconds', round(seconds, 3)),
+            ('converted', ok),
+            ('failed', len(files) - ok),
+            ('files', files),
+        ])
+        with io.open(status_log, 'a', encoding='utf-8') as fout:
+            fout.write(six.text_type(json.dumps(status, ensure_ascii=False)) + '\n')
@@ -0,0 +1,163 @@
+# coding: utf-8
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Decoding and retention of the provenance history written by the nbextension.
+
+An entry of `cell.metadata.provenance` may store its source as a delta
+against the source of the previous entry, and its outputs as a reference
+to an earlier entry or to the live outputs of the cell:
+
+    "source_delta": {"prefix": 12, "suffix": 3, "text": "inserted"}
+    "outputs_ref": 4
+    "outputs_ref": "cell"
+
+The source is then `previous[:prefix] + text + previous[-suffix:]`, where
+the lengths count UTF-16 code units as they are computed in the browser.
+Entries with a plain `source` and `outputs` decode to themselves.
+
+The retention policy is read from the `provbook` section of the notebook
+nbconfig, where the nbextension applies it when the notebook is saved.
+"""
+
+from __future__ import unicode_literals
+
+import datetime
+import glob
+import io
+import json
+import os
+
+RETENTION_DEFAULTS = {
+    # 0 means no limit.
+    'retention_max_executions': 0,
+    'retention_max_age_days': 0,
+    'retention_max_bytes': 0,
+    'retention_keep_first': True,
+    'retention_keep_errors': True,
+}
+
+
+def _utf16_splice(previous, prefix, suffix, text):
+    units = previous.encode('utf-16-le')
+    head = units[:2 * prefix].decode('utf-16-le')
+    tail = units[len(units) - 2 * suffix:].decode('utf-16-le') if suffix else ''
+    return head + text + tail
+
+
+def decode_provenance(provenance, cell_outputs=None):
+    """Return the provenance entries of a cell with full sources and outputs."""
+    decoded = []
+    for entry in provenance:
+        decoded_entry = dict((key, value) for key, value in entry.items()
+                             if key not in ('source_delta', 'outputs_ref'))
+        if 'source_delta' in entry:
+            delta = entry['source_delta']
+            previous = decoded[-1].get('source', '') if decoded else ''
+            decoded_entry['source'] = _utf16_splice(previous, delta['prefix'], delta['suffix'], delta['text'])
+        if 'outputs_ref' in entry:
+            ref = entry['outputs_ref']
+            decoded_entry['outputs'] = (cell_outputs or []) if ref == 'cell' else decoded[ref]['outputs']
+        decoded.append(decoded_entry)
+    return decoded
+
+
+# The last policy read, by the paths, modification times and sizes of its config files.
+_retention_cache = {}
+
+
+def _retention_config_files():
+    from jupyter_core.paths import jupyter_config_path
+    for config_dir in reversed(jupyter_config_path()):
+        nbconfig_dir = os.path.join(config_dir, 'nbconfig')
+        config_files = sorted(glob.glob(os.path.join(nbconfig_dir, 'notebook.d', '*.json')))
+        config_files.append(os.path.join(nbconfig_dir, 'notebook.json'))
+        for config_file in config_files:
+            try:
+                stat = os.stat(config_file)
+            except OSError:
+                continue
+            yield config_file, stat.st_mtime, stat.st_size
+
+
+def load_retention_policy():
+    """Return the retention settings of the `provbook` nbconfig section.
+
+    The config files are only read again when one of them changes.
+    """
+    config_files = tuple(_retention_config_files())
+    policy = _retention_cache.get(config_files)
+    if policy is None:
+        policy = {}
+        for config_file, _, _ in config_files:
+            with io.open(config_file, encoding='utf-8') as fin:
+                section = json.load(fin).get('provbook', {})
+            policy.update((key, value) for key, value in section.items() if key in RETENTION_DEFAULTS)
+        _retention_cache.clear()
+        _retention_cache[config_files] = policy
+    return dict(policy)
+
+
+def entry_time(entry):
+    """Return the start or modification time of an entry, or None if it is unknown."""
+    from dateutil.parser import parse
+    from dateutil.tz import tzutc
+    try:
+        time = parse(entry.get('start_time') or entry.get('last_modified') or '')
+    except (ValueError, OverflowError):
+        return None
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=tzutc())
+    return time
+
+
+def _entry_size(entry):
+    return len(json.dumps(entry, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+
+
+def _is_error_entry(entry):
+    return any(output.get('output_type') == 'error' for output in entry.get('outputs') or [])
+
+
+def evict_provenance(provenance, policy=None, now=None):
+    """Return the decoded provenance entries kept by the retention policy.
+
+    Only the last `retention_max_executions` entries and the entries newer
+    than `retention_max_age_days` are kept. Then the oldest entries are
+    dropped until the entries take at most `retention_max_bytes` as JSON.
+    The first entry and the entries with an error output are always kept,
+    unless `retention_keep_first` or `retention_keep_errors` is false.
+    The nbextension applies the same rules in index.js.
+    """
+    policy = dict(RETENTION_DEFAULTS, **(policy or {}))
+    max_executions = policy['retention_max_executions']
+    max_age_days = policy['retention_max_age_days']
+    max_bytes = policy['retention_max_bytes']
+    if max_age_days:
+        from dateutil.tz import tzutc
+        oldest_time = (now or datetime.datetime.now(tzutc())) - datetime.timedelta(days=max_age_days)
+
+    protected = []
+    keep = []
+    for index, entry in enumerate(provenance):
+        protected.append((policy['retention_keep_first'] and index == 0) or
+                         (policy['retention_keep_errors'] and _is_error_entry(entry)))
+        kept = True
+        if max_executions and index < len(provenance) - max_executions:
+            kept = False
+        if max_age_days:
+            time = entry_time(entry)
+            if time is not None and time < oldest_time:
+                kept = False
+        keep.append(kept or protected[index])
+
+    if max_bytes:
+        sizes = [_entry_size(entry) for entry in provenance]
+        total_size = sum(size for size, kept in zip(sizes, keep) if kept)
+        for index in range(len(provenance)):
+            if total_size <= max_bytes:
+                break
+            if keep[index] and not protected[index]:
+                keep[index] = False
+                total_size -= sizes[index]
+    return [entry for entry, kept in zip(provenance, keep) if kept]
@@ -0,0 +1,99 @@
+# coding: utf-8
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Sidecar store for the provenance history of a notebook.
+
+With the `provenance_store` option of the nbextension set to `sidecar`,
+execution records are appended to a SQLite database next to the notebook,
+`.provbook/<notebook name>.sqlite`, instead of `cell.metadata.provenance`.
+Cells are identified by the `provbook_id` in their metadata. The history of
+a cell is the provenance still stored in its metadata followed by the
+records of the store.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import os
+import sqlite3
+
+from .provenance import decode_provenance, evict_provenance
+
+CELL_ID_KEY = 'provbook_id'
+
+
+def store_path(notebook_path):
+    directory, name = os.path.split(os.path.abspath(notebook_path))
+    return os.path.join(directory, '.provbook', name + '.sqlite')
+
+
+class ProvenanceStore(object):
+    """Append-only table of the provenance entries of the cells of a notebook."""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS provenance ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'cell_id TEXT NOT NULL, '
+                'entry TEXT NOT NULL)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS provenance_cell ON provenance (cell_id, id)')
+
+    @classmethod
+    def open(cls, notebook_path, create=False):
+        """Return the store of a notebook, or None if it has none and `create` is false."""
+        path = store_path(notebook_path)
+        if not os.path.exists(path):
+            if not create:
+                return None
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+        return cls(path)
+
+    def close(self):
+        self.connection.close()
+
+    def append(self, cell_id, entries):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO provenance (cell_id, entry) VALUES (?, ?)',
+                [(cell_id, json.dumps(entry, ensure_ascii=False)) for entry in entries])
+
+    def entries(self, cell_id):
+        rows = self.connection.execute(
+            'SELECT entry FROM provenance WHERE cell_id = ? ORDER BY id', (cell_id,))
+        return [json.loads(entry) for entry, in rows]
+
+    def all_entries(self):
+        cells = {}
+        for cell_id, entry in self.connection.execute('SELECT cell_id, entry FROM provenance ORDER BY id'):
+            cells.setdefault(cell_id, []).append(json.loads(entry))
+        return cells
+
+    def clear(self, cell_ids):
+        with self.connection:
+            self.connection.executemany('DELETE FROM provenance WHERE cell_id = ?',
+                                        [(cell_id,) for cell_id in cell_ids])
+
+
+def read_cell_provenance(cell_node, store=None, retention=None):
+    """Return the decoded provenance of a cell, followed by its records in `store`.
+
+    The retention policy, if any, is applied to the whole history, as the
+    nbextension does when it saves the notebook.
+    """
+    metadata = cell_node.get('metadata', {})
+    provenance = decode_provenance(metadata.get('provenance', []), cell_node.get('outputs'))
+    cell_id = metadata.get(CELL_ID_KEY)
+    if store is not None and cell_id:
+        # nbformat is only needed here, not to load the server extension.
+        from nbformat import from_dict
+        stored = [from_dict(entry) for entry in store.entries(cell_id)]
+        provenance = provenance + stored
+    if retention is not None:
+        provenance = evict_provenance(provenance, retention)
+    return provenance
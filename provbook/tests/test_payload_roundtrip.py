@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+import hashlib
+
+import nbformat
+import nbformat.v4.nbbase as nbbase
+import pytest
+
+from provbook.notebook_rdf.__main__ import command_line_parser, main
+
+
+PNG = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk'
+TEXT = 'x = 1\nprint(x)\n'
+
+
+def placeholder(mime_type, value):
+    data = value.encode('utf-8')
+    return '[{0} omitted by the RDF export: {1} bytes, sha256:{2}]'.format(
+        mime_type, len(data), hashlib.sha256(data).hexdigest())
+
+
+def new_notebook():
+    # One output per execution: the outputs of an execution share the IRIs of their suboutputs.
+    image = nbbase.new_output('display_data', data={'image/png': PNG, 'text/plain': '<image>'})
+    stream = nbbase.new_output('stream', name='stdout', text=TEXT)
+    cells = []
+    for index, output in enumerate([image, stream]):
+        provenance = [{
+            'source': 'cell_%d' % index,
+            'outputs': [output],
+            'start_time': '2020-01-01T00:0%d:00Z' % index,
+            'end_time': '2020-01-01T00:0%d:01Z' % index,
+            'execution_time': '1000ms',
+        }]
+        cells.append(nbbase.new_code_cell(source='cell_%d' % index, outputs=[output], execution_count=index + 1,
+                                          metadata={'provenance': provenance}))
+    return nbbase.new_notebook(cells=cells)
+
+
+def roundtrip(tmpdir, rdf_format, rebuild_args, export_args):
+    notebook_file = str(tmpdir.join('notebook.ipynb'))
+    rdf_file = str(tmpdir.join('notebook.nt' if rdf_format == 'nt' else 'notebook.ttl'))
+    nbformat.write(new_notebook(), notebook_file)
+    for argv in ([notebook_file, '-o', rdf_file, '--rdf-format', rdf_format] + export_args,
+                 [rdf_file, '--to', 'notebook'] + rebuild_args):
+        main(command_line_parser().parse_args(argv))
+    # The notebook rebuilt from RDF is always written next to the RDF file.
+    return nbformat.read(str(tmpdir.join('notebook_rdf2nb.ipynb')), as_version=4)
+
+
+def outputs(notebook):
+    """The outputs of the cells, each followed by the outputs of its provenance."""
+    for cell in notebook.cells:
+        for output in cell.outputs:
+            yield output
+        for entry in cell.metadata['provenance']:
+            for output in entry['outputs']:
+                yield output
+
+
+@pytest.mark.parametrize('rdf_format, rebuild_args', [
+    ('nt', []),
+    ('turtle', []),
+    ('turtle', ['--sparql']),
+])
+def test_excluded_mime_types_are_rebuilt_as_placeholders(tmpdir, rdf_format, rebuild_args):
+    notebook = roundtrip(tmpdir, rdf_format, rebuild_args, ['--exclude-mime', 'image/*'])
+    image, image_entry, stream, stream_entry = outputs(notebook)
+    for output in (image, image_entry):
+        assert output['data'] == {'image/png': placeholder('image/png', PNG), 'text/plain': '<image>'}
+    for output in (stream, stream_entry):
+        assert output['text'] == TEXT
+
+
+@pytest.mark.parametrize('rdf_format, rebuild_args', [
+    ('nt', []),
+    ('turtle', ['--sparql']),
+])
+def test_payloads_over_max_payload_are_rebuilt_as_placeholders(tmpdir, rdf_format, rebuild_args):
+    notebook = roundtrip(tmpdir, rdf_format, rebuild_args, ['--max-payload', '10'])
+    image, image_entry, stream, stream_entry = outputs(notebook)
+    for output in (image, image_entry):
+        assert output['data'] == {'image/png': placeholder('image/png', PNG), 'text/plain': '<image>'}
+    for output in (stream, stream_entry):
+        assert output['text'] == placeholder('text/plain', TEXT)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from .rundiff import diff_cell_pair, run_cell
+
+
+def cell_key(cell):
+    return hashlib.sha1(json.dumps(cell, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class CellDiffCache(object):
+    """LRU cache of the diffs between two execution cells, keyed by their content.
+
+    Executions that produced the same cell share their diffs, so stepping
+    back and forth through a history, or through several notebooks with the
+    same cells, diffs each distinct pair of cells once.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, base_cell, remote_cell):
+        """Return the cell diff entries from `base_cell` to `remote_cell`."""
+        key = (cell_key(base_cell), cell_key(remote_cell))
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                entries = self.entries.pop(key)
+                self.entries[key] = entries
+                return entries
+            self.misses += 1
+        entries = [] if key[0] == key[1] else diff_cell_pair((base_cell, remote_cell))
+        with self.lock:
+            self.entries[key] = entries
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entries
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def iter_diff_chain(cell_node, provenance, diff_cache, start=0):
+    """Yield the execution cells of a cell with the diff to the next execution.
+
+    Every item is `{"index": k, "cell": cell_k, "diff": entries}`, where
+    `entries` is the cell diff from execution k to execution k + 1, or None
+    for the last execution.
+    """
+    cells = [run_cell(cell_node, entry) for entry in provenance]
+    for index in range(start, len(cells)):
+        entries = diff_cache.get(cells[index], cells[index + 1]) if index + 1 < len(cells) else None
+        yield {'index': index, 'cell': cells[index], 'diff': entries}
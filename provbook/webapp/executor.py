@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+from __future__ import unicode_literals
+
+import datetime
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from tornado import gen, web
+
+
+class BoundedExecutor(object):
+    """Run blocking work of the handlers off the IO loop.
+
+    At most `max_workers` calls run at once in a thread pool and at most
+    `max_queue` wait for a thread; further calls are rejected with a 503.
+    A call that does not finish within `timeout` seconds fails with a 504.
+    A call still waiting is then cancelled, a running one is left to finish
+    in the background.
+    """
+
+    def __init__(self, name, max_workers=2, max_queue=32, timeout=120):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def configure(self, max_workers=None, max_queue=None, timeout=None):
+        if max_workers is not None and max_workers != self.max_workers:
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers)
+            self.max_workers = max_workers
+        if max_queue is not None:
+            self.max_queue = max_queue
+        if timeout is not None:
+            self.timeout = timeout
+
+    @gen.coroutine
+    def run(self, fn, *args):
+        """Return the result of `fn(*args)` computed in the thread pool."""
+        with self.lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise web.HTTPError(503, 'Too many %s requests are waiting' % self.name)
+            self.queued += 1
+            self.submitted += 1
+        future = self.executor.submit(self.call, time.time(), fn, args)
+        try:
+            result = yield gen.with_timeout(datetime.timedelta(seconds=self.timeout), future,
+                                            quiet_exceptions=CancelledError)
+        except gen.TimeoutError:
+            with self.lock:
+                self.timed_out += 1
+                if future.cancel():
+                    self.queued -= 1
+            raise web.HTTPError(504, 'The %s request took longer than %s seconds' % (self.name, self.timeout))
+        raise gen.Return(result)
+
+    def call(self, submitted_time, fn, args):
+        start_time = time.time()
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += start_time - submitted_time
+            self.max_wait = max(self.max_wait, start_time - submitted_time)
+        failed = True
+        try:
+            result = fn(*args)
+            failed = False
+            return result
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+                self.failed += failed
+                self.total_run += time.time() - start_time
+
+    def stats(self):
+        with self.lock:
+            started = self.completed + self.running
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'timeout': self.timeout,
+                'queued': self.queued,
+                'running': self.running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'mean_wait': started and self.total_wait / started,
+                'max_wait': self.max_wait,
+                'mean_run': self.completed and self.total_run / self.completed,
+            }
+
+
+# Reading, diffing and store access run here rather than on the IO loop.
+diff_executor = BoundedExecutor('diff')
+# A single thread keeps the store writes of a notebook in order.
+store_executor = BoundedExecutor('provenance store', max_workers=1, max_queue=256, timeout=30)
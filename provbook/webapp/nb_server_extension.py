@@ -7,40 +7,116 @@ from __future__ import print_function
 import json
 import os
 
-from jinja2 import ChoiceLoader, FileSystemLoader
-
+from notebook.base.handlers import APIHandler, path_regex
 from notebook.utils import url_path_join, to_os_path
 from tornado.web import HTTPError, escape, authenticated, gen
-import nbformat
 
-from .nbdimeserver import (
-    template_path,
-    static_path,
-    NbdimeHandler,
-    ApiDiffHandler,
-)
+from ..store import ProvenanceStore
+from .executor import diff_executor, store_executor
+from .rdfexport import EXPORT_FORMATS, add_post_save_hook, rdf_exporter, rdf_save_exporter
+
+
+class ProvenanceStoreHandler(APIHandler):
+    """Append-only provenance records of the cells of a notebook.
+
+    GET returns `{"cells": {cell_id: [entry, ...]}}`, POST appends the
+    entries of a body of the same form and DELETE removes the records of
+    the `cell_id` arguments.
+    """
+
+    def get_store(self, path, create=False):
+        notebook_path = to_os_path(path, self.contents_manager.root_dir)
+        if not os.path.isfile(notebook_path):
+            raise HTTPError(404, 'No such notebook: %s' % path)
+        return ProvenanceStore.open(notebook_path, create=create)
+
+    @authenticated
+    @gen.coroutine
+    def get(self, path=''):
+        cells = yield store_executor.run(self.read_entries, path)
+        self.finish(json.dumps({'cells': cells}))
 
+    @authenticated
+    @gen.coroutine
+    def post(self, path=''):
+        try:
+            cells = json.loads(escape.to_unicode(self.request.body))['cells']
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, 'Expecting a JSON body with the entries of the cells')
+        yield store_executor.run(self.append_entries, path, cells)
+        self.set_status(204)
+        self.finish()
 
-class ProvBookDiffHandler(NbdimeHandler):
+    @authenticated
+    @gen.coroutine
+    def delete(self, path=''):
+        yield store_executor.run(self.clear_entries, path, self.get_arguments('cell_id'))
+        self.set_status(204)
+        self.finish()
+
+    def read_entries(self, path):
+        store = self.get_store(path)
+        if store is None:
+            return {}
+        try:
+            return store.all_entries()
+        finally:
+            store.close()
+
+    def append_entries(self, path, cells):
+        store = self.get_store(path, create=True)
+        try:
+            for cell_id, entries in cells.items():
+                store.append(cell_id, entries)
+        finally:
+            store.close()
+
+    def clear_entries(self, path, cell_ids):
+        store = self.get_store(path)
+        if store is not None:
+            try:
+                store.clear(cell_ids)
+            finally:
+                store.close()
+
+
+class RDFExportHandler(APIHandler):
+    """Download the RDF of a saved notebook as Turtle or N-Triples.
+
+    The notebook is converted by rdf_exporter in a worker process, see
+    provbook/webapp/rdfexport.py, and the file is streamed in chunks.
+    """
+
+    chunk_size = 64 * 1024
 
     @authenticated
-    def get(self):
-
-        args= {}
-        base = self.get_argument('base', '')
-        base_selected_execution = int(self.get_argument('base_selected_execution', ''))
-        remote_selected_execution = int(self.get_argument('remote_selected_execution', ''))
-        cell_index = self.get_argument('cell_index', '')
-        args['base'] = base
-        args['remote'] = base
-        args['baseurl'] = 'provbookdiff'
-        args['cell_index'] = cell_index
-        args['base_selected_execution'] = base_selected_execution
-        args['remote_selected_execution'] = remote_selected_execution
-        self.write(self.render_template(
-            'provbookdiff.html',
-            config_data=args,
-        ))
+    @gen.coroutine
+    def get(self, path=''):
+        format = self.get_argument('format', 'turtle')
+        if format not in EXPORT_FORMATS:
+            raise HTTPError(400, 'Unknown RDF format %s, use one of %s' % (format, ', '.join(sorted(EXPORT_FORMATS))))
+        notebook_path = to_os_path(path, self.contents_manager.root_dir)
+        if not os.path.isfile(notebook_path):
+            raise HTTPError(404, 'No such notebook: %s' % path)
+        try:
+            output_file = yield rdf_exporter.export(notebook_path, format)
+        except HTTPError:
+            raise
+        except Exception as e:
+            self.log.exception('Error converting %s to RDF:', path)
+            raise HTTPError(500, 'Error while converting the notebook to RDF: %s' % e)
+        extension, content_type = EXPORT_FORMATS[format]
+        filename = os.path.splitext(os.path.basename(notebook_path))[0] + '.' + extension
+        self.set_header('Content-Type', content_type)
+        self.set_header('Content-Disposition', 'attachment; filename="%s"' % filename)
+        with open(output_file, 'rb') as fin:
+            while True:
+                chunk = fin.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.write(chunk)
+                yield self.flush()
+        self.finish()
 
 
 def _load_jupyter_server_extension(nb_server_app):
@@ -50,6 +126,20 @@ def _load_jupyter_server_extension(nb_server_app):
     Args:
         nb_server_app (NotebookWebApplication): handle to the Notebook webserver instance.
     """
+    # nbdime, and nbformat with it, are only needed by the diff handlers
+    # registered here, not to import the extension.
+    from jinja2 import ChoiceLoader, FileSystemLoader
+    from .nbdimeserver import (
+        template_path,
+        static_path,
+        ProvBookDiffHandler,
+        ApiDiffChainHandler,
+        ApiDiffHandler,
+        ApiRunDiffHandler,
+        ApiStatsHandler,
+    )
+    from .rundiff import run_diff_pool
+
     web_app = nb_server_app.web_app
 
     env = web_app.settings['jinja2_env']
@@ -61,13 +151,39 @@ def _load_jupyter_server_extension(nb_server_app):
 
     web_app.settings['static_path'].append(static_path)
 
+    # Sizes of the thread pools of the diff and store handlers, e.g.
+    # c.ProvBook.diff_workers = 4 in jupyter_notebook_config.py
+    config = nb_server_app.config.get('ProvBook', {})
+    diff_executor.configure(config.get('diff_workers'), config.get('diff_queue'), config.get('diff_timeout'))
+    store_executor.configure(None, config.get('store_queue'), config.get('store_timeout'))
+    run_diff_pool.configure(config.get('rundiff_workers'), config.get('diff_timeout'))
+    rdf_exporter.configure(config.get('rdf_workers'), config.get('rdf_cache_entries'), config.get('rdf_cache_bytes'))
+
+    # Export the RDF of every notebook saved in the background, e.g.
+    # c.ProvBook.rdf_on_save = True
+    if config.get('rdf_on_save'):
+        contents_manager = nb_server_app.contents_manager
+        if not hasattr(contents_manager, 'post_save_hook'):
+            nb_server_app.log.warning('ProvBook: %s has no post-save hook, the RDF is not exported on save',
+                                      type(contents_manager).__name__)
+        else:
+            rdf_save_exporter.configure(config.get('rdf_on_save_format'), config.get('rdf_on_save_dir'),
+                                        config.get('rdf_on_save_workers'), config.get('rdf_on_save_queue'),
+                                        root_dir=contents_manager.root_dir, log=nb_server_app.log)
+            add_post_save_hook(contents_manager, rdf_save_exporter.post_save_hook)
+
     params = {
         'nbdime_relative_base_url': 'provbookdiff',
         'closable': False,
     }
     handlers = [
         (r'/provbookdiff/api/diff', ApiDiffHandler, params),
+        (r'/provbookdiff/api/rundiff', ApiRunDiffHandler, params),
+        (r'/provbookdiff/api/diffchain', ApiDiffChainHandler, params),
+        (r'/provbookdiff/api/stats', ApiStatsHandler, {}),
         (r'/provbookdiff', ProvBookDiffHandler, params),
+        (r'/provbook/api/provenance%s' % path_regex, ProvenanceStoreHandler, {}),
+        (r'/provbook/api/rdf%s' % path_regex, RDFExportHandler, {}),
     ]
 
     # Prefix routes with base_url:
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+from __future__ import unicode_literals
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class NotebookCache(object):
+    """Size-bounded LRU cache of parsed notebooks.
+
+    Notebooks are keyed by their real path, modification time and size,
+    so a notebook saved since it was cached is read again. The cache holds
+    at most `max_entries` notebooks and `max_bytes` bytes of notebook files.
+    A notebook larger than `max_bytes` is not cached. Cached notebooks are
+    shared between requests and must not be modified.
+    """
+
+    def __init__(self, max_entries=16, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, load):
+        """Return the notebook at `path`, calling `load()` to read it on a miss."""
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                notebook = self.entries.pop(key)
+                self.entries[key] = notebook
+                return notebook
+            self.misses += 1
+        notebook = load()
+        with self.lock:
+            self.add(key, notebook)
+        return notebook
+
+    def add(self, key, notebook):
+        path, mtime, size = key
+        if size > self.max_bytes:
+            return
+        for old_key in [k for k in self.entries if k[0] == path]:
+            self.remove(old_key)
+        self.entries[key] = notebook
+        self.total_bytes += size
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key):
+        del self.entries[key]
+        self.total_bytes -= key[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
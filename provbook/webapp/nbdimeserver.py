@@ -12,23 +12,28 @@ import logging
 import os
 import sys
 from argparse import ArgumentParser
+from itertools import islice
 
 from six import string_types
-from tornado import ioloop, web, escape, netutil, httpserver
-import nbformat
-from jinja2 import FileSystemLoader, Environment
+from tornado import ioloop, web, escape, netutil, httpserver, gen
 
 import nbdime
 from nbdime.utils import EXPLICIT_MISSING_FILE
 
-from nbdime.args import add_generic_args, add_web_args
-
 from notebook.base.handlers import IPythonHandler, APIHandler
 from notebook import DEFAULT_STATIC_FILES_PATH
 from notebook.utils import url_path_join
 from notebook.log import log_request
 from nbdime.webapp.nbdimeserver import NbdimeHandler, ApiCloseHandler
 
+from ..provenance import load_retention_policy
+from ..store import ProvenanceStore, read_cell_provenance
+from .diffchain import CellDiffCache, iter_diff_chain
+from .executor import diff_executor, store_executor
+from .nbcache import NotebookCache
+from .rdfexport import rdf_exporter, rdf_save_exporter
+from .rundiff import diff_runs, run_diff_pool
+
 # TODO: See <notebook>/notebook/services/contents/handlers.py for possibly useful utilities:
 #contents_manager
 #ContentsHandler
@@ -41,11 +46,22 @@ here = os.path.abspath(os.path.dirname(__file__))
 static_path = os.path.join(here, 'static')
 template_path = os.path.join(here, 'templates')
 
+# Parsed notebooks and cell diffs shared by every diff request of the server.
+notebook_cache = NotebookCache()
+cell_diff_cache = CellDiffCache()
+
 
 class ApiDiffHandler(NbdimeHandler, APIHandler):
+    notebook_cache = notebook_cache
+
+    @gen.coroutine
     def post(self):
+        body = json.loads(escape.to_unicode(self.request.body))
+        data = yield diff_executor.run(self.compute_diff, body)
+        self.finish(data)
+
+    def compute_diff(self, body):
         base_nb = self.get_notebook_argument('base')
-        body = json.loads(escape.to_unicode(self.request.body))        
         base_selected_execution = body['base_selected_execution']
         remote_selected_execution = body['remote_selected_execution']
         cell_index = body['cell_index']
@@ -60,14 +76,14 @@ class ApiDiffHandler(NbdimeHandler, APIHandler):
         
         base_notebook['cells'] = []
         remote_notebook['cells'] = []
+        cell_pair = None
         
         for cell_i, cell_node in enumerate(base_nb['cells']):
             base_prov_obj = {}
             remote_prov_obj = {}
             if (int(cell_i) == int(cell_index)):
-                if 'provenance' in cell_node['metadata']:
-                    
-                    provenance = cell_node['metadata']['provenance']
+                provenance = self.get_cell_provenance(body, cell_node)
+                if provenance:
                     base_selected_execution_prov = provenance[base_selected_execution]
                     remote_selected_execution_prov = provenance[remote_selected_execution]  
                     base_prov_obj['source'] = base_selected_execution_prov['source']
@@ -82,37 +98,189 @@ class ApiDiffHandler(NbdimeHandler, APIHandler):
                     remote_prov_obj['cell_type'] = cell_node['cell_type']
                     base_notebook['cells'] = [base_prov_obj]
                     remote_notebook['cells'] = [remote_prov_obj]
-                    d = nbdime.diff(provenance[base_selected_execution], provenance[remote_selected_execution])
+                    cell_pair = (base_prov_obj, remote_prov_obj)
                 else:
                     base_notebook = base_nb
                     remote_notebook = base_nb
+                break
         try:
-            thediff = nbdime.diff_notebooks(base_notebook, remote_notebook)
+            if cell_pair is not None:
+                entries = cell_diff_cache.get(*cell_pair)
+                thediff = [{'op': 'patch', 'key': 'cells', 'diff': entries}] if entries else []
+            else:
+                thediff = nbdime.diff_notebooks(base_notebook, remote_notebook)
         except Exception:
             nbdime.log.exception('Error diffing documents:')
             raise web.HTTPError(500, 'Error while attempting to diff documents')
-        data = {
-            'base': base_notebook,            
+        return {
+            'base': base_notebook,
             'diff': thediff,
             }
-        self.finish(data)
+
+    def get_cell_provenance(self, body, cell_node):
+        return self.get_cells_provenance(body, [cell_node])[0]
+
+    def get_cells_provenance(self, body, cell_nodes):
+        store = None
+        if isinstance(body.get('base'), string_types):
+            store = ProvenanceStore.open(os.path.join(self.curdir, body['base']))
+        try:
+            retention = load_retention_policy()
+            return [read_cell_provenance(cell_node, store, retention) for cell_node in cell_nodes]
+        finally:
+            if store is not None:
+                store.close()
 
     def get_notebook_argument(self, argname):
         if 'difftool_args' in self.params:
             arg = self.params['difftool_args'][argname]
             if not isinstance(arg, string_types):
                 # Assume arg is file-like
+                import nbformat
                 arg.seek(0)
                 return nbformat.read(arg, as_version=4)
             return self.read_notebook(arg)
         return super(ApiDiffHandler, self).get_notebook_argument(argname)
 
+    def read_notebook(self, arg, fail_on_empty=True):
+        parent = super(ApiDiffHandler, self)
+        if not isinstance(arg, string_types) or not os.path.isfile(os.path.join(self.curdir, arg)):
+            return parent.read_notebook(arg, fail_on_empty)
+        return self.notebook_cache.get(os.path.join(self.curdir, arg),
+                                       lambda: parent.read_notebook(arg, fail_on_empty))
+
+
+class ApiRunDiffHandler(ApiDiffHandler):
+    """Diff two runs of the whole notebook.
+
+    The runs are selected by number with `base_run` and `remote_run`, or
+    by time with `base_time`, `remote_time` and a `window` in seconds.
+    See provbook/webapp/rundiff.py.
+    """
+
+    def compute_diff(self, body):
+        base_nb = self.get_notebook_argument('base')
+        try:
+            base_run = self.get_run(body, 'base')
+            remote_run = self.get_run(body, 'remote')
+        except (KeyError, TypeError, ValueError) as e:
+            raise web.HTTPError(400, 'Invalid run selection: %s' % e)
+        provenances = self.get_cells_provenance(body, base_nb['cells'])
+        try:
+            base_notebook, thediff = diff_runs(base_nb, provenances, base_run, remote_run, run_diff_pool)
+        except Exception:
+            nbdime.log.exception('Error diffing runs:')
+            raise web.HTTPError(500, 'Error while attempting to diff runs')
+        return {
+            'base': base_notebook,
+            'diff': thediff,
+            }
+
+    def get_run(self, body, side):
+        if body.get(side + '_time') is not None:
+            from dateutil.parser import parse
+            from dateutil.tz import tzutc
+            time = parse(body[side + '_time'])
+            if time.tzinfo is None:
+                time = time.replace(tzinfo=tzutc())
+            return {'time': time, 'window': float(body.get('window') or 0)}
+        return {'run': int(body[side + '_run'])}
+
+
+class ApiDiffChainHandler(ApiDiffHandler):
+    """Stream the diffs between consecutive executions of a cell.
+
+    The response is newline-delimited JSON: a header with the number of
+    executions and the notebook metadata, then one line per execution from
+    `start` on, see iter_diff_chain. It is flushed every `chunk_size` lines.
+    """
+
+    @web.authenticated
+    @gen.coroutine
+    def get(self):
+        base = self.get_argument('base')
+        try:
+            cell_index = int(self.get_argument('cell_index'))
+            start = int(self.get_argument('start', 0))
+            chunk_size = max(1, int(self.get_argument('chunk_size', 20)))
+        except ValueError as e:
+            raise web.HTTPError(400, 'Invalid argument: %s' % e)
+        base_nb, cell_node, provenance = yield diff_executor.run(self.read_cell, base, cell_index)
+
+        self.set_header('Content-Type', 'application/x-ndjson')
+        self.write(json.dumps({
+            'executions': len(provenance),
+            'metadata': base_nb['metadata'],
+            'nbformat': base_nb['nbformat'],
+            'nbformat_minor': base_nb['nbformat_minor'],
+            }) + '\n')
+        items = iter_diff_chain(cell_node, provenance, cell_diff_cache, start)
+        while True:
+            chunk = yield diff_executor.run(lambda: list(islice(items, chunk_size)))
+            if not chunk:
+                break
+            for item in chunk:
+                self.write(json.dumps(item) + '\n')
+            yield self.flush()
+        self.finish()
+
+    def read_cell(self, base, cell_index):
+        base_nb = self.read_notebook(base)
+        if not 0 <= cell_index < len(base_nb['cells']):
+            raise web.HTTPError(404, 'No cell %d in %s' % (cell_index, base))
+        cell_node = base_nb['cells'][cell_index]
+        return base_nb, cell_node, self.get_cell_provenance({'base': base}, cell_node)
+
+
+class ProvBookDiffHandler(NbdimeHandler):
+
+    @web.authenticated
+    def get(self):
+
+        args= {}
+        base = self.get_argument('base', '')
+        args['base'] = base
+        args['remote'] = base
+        args['baseurl'] = 'provbookdiff'
+        if self.get_argument('base_run', None) is not None or self.get_argument('base_time', None) is not None:
+            # Diff of two runs of the whole notebook
+            args['mode'] = 'runs'
+            for name in ('base_run', 'remote_run', 'base_time', 'remote_time', 'window'):
+                args[name] = self.get_argument(name, None)
+        else:
+            base_selected_execution = int(self.get_argument('base_selected_execution', ''))
+            remote_selected_execution = int(self.get_argument('remote_selected_execution', ''))
+            cell_index = self.get_argument('cell_index', '')
+            args['cell_index'] = cell_index
+            args['base_selected_execution'] = base_selected_execution
+            args['remote_selected_execution'] = remote_selected_execution
+        self.write(self.render_template(
+            'provbookdiff.html',
+            config_data=args,
+        ))
+
+
+class ApiStatsHandler(APIHandler):
+    @web.authenticated
+    def get(self):
+        self.finish({
+            'notebook_cache': notebook_cache.stats(),
+            'cell_diff_cache': cell_diff_cache.stats(),
+            'diff_executor': diff_executor.stats(),
+            'store_executor': store_executor.stats(),
+            'rdf_exporter': rdf_exporter.stats(),
+            'rdf_save_exporter': rdf_save_exporter.stats(),
+            })
+
 
 def make_app(**params):
     base_url = params.pop('base_url', '/')
     handlers = [
         (r'/api/diff', ApiDiffHandler, params),
+        (r'/api/rundiff', ApiRunDiffHandler, params),
+        (r'/api/diffchain', ApiDiffChainHandler, params),
         (r'/api/closetool', ApiCloseHandler, params),
+        (r'/api/stats', ApiStatsHandler, {}),
         (r'/nb-static/mathjax/(.*)', web.StaticFileHandler, {
             'path': os.path.join(DEFAULT_STATIC_FILES_PATH, 'components', 'MathJax')
         })
@@ -127,6 +295,7 @@ def make_app(**params):
     else:
         prefix = ''
 
+    from jinja2 import FileSystemLoader, Environment
     env = Environment(loader=FileSystemLoader([template_path]), autoescape=False)
     settings = {
         'log_function': log_request,
@@ -193,6 +362,8 @@ def _build_arg_parser():
     Creates an argument parser that lets the user specify a port
     and displays a help message.
     """
+    # Only the standalone server parses arguments, not the extension.
+    from nbdime.args import add_generic_args, add_web_args
     description = 'Web interface for Nbdime.'
     parser = ArgumentParser(description=description)
     add_generic_args(parser)
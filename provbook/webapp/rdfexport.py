@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""RDF export of saved notebooks for the server extension.
+
+Notebooks are converted in a pool of worker processes, so rdflib runs
+neither in the kernel nor on the IO loop of the server. The RDF is written
+to a cache directory and kept there until the notebook, its provenance
+store or the retention policy change.
+
+With the post-save hook, every notebook saved is also exported in the
+background to an RDF file next to it, or in a directory mirroring the
+notebooks, so that its RDF is always current.
+"""
+
+from __future__ import unicode_literals
+
+import atexit
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from tornado import gen
+
+from ..provenance import load_retention_policy
+from ..store import store_path
+
+EXPORT_FORMATS = {
+    'turtle': ('ttl', 'text/turtle; charset=UTF-8'),
+    'nt': ('nt', 'application/n-triples; charset=UTF-8'),
+    'nquads': ('nq', 'application/n-quads; charset=UTF-8'),
+}
+
+
+def convert_notebook(notebook_path, output_file, format, retention):
+    """Write the RDF of the notebook at `notebook_path` to `output_file`."""
+    import nbformat
+    from ..notebook_rdf.nb2rdf import NBToRDFConverter
+    from ..store import ProvenanceStore
+
+    notebook_name = os.path.splitext(os.path.basename(notebook_path))[0]
+    with io.open(notebook_path, encoding='utf-8') as fin:
+        notebook_json = nbformat.read(fin, as_version=4)
+    converter = NBToRDFConverter(retention=retention)
+    converter.store = ProvenanceStore.open(notebook_path)
+    partial_file = output_file + '.part'
+    try:
+        with io.open(partial_file, 'w', encoding='utf-8') as fout:
+            converter.stream_to_rdf(notebook_name, notebook_json, fout, format=format)
+        os.rename(partial_file, output_file)
+    finally:
+        if converter.store is not None:
+            converter.store.close()
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+    return os.path.getsize(output_file)
+
+
+def export_notebook(notebook_path, output_file, format, retention):
+    """Write the RDF of a notebook saved to `output_file`, creating its directory."""
+    directory = os.path.dirname(output_file)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Created by another worker.
+            if not os.path.isdir(directory):
+                raise
+    return convert_notebook(notebook_path, output_file, format, retention)
+
+
+class RDFExporter(object):
+    """Convert notebooks to RDF in worker processes and cache the files.
+
+    A conversion is identified by the path, modification time and size of
+    the notebook, the modification time of its provenance store, the
+    retention policy and the format. Concurrent requests for the same
+    conversion share one worker. The cache holds at most `max_entries`
+    files and `max_bytes` bytes.
+    """
+
+    def __init__(self, max_workers=2, max_entries=32, max_bytes=1024 * 1024 * 1024):
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.executor = None
+        self.cache_dir = None
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Guards the pool, which is also used by the threads of SaveExporter.
+        self.pool_lock = threading.Lock()
+        self.closed = False
+
+    def configure(self, max_workers=None, max_entries=None, max_bytes=None):
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+
+    def pool(self):
+        """Return the pool of worker processes, created on first use.
+
+        Raises RuntimeError once the exporter is shut down.
+        """
+        with self.pool_lock:
+            if self.closed:
+                raise RuntimeError('The RDF exporter is shut down')
+            if self.executor is None:
+                kwargs = {}
+                if sys.version_info >= (3, 7):
+                    # Spawn the workers rather than forking the server with its open sockets.
+                    kwargs['mp_context'] = multiprocessing.get_context('spawn')
+                self.executor = ProcessPoolExecutor(self.max_workers, **kwargs)
+                self.cache_dir = tempfile.mkdtemp(prefix='provbook-rdf-')
+                atexit.register(self.shutdown)
+            return self.executor
+
+    def submit(self, fn, *args):
+        """Submit `fn(*args)` to the pool from any thread.
+
+        Raises RuntimeError once the exporter is shut down.
+        """
+        pool = self.pool()
+        with self.pool_lock:
+            if self.closed:
+                raise RuntimeError('The RDF exporter is shut down')
+            return pool.submit(fn, *args)
+
+    def export_key(self, notebook_path, format, retention):
+        notebook_path = os.path.realpath(notebook_path)
+        stat = os.stat(notebook_path)
+        store = store_path(notebook_path)
+        store_mtime = os.path.getmtime(store) if os.path.exists(store) else None
+        return (notebook_path, stat.st_mtime, stat.st_size, store_mtime, format,
+                json.dumps(retention, sort_keys=True))
+
+    @gen.coroutine
+    def export(self, notebook_path, format='turtle'):
+        """Return the path of a file with the RDF of the notebook."""
+        retention = load_retention_policy()
+        key = self.export_key(notebook_path, format, retention)
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                entry = self.entries.pop(key)
+                self.entries[key] = entry
+                raise gen.Return(entry[0])
+            self.misses += 1
+            # Creates the cache directory with the pool.
+            self.pool()
+            name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+            output_file = os.path.join(self.cache_dir, name + '.' + EXPORT_FORMATS[format][0])
+            future = self.pending.get(key)
+            if future is None:
+                future = self.submit(convert_notebook, key[0], output_file, format, retention)
+                self.pending[key] = future
+        try:
+            size = yield future
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+        with self.lock:
+            if key not in self.entries:
+                self.add(key, output_file, size)
+        raise gen.Return(output_file)
+
+    def add(self, key, output_file, size):
+        # Older conversions of the notebook to the same format are stale.
+        for old_key in [k for k in self.entries if k[0] == key[0] and k[4] == key[4]]:
+            self.remove(old_key)
+        self.entries[key] = (output_file, size)
+        self.total_bytes += size
+        # The newest file is kept even if it alone is larger than max_bytes.
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        output_file, size = self.entries.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(output_file)
+        except OSError:
+            pass
+
+    def shutdown(self):
+        with self.pool_lock:
+            self.closed = True
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                shutil.rmtree(self.cache_dir, ignore_errors=True)
+                self.executor = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'pending': len(self.pending),
+            }
+
+
+class SaveExporter(object):
+    """Export the RDF of notebooks in the background whenever they are saved.
+
+    `schedule` only queues the notebook, so the save is never blocked. The
+    notebooks are converted in the worker processes of `exporter`, at most
+    `max_workers` at once so that downloads still get a worker. At most
+    `max_queue` notebooks wait; the saves of further notebooks are dropped
+    and their RDF is exported at their next save. A notebook saved again
+    while it waits is converted once, and one saved while it is converted
+    is converted again after it.
+    """
+
+    def __init__(self, exporter, format='turtle', output_dir=None, max_workers=1, max_queue=64):
+        self.exporter = exporter
+        self.format = format
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.root_dir = ''
+        self.log = logging.getLogger(__name__)
+        # path: time of the first save waiting
+        self.waiting = OrderedDict()
+        self.running = {}
+        # path: time of the first save during its conversion
+        self.saved_again = {}
+        self.saves = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.exported = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.lock = threading.Lock()
+
+    def configure(self, format=None, output_dir=None, max_workers=None, max_queue=None, root_dir=None, log=None):
+        if format is not None:
+            if format not in EXPORT_FORMATS:
+                raise ValueError('Unknown RDF format %s, use one of %s' % (format, ', '.join(sorted(EXPORT_FORMATS))))
+            self.format = format
+        if output_dir is not None:
+            self.output_dir = output_dir
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if max_queue is not None:
+            self.max_queue = max_queue
+        if root_dir is not None:
+            self.root_dir = root_dir
+        if log is not None:
+            self.log = log
+
+    def output_file(self, notebook_path):
+        """Return the RDF file of a notebook, next to it or in `output_dir`."""
+        name = os.path.splitext(notebook_path)[0] + '.' + EXPORT_FORMATS[self.format][0]
+        if self.output_dir is None:
+            return name
+        return os.path.join(self.output_dir, os.path.relpath(name, self.root_dir or os.curdir))
+
+    def schedule(self, notebook_path):
+        """Queue the export of a notebook that was saved."""
+        with self.lock:
+            self.saves += 1
+            if notebook_path in self.running:
+                if notebook_path in self.saved_again:
+                    self.coalesced += 1
+                else:
+                    self.saved_again[notebook_path] = time.time()
+                return
+            if notebook_path in self.waiting:
+                self.coalesced += 1
+                return
+            if len(self.waiting) >= self.max_queue:
+                self.dropped += 1
+                self.log.warning('ProvBook: %d notebooks wait for their RDF export, %s is exported at its next save',
+                                 len(self.waiting), notebook_path)
+                return
+            self.waiting[notebook_path] = time.time()
+            started = self.start_waiting()
+        self.watch(started)
+
+    def start_waiting(self):
+        # Called with the lock held, the futures are watched once it is released.
+        started = []
+        while self.waiting and len(self.running) < self.max_workers:
+            notebook_path, saved_time = self.waiting.popitem(last=False)
+            try:
+                future = self.exporter.submit(export_notebook, notebook_path, self.output_file(notebook_path),
+                                              self.format, load_retention_policy())
+            except RuntimeError:
+                # The server is shutting down, nothing more is exported.
+                self.waiting.clear()
+                break
+            self.running[notebook_path] = future
+            started.append((notebook_path, saved_time, future))
+        return started
+
+    def watch(self, started):
+        for notebook_path, saved_time, future in started:
+            future.add_done_callback(partial(self.done, notebook_path, saved_time))
+
+    def done(self, notebook_path, saved_time, future):
+        latency = time.time() - saved_time
+        error = future.exception()
+        with self.lock:
+            self.running.pop(notebook_path, None)
+            if error is None:
+                self.exported += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+            else:
+                self.failed += 1
+            if notebook_path in self.saved_again:
+                self.waiting[notebook_path] = self.saved_again.pop(notebook_path)
+            started = self.start_waiting()
+        if error is None:
+            self.log.debug('ProvBook: exported the RDF of %s %.2fs after its save', notebook_path, latency)
+        else:
+            self.log.error('ProvBook: error exporting the RDF of %s: %s', notebook_path, error)
+        self.watch(started)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'saves': self.saves,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'exported': self.exported,
+                'failed': self.failed,
+                'waiting': len(self.waiting),
+                'running': len(self.running),
+                'max_queue': self.max_queue,
+                'mean_latency': self.exported and self.total_latency / self.exported,
+                'max_latency': self.max_latency,
+            }
+
+    def post_save_hook(self, model, os_path, contents_manager, **kwargs):
+        """Post-save hook of the contents manager queuing the notebooks saved."""
+        if model.get('type') == 'notebook':
+            self.schedule(os_path)
+
+
+def add_post_save_hook(contents_manager, hook):
+    """Run `hook` after the post-save hook already set on `contents_manager`, if any."""
+    previous = contents_manager.post_save_hook
+
+    def post_save_hook(model, os_path, contents_manager, **kwargs):
+        if previous is not None:
+            previous(model=model, os_path=os_path, contents_manager=contents_manager, **kwargs)
+        hook(model=model, os_path=os_path, contents_manager=contents_manager, **kwargs)
+
+    contents_manager.post_save_hook = post_save_hook
+
+
+# Shared by the RDF export requests of the server.
+rdf_exporter = RDFExporter()
+# Exports the notebooks saved, when enabled in the config of the server extension.
+rdf_save_exporter = SaveExporter(rdf_exporter)
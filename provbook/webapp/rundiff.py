@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Author: Sheeba Samuel, <sheeba.samuel@uni-jena.de> https://github.com/Sheeba-Samuel
+
+"""Notebook-wide diff of two runs rebuilt from the provenance of every cell.
+
+A run is selected either by number or by time. Run N is the N-th entry of
+the provenance of each cell, counted from the end if N is negative; cells
+executed fewer times keep their last entry. The run at a time is the last
+entry of each cell started before that time plus a window, so a run-all
+that took up to `window` seconds is selected as a whole. Cells that did
+not exist at that time are left out of the run.
+
+The cells that changed between the runs are diffed in worker processes
+of a RunDiffPool when there are many of them.
+"""
+
+from __future__ import unicode_literals
+
+import atexit
+import datetime
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import nbdime
+
+from ..provenance import entry_time
+
+# Diff the cells in worker processes when at least this many cells changed.
+PARALLEL_MIN_CELLS = 8
+
+
+def select_run_entry(provenance, run=None, time=None, window=0):
+    """Return the provenance entry of a cell in the selected run, or None."""
+    if not provenance:
+        return None
+    if time is None:
+        index = run if run >= 0 else len(provenance) + run
+        return provenance[max(0, min(index, len(provenance) - 1))]
+    end_time = time + datetime.timedelta(seconds=window)
+    selected = None
+    for entry in provenance:
+        started = entry_time(entry)
+        if started is None or started <= end_time:
+            selected = entry
+    return selected
+
+
+def run_cell(cell_node, entry):
+    """Return the cell as it was in the execution recorded by `entry`."""
+    cell = {
+        'cell_type': cell_node['cell_type'],
+        'metadata': {},
+        'source': entry.get('source', cell_node.get('source', '')),
+    }
+    if cell_node['cell_type'] == 'code':
+        cell['outputs'] = entry.get('outputs', cell_node.get('outputs', []))
+        cell['execution_count'] = cell_node.get('execution_count')
+    return cell
+
+
+def cell_digest(cell):
+    return hashlib.sha1(json.dumps([cell['source'], cell.get('outputs')], sort_keys=True)
+                        .encode('utf-8')).hexdigest()
+
+
+def diff_cell_pair(pair):
+    """Return the cell diff entries of two cells, keyed as the first cell."""
+    base_cell, remote_cell = pair
+    notebooks = [{'cells': [cell], 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 2}
+                 for cell in (base_cell, remote_cell)]
+    thediff = nbdime.diff_notebooks(*notebooks)
+    return json.loads(json.dumps([e for d in thediff if d['key'] == 'cells' for e in d['diff']]))
+
+
+def diff_cell_pairs(pairs):
+    return [diff_cell_pair(pair) for pair in pairs]
+
+
+class RunDiffPool(object):
+    """Diff the cells of two runs in at most `max_workers` processes.
+
+    The workers are spawned on first use, rather than forked from the
+    server with its open sockets, and every worker gets one batch of the
+    cells of a diff. With fewer than 2 workers, or fewer than
+    PARALLEL_MIN_CELLS cells, the cells are diffed in the calling thread.
+    A diff that takes longer than `timeout` seconds raises TimeoutError
+    from concurrent.futures.
+    """
+
+    def __init__(self, max_workers=None, timeout=120):
+        if max_workers is None:
+            max_workers = min(4, multiprocessing.cpu_count() - 1)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.executor = None
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def configure(self, max_workers=None, timeout=None):
+        with self.lock:
+            if max_workers is not None and max_workers != self.max_workers:
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False)
+                    self.executor = None
+                self.max_workers = max_workers
+            if timeout is not None:
+                self.timeout = timeout
+
+    def submit(self, fn, *args):
+        """Submit `fn(*args)` to the workers, started on first use.
+
+        Raises RuntimeError once the pool is shut down.
+        """
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('The run diff pool is shut down')
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+                atexit.register(self.shutdown)
+            return self.executor.submit(fn, *args)
+
+    def diff_cell_pairs(self, pairs):
+        """Return the diff entries of every pair of cells, see diff_cell_pair."""
+        if self.max_workers < 2 or len(pairs) < PARALLEL_MIN_CELLS:
+            return diff_cell_pairs(pairs)
+        batch_size = -(-len(pairs) // self.max_workers)
+        futures = [self.submit(diff_cell_pairs, pairs[start:start + batch_size])
+                   for start in range(0, len(pairs), batch_size)]
+        deadline = time.time() + self.timeout
+        try:
+            return [entries for future in futures for entries in future.result(max(0, deadline - time.time()))]
+        finally:
+            # Batches still waiting after an error are not run.
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+
+# The run diffs of the server, configured by the server extension.
+run_diff_pool = RunDiffPool()
+
+
+def diff_runs(notebook, provenances, base_run, remote_run, pool=None):
+    """Return the base notebook of a run and its diff against another run.
+
+    `provenances` holds the decoded provenance of every cell of `notebook`.
+    `base_run` and `remote_run` are keyword arguments of select_run_entry.
+    Cells with the same source and outputs in both runs are not diffed,
+    the others are diffed in `pool`, a RunDiffPool, or one by one without it.
+    """
+    base_cells = []
+    cell_diffs = []
+    pairs = []
+    pair_keys = []
+    for cell_node, provenance in zip(notebook['cells'], provenances):
+        if provenance:
+            base_entry = select_run_entry(provenance, **base_run)
+            remote_entry = select_run_entry(provenance, **remote_run)
+        else:
+            base_entry = remote_entry = {}
+        base_cell = run_cell(cell_node, base_entry) if base_entry is not None else None
+        remote_cell = run_cell(cell_node, remote_entry) if remote_entry is not None else None
+        key = len(base_cells)
+        if base_cell is None:
+            if remote_cell is not None:
+                cell_diffs.append({'op': 'addrange', 'key': key, 'valuelist': [remote_cell]})
+            continue
+        base_cells.append(base_cell)
+        if remote_cell is None:
+            cell_diffs.append({'op': 'removerange', 'key': key, 'length': 1})
+        elif cell_digest(base_cell) != cell_digest(remote_cell):
+            pairs.append((base_cell, remote_cell))
+            pair_keys.append(key)
+
+    pair_diffs = pool.diff_cell_pairs(pairs) if pool is not None else diff_cell_pairs(pairs)
+    for key, entries in zip(pair_keys, pair_diffs):
+        for entry in entries:
+            entry['key'] += key
+            cell_diffs.append(entry)
+    cell_diffs.sort(key=lambda entry: entry['key'])
+
+    base_notebook = {
+        'metadata': notebook['metadata'],
+        'nbformat': notebook['nbformat'],
+        'nbformat_minor': notebook['nbformat_minor'],
+        'cells': base_cells,
+    }
+    thediff = [{'op': 'patch', 'key': 'cells', 'diff': cell_diffs}] if cell_diffs else []
+    return base_notebook, thediff
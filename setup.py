@@ -20,7 +20,8 @@ here = os.path.abspath(os.path.dirname(__file__))
 
 
 # Minimal Python version sanity check
-ensure_python(('2.7', '>=3.4'))
+# Module __getattr__ (PEP 562) of provbook.notebook_rdf needs Python 3.7.
+ensure_python('>=3.7')
 
 # the name of the project
 name = 'provbook'
@@ -86,12 +87,13 @@ setup_args = dict(
         'Intended Audience :: System Administrators',
         'License :: OSI Approved :: BSD License',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Framework :: Jupyter',
     ],
 )
@@ -109,7 +111,8 @@ install_requires = setuptools_args['install_requires'] = [
     'jinja2>=2.9',
     'jupyter',
     'nbdime',
-    'rdflib'
+    'rdflib',
+    'python-dateutil'
 ]
 
 extras_require = setuptools_args['extras_require'] = {
@@ -122,10 +125,11 @@ extras_require = setuptools_args['extras_require'] = {
     ':python_version == "2.7"': [
         'backports.shutil_which',
         'backports.functools_lru_cache',
+        'futures',
     ],
 }
 
-setuptools_args['python_requires'] = '>=2.7,!=3.0.*,!=3.1.*,!=3.2.*,!=3.3.*'
+setuptools_args['python_requires'] = '>=3.7'
 
 if 'setuptools' in sys.modules:
     setup_args.update(setuptools_args)
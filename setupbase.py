@@ -101,11 +101,14 @@ def ensure_python(specs):
     for spec in specs:
         if part == spec:
             return
-        try:
-            if eval(part + spec):
-                return
-        except SyntaxError:
-            pass
+        # Compare versions as tuples, 3.10 is newer than 3.7.
+        match = re.match(r'^\s*(==|!=|>=|<=|>|<)\s*(\d+(?:\.\d+)*)\s*$', spec)
+        if match is None:
+            continue
+        version = tuple(int(n) for n in match.group(2).split('.'))
+        current = tuple(v[:len(version)])
+        if eval('current %s version' % match.group(1)):
+            return
     raise ValueError('Python version %s unsupported' % part)
 
 